@@ -14,6 +14,27 @@ from config import settings
 from lava_integration import lava_gateway, use_lava_if_available
 
 
+# Leading bytes read from in-progress downloads to detect their format
+HEADER_SNIFF_BYTES = 4096
+
+# Magic byte signatures of common download formats
+FILE_SIGNATURES = [
+    (b'%PDF', 'PDF document'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG image'),
+    (b'\xff\xd8\xff', 'JPEG image'),
+    (b'GIF8', 'GIF image'),
+    (b'PK\x03\x04', 'ZIP archive (also docx/xlsx/pptx)'),
+    (b'\x1f\x8b', 'gzip archive'),
+    (b'Rar!', 'RAR archive'),
+    (b'7z\xbc\xaf\x27\x1c', '7-Zip archive'),
+    (b'\xd0\xcf\x11\xe0', 'Microsoft Office legacy document'),
+    (b'ID3', 'MP3 audio'),
+    (b'\x1aE\xdf\xa3', 'Matroska/WebM video'),
+    (b'\x7fELF', 'ELF executable'),
+    (b'MZ', 'Windows executable'),
+]
+
+
 class AIFileClassifier:
     """
     Intelligent file classification using Claude (Anthropic)
@@ -79,13 +100,53 @@ class AIFileClassifier:
             
             # Try to extract text from PDFs for better classification
             if file_path.suffix.lower() == '.pdf':
-                metadata['content_preview'] = self._extract_pdf_text(file_path)
+                metadata['content_preview'] = self.extract_preview(file_path)
             
             return metadata
         except Exception as e:
             print(f"Error extracting metadata: {e}")
             return {'filename': file_path.name, 'extension': file_path.suffix}
     
+    def extract_partial_metadata(self, partial_path: Path, final_name: str) -> Dict:
+        """Extract metadata for an in-progress download under its final name"""
+        final_path = Path(final_name)
+        mime_type, _ = mimetypes.guess_type(final_name)
+        
+        metadata = {
+            'filename': final_path.name,
+            'extension': final_path.suffix.lower(),
+            'mime_type': mime_type or "application/octet-stream",
+            'download_in_progress': True
+        }
+        
+        try:
+            size = partial_path.stat().st_size
+            metadata['size_bytes'] = size
+            metadata['size_mb'] = round(size / (1024 * 1024), 2)
+            
+            with open(partial_path, 'rb') as f:
+                header = f.read(HEADER_SNIFF_BYTES)
+            detected = self._detect_format(header)
+            if detected:
+                metadata['detected_format'] = detected
+        except OSError:
+            pass
+        
+        return metadata
+    
+    def _detect_format(self, header: bytes) -> Optional[str]:
+        """Identify a file format from its leading magic bytes"""
+        for magic, description in FILE_SIGNATURES:
+            if header.startswith(magic):
+                return description
+        return None
+    
+    def extract_preview(self, file_path: Path) -> str:
+        """Text preview of a finished file (PDFs only), within the privacy settings"""
+        if file_path.suffix.lower() == '.pdf':
+            return self._extract_pdf_text(file_path)
+        return ""
+    
     def _extract_pdf_text(self, file_path: Path, max_chars: int = None) -> str:
         """
         Extract first few characters from PDF for context
@@ -128,7 +189,21 @@ class AIFileClassifier:
         - reasoning: why this classification was chosen
         """
         metadata = self.extract_file_metadata(file_path)
+        return self.classify_metadata(metadata)
+    
+    def classify_partial_download(self, partial_path: Path, final_name: str) -> Tuple[Dict, float]:
+        """
+        Classify a download that is still in progress
         
+        Uses the name the file will have once the browser finishes and whatever
+        header bytes are already on disk, so the result is ready before the
+        download completes.
+        """
+        metadata = self.extract_partial_metadata(partial_path, final_name)
+        return self.classify_metadata(metadata)
+    
+    def classify_metadata(self, metadata: Dict) -> Tuple[Dict, float]:
+        """Classify a file from previously extracted metadata"""
         # Build prompt for Claude
         prompt = self._build_classification_prompt(metadata)
         
@@ -211,12 +286,17 @@ Always respond in valid JSON format with these fields:
             
             confidence = result.get('confidence', 0.5)
             
+            # Hand the extracted text on for the local search index
+            result['content_preview'] = metadata.get('content_preview', '')
+            
             return result, confidence
             
         except Exception as e:
             print(f"Error classifying file: {e}")
             # Fallback to basic classification
-            return self._fallback_classification(metadata), 0.3
+            result = self._fallback_classification(metadata)
+            result['content_preview'] = metadata.get('content_preview', '')
+            return result, 0.3
     
     def _build_classification_prompt(self, metadata: Dict) -> str:
         """Build a detailed prompt for file classification"""
@@ -231,6 +311,12 @@ Size: {metadata.get('size_mb', 0)} MB
 MIME Type: {metadata.get('mime_type', 'unknown')}
 """
         
+        if metadata.get('download_in_progress'):
+            prompt += "Note: Download still in progress, size is the amount received so far\n"
+        
+        if metadata.get('detected_format'):
+            prompt += f"Detected Format (from file header): {metadata['detected_format']}\n"
+        
         if 'content_preview' in metadata and metadata['content_preview']:
             prompt += f"\nContent Preview:\n{metadata['content_preview']}\n"
         
@@ -0,0 +1,169 @@
+"""
+Background folder analysis jobs
+POST /api/analyze/jobs starts an analysis and returns a job id at once; the
+job records every progress report from FolderAnalyzer as a numbered event,
+which clients follow over Server-Sent Events (resuming with Last-Event-ID),
+and keeps the result for paged retrieval once it is done.
+"""
+import json
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+from config import settings
+
+
+# Finished jobs kept in memory, oldest dropped first
+MAX_JOBS = 20
+
+# Seconds between checks for new events, and between SSE keep-alive comments
+EVENT_POLL_SECONDS = 0.25
+KEEPALIVE_SECONDS = 15
+
+
+class AnalysisJob:
+    """One analysis run: its status, numbered events and result"""
+
+    def __init__(self, root_path: Path, force: bool = False):
+        self.id = uuid.uuid4().hex[:12]
+        self.root_path = root_path
+        self.force = force
+        self.status = 'queued'
+        self.phase = 'queued'
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.events: List[Dict] = []
+        self.result: Optional[Dict] = None
+        self.tree = None  # This run's CompactTree, for paging once done
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def add_event(self, event_type: str, data: Dict):
+        with self._lock:
+            self.events.append({'id': len(self.events) + 1, 'event': event_type, 'data': data})
+
+    def events_after(self, last_id: int) -> List[Dict]:
+        with self._lock:
+            return self.events[last_id:]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed')
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.id,
+            'directory': str(self.root_path),
+            'status': self.status,
+            'phase': self.phase,
+            'events': len(self.events),
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+            'result': self.result,
+        }
+
+
+class AnalysisJobManager:
+    """Runs analysis jobs one at a time on a background thread"""
+
+    def __init__(self, analyzer, db):
+        self.analyzer = analyzer
+        self.db = db
+        self.jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        # Background analyses run one after another, so a burst of jobs
+        # doesn't compete for the disk and the API
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis-job")
+
+    def start(self, root_path: Path, force: bool = False) -> AnalysisJob:
+        job = AnalysisJob(root_path, force)
+        self.jobs[job.id] = job
+        self._evict()
+        job.add_event('progress', {'phase': 'queued'})
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        return self.jobs.get(job_id)
+
+    def _evict(self):
+        """Drop the oldest finished jobs beyond MAX_JOBS"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self.jobs) - MAX_JOBS)]:
+            del self.jobs[job_id]
+
+    def _progress(self, job: AnalysisJob, event: Dict):
+        """Record one FolderAnalyzer progress report as an event"""
+        job.phase = event.get('phase', job.phase)
+        partial = event.get('analysis') or event.get('result')
+        if partial is not None:
+            job.add_event('partial', event)
+        else:
+            job.add_event('progress', event)
+
+    def _run(self, job: AnalysisJob):
+        job.status = 'running'
+        try:
+            print(f"\n🔍 Starting folder analysis job {job.id}...")
+            structure, analysis, suggestions, diff, run = self.analyzer.perform_full_analysis(
+                job.root_path, progress=lambda event: self._progress(job, event), force=job.force
+            )
+            tree = job.tree = run['tree']
+            top_levels = tree.to_dict(max_depth=settings.analysis_response_depth)
+            del structure
+
+            total_files = top_levels.get('file_count', 0)
+            self.db.save_folder_analysis(
+                total_files=total_files,
+                folder_structure={"root": str(job.root_path), "diff": diff} if diff else top_levels,
+                optimization_suggestions=suggestions
+            )
+
+            job.result = {
+                'analysis': analysis,
+                'suggestions': suggestions,
+                'diff': diff,
+                'token_usage': run['token_usage'],
+                'cache': run['cache'],
+                'total_files': total_files,
+                'directories': len(tree),
+            }
+            # The terminal event goes first: stream() stops once it sees the status
+            job.phase = 'done'
+            job.finished_at = time.time()
+            job.add_event('done', {'phase': 'done', 'total_files': total_files,
+                                   'directories': len(tree)})
+            job.status = 'done'
+
+        except Exception as e:
+            print(f"Error in analysis job {job.id}: {e}")
+            job.error = str(e)
+            job.phase = 'failed'
+            job.finished_at = time.time()
+            job.add_event('failed', {'phase': 'failed', 'error': str(e)})
+            job.status = 'failed'
+
+    async def stream(self, job: AnalysisJob, last_event_id: int = 0) -> AsyncIterator[str]:
+        """Server-Sent Events for a job, starting after last_event_id, until it finishes"""
+        last_sent = time.monotonic()
+        while True:
+            events = job.events_after(last_event_id)
+            for event in events:
+                last_event_id = event['id']
+                yield (f"id: {event['id']}\nevent: {event['event']}\n"
+                       f"data: {json.dumps(event['data'], default=str)}\n\n")
+            if events:
+                last_sent = time.monotonic()
+            elif job.finished:
+                return
+            elif time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(EVENT_POLL_SECONDS)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,47 @@
+"""
+Async access to the Database for FastAPI handlers
+Every Database method is exposed as a coroutine that runs on a dedicated
+executor, so a slow query or lock wait never blocks the event loop.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from config import settings
+from database import Database
+
+
+class AsyncDatabase:
+    """
+    Awaitable counterpart of Database with the same method names
+
+    Queries run on a small pool of DB threads. Each thread keeps its own
+    connection, and WAL lets their reads proceed alongside the monitor's writes.
+    """
+
+    def __init__(self, db: Database, max_workers: Optional[int] = None):
+        self.db = db
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.db_executor_workers,
+            thread_name_prefix="db"
+        )
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(attr, *args, **kwargs))
+
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, call)
+        return call
+
+    async def close(self):
+        """Close the DB threads' connections, then stop the executor"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.db.close)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,345 @@
+"""
+Columnar in-memory folder trees
+A scanned structure dict costs several hundred bytes per directory in dicts,
+lists and repeated strings. CompactTree keeps directories in pre-order in
+flat typed arrays (parent, subtree end, interned name, own file count and
+size) with sparse per-directory extension and modification-year counts, so
+every subtree is a contiguous index range: totals are prefix-sum differences
+and histograms are slices. Dict nodes are rebuilt only for the subtrees a
+client asks for. Aggregations use NumPy when it is installed.
+"""
+import os
+import sys
+import json
+import struct
+import time
+from array import array
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+MAGIC = b'SFOTREE1'
+
+# magic, little-endian flag, directories, extension pairs, year pairs, and
+# byte lengths of the root path, name table, extension table and error blob
+HEADER = struct.Struct('<8sB7I')
+
+# Column name, array typecode; directories, extension pairs and year pairs
+# columns are sized n, E and Y, offsets n + 1
+COLUMNS = (
+    ('parent', 'i'),
+    ('end', 'I'),
+    ('name', 'I'),
+    ('own_files', 'I'),
+    ('own_size', 'Q'),
+    ('ext_offsets', 'I'),
+    ('ext_ids', 'I'),
+    ('ext_counts', 'I'),
+    ('year_offsets', 'I'),
+    ('year_values', 'H'),
+    ('year_counts', 'I'),
+)
+
+# Upper bounds (years before the current year) of the age histogram buckets
+AGE_BUCKETS = ((0, 'this year'), (1, 'last year'), (4, '2-4 years'), (None, '5+ years'))
+
+
+class CompactTree:
+    """
+    A scanned folder tree in parallel arrays, one entry per directory
+
+    Directory i's subtree is the index range [i, end[i]); its children are
+    i + 1, then each next sibling at the previous child's end.
+    """
+
+    def __init__(self, root_path: str):
+        self.root_path = root_path
+        self.names: List[str] = []
+        self.extensions: List[str] = []
+        self.errors: Dict[int, str] = {}
+        for column, typecode in COLUMNS:
+            setattr(self, column, array(typecode))
+        self._name_ids: Dict[str, int] = {}
+        self._extension_ids: Dict[str, int] = {}
+        self._totals: Optional[Tuple] = None
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_structure(cls, structure: Dict) -> "CompactTree":
+        """Convert a structure dict (as built by TreeScanner) into columns"""
+        tree = cls(structure['path'])
+        tree.ext_offsets.append(0)
+        tree.year_offsets.append(0)
+
+        stack: List[Tuple[Dict, int]] = [(structure, -1)]
+        while stack:
+            node, parent = stack.pop()
+            index = len(tree.parent)
+            children = node.get('children', [])
+
+            tree.parent.append(parent)
+            tree.end.append(0)
+            tree.name.append(tree._intern(tree.names, tree._name_ids, node.get('name', '')))
+            tree.own_files.append(node.get('file_count', 0) - sum(c.get('file_count', 0) for c in children))
+            tree.own_size.append(node.get('total_size', 0) - sum(c.get('total_size', 0) for c in children))
+            if 'error' in node:
+                tree.errors[index] = node['error']
+
+            for extension, count in node.get('extensions', {}).items():
+                tree.ext_ids.append(tree._intern(tree.extensions, tree._extension_ids, extension))
+                tree.ext_counts.append(count)
+            tree.ext_offsets.append(len(tree.ext_ids))
+            for year, count in node.get('years', {}).items():
+                tree.year_values.append(int(year))
+                tree.year_counts.append(count)
+            tree.year_offsets.append(len(tree.year_values))
+
+            stack.extend((child, index) for child in reversed(children))
+
+        # Subtree sizes bottom-up: children always follow their parent
+        sizes = array('I', [1]) * len(tree.parent)
+        for index in range(len(tree.parent) - 1, 0, -1):
+            sizes[tree.parent[index]] += sizes[index]
+        for index in range(len(tree.parent)):
+            tree.end[index] = index + sizes[index]
+
+        # The lookup tables are only needed while interning
+        tree._name_ids = {}
+        tree._extension_ids = {}
+        return tree
+
+    @staticmethod
+    def _intern(table: List[str], ids: Dict[str, int], value: str) -> int:
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(table)
+            table.append(value)
+        return index
+
+    # ------------------------------------------------------------------
+    # Navigation
+    # ------------------------------------------------------------------
+
+    def children(self, index: int) -> Iterator[int]:
+        child = index + 1
+        while child < self.end[index]:
+            yield child
+            child = self.end[child]
+
+    def path_of(self, index: int) -> str:
+        parts = []
+        while index > 0:
+            parts.append(self.names[self.name[index]])
+            index = self.parent[index]
+        return os.path.join(self.root_path, *reversed(parts))
+
+    def find(self, path: str) -> Optional[int]:
+        """Index of the directory at path (absolute, or relative to the root)"""
+        if os.path.isabs(path):
+            try:
+                path = os.path.relpath(path, self.root_path)
+            except ValueError:
+                return None
+            if path.startswith('..'):
+                return None
+        index = 0
+        for part in Path(path).parts:
+            if part == '.':
+                continue
+            index = next((child for child in self.children(index)
+                          if self.names[self.name[child]] == part), None)
+            if index is None:
+                return None
+        return index
+
+    # ------------------------------------------------------------------
+    # Aggregation
+    # ------------------------------------------------------------------
+
+    def subtree_totals(self) -> Tuple:
+        """Per-directory subtree file counts and sizes, from prefix sums over the pre-order"""
+        if self._totals is None:
+            if np is not None:
+                end = np.frombuffer(self.end, dtype=np.uint32).astype(np.int64)
+                files = np.zeros(len(self) + 1, dtype=np.int64)
+                sizes = np.zeros(len(self) + 1, dtype=np.uint64)
+                np.cumsum(np.frombuffer(self.own_files, dtype=np.uint32), out=files[1:])
+                np.cumsum(np.frombuffer(self.own_size, dtype=np.uint64), out=sizes[1:])
+                start = np.arange(len(self), dtype=np.int64)
+                self._totals = (files[end] - files[start], sizes[end] - sizes[start])
+            else:
+                files = array('Q', [0]) + array('Q', accumulate(self.own_files))
+                sizes = array('Q', [0]) + array('Q', accumulate(self.own_size))
+                self._totals = (
+                    array('Q', (files[self.end[i]] - files[i] for i in range(len(self)))),
+                    array('Q', (sizes[self.end[i]] - sizes[i] for i in range(len(self)))),
+                )
+        return self._totals
+
+    def extension_histogram(self, index: int = 0) -> Dict[str, int]:
+        """Files per extension in a subtree"""
+        start, stop = self.ext_offsets[index], self.ext_offsets[self.end[index]]
+        if np is not None and stop > start:
+            counts = np.bincount(np.frombuffer(self.ext_ids, dtype=np.uint32)[start:stop],
+                                 weights=np.frombuffer(self.ext_counts, dtype=np.uint32)[start:stop])
+            return {self.extensions[i]: int(count) for i, count in enumerate(counts) if count}
+        histogram: Dict[str, int] = {}
+        for i in range(start, stop):
+            extension = self.extensions[self.ext_ids[i]]
+            histogram[extension] = histogram.get(extension, 0) + self.ext_counts[i]
+        return histogram
+
+    def year_histogram(self, index: int = 0) -> Dict[int, int]:
+        """Files per modification year in a subtree"""
+        start, stop = self.year_offsets[index], self.year_offsets[self.end[index]]
+        histogram: Dict[int, int] = {}
+        for i in range(start, stop):
+            year = self.year_values[i]
+            histogram[year] = histogram.get(year, 0) + self.year_counts[i]
+        return dict(sorted(histogram.items()))
+
+    def age_histogram(self, index: int = 0) -> Dict[str, int]:
+        """Files per age bucket (this year, last year, 2-4 years, 5+ years) in a subtree"""
+        current = time.localtime().tm_year
+        histogram = {label: 0 for _, label in AGE_BUCKETS}
+        for year, count in self.year_histogram(index).items():
+            age = max(0, current - year)
+            label = next(label for bound, label in AGE_BUCKETS if bound is None or age <= bound)
+            histogram[label] += count
+        return histogram
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns and string tables"""
+        columns = sum(len(getattr(self, column)) * getattr(self, column).itemsize
+                      for column, _ in COLUMNS)
+        strings = sum(sys.getsizeof(value) for value in self.names + self.extensions)
+        return columns + strings
+
+    # ------------------------------------------------------------------
+    # Dict form
+    # ------------------------------------------------------------------
+
+    def to_dict(self, index: int = 0, max_depth: Optional[int] = None) -> Dict:
+        """
+        Rebuild the structure dict of one subtree
+
+        Args:
+            max_depth: Levels of children to include; directories whose
+                children were cut off get "truncated": True
+        """
+        files, sizes = self.subtree_totals()
+
+        def node(i: int, path: str) -> Dict:
+            result = {
+                'path': path,
+                'name': self.names[self.name[i]],
+                'type': 'directory',
+                'children': [],
+                'file_count': int(files[i]),
+                'total_size': int(sizes[i]),
+                'extensions': {self.extensions[self.ext_ids[j]]: self.ext_counts[j]
+                               for j in range(self.ext_offsets[i], self.ext_offsets[i + 1])},
+                'years': {str(self.year_values[j]): self.year_counts[j]
+                          for j in range(self.year_offsets[i], self.year_offsets[i + 1])},
+            }
+            if i in self.errors:
+                result['error'] = self.errors[i]
+            return result
+
+        root = node(index, self.path_of(index))
+        stack = [(index, root, 0)]
+        while stack:
+            i, result, depth = stack.pop()
+            if i + 1 == self.end[i]:
+                continue
+            if max_depth is not None and depth >= max_depth:
+                result['truncated'] = True
+                continue
+            for child in self.children(i):
+                child_node = node(child, os.path.join(result['path'], self.names[self.name[child]]))
+                result['children'].append(child_node)
+                stack.append((child, child_node, depth + 1))
+        return root
+
+    def rows(self, offset: int = 0, limit: int = 1000) -> List[Dict]:
+        """
+        Directories offset..offset+limit in pre-order as flat rows
+
+        Each row has its index, parent index and subtree end, so a client
+        paging through the whole tree can reassemble it.
+        """
+        files, sizes = self.subtree_totals()
+        return [
+            {
+                'index': i,
+                'parent': self.parent[i],
+                'end': self.end[i],
+                'path': self.path_of(i),
+                'name': self.names[self.name[i]],
+                'file_count': int(files[i]),
+                'total_size': int(sizes[i]),
+            }
+            for i in range(max(0, offset), min(len(self), offset + limit))
+        ]
+
+    # ------------------------------------------------------------------
+    # Binary format
+    # ------------------------------------------------------------------
+
+    def save(self, path: Path):
+        """Write the tree as a header, string tables and raw column bytes"""
+        root = self.root_path.encode()
+        names = "\0".join(self.names).encode()
+        extensions = "\0".join(self.extensions).encode()
+        errors = json.dumps(self.errors).encode() if self.errors else b''
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(path.suffix + '.tmp')
+        with open(temporary, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, sys.byteorder == 'little', len(self),
+                                len(self.ext_ids), len(self.year_values),
+                                len(root), len(names), len(extensions), len(errors)))
+            for blob in (root, names, extensions, errors):
+                f.write(blob)
+            for column, _ in COLUMNS:
+                getattr(self, column).tofile(f)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "CompactTree":
+        with open(path, 'rb') as f:
+            (magic, little_endian, directories, ext_pairs, year_pairs,
+             root_length, names_length, extensions_length, errors_length) = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a compact tree file")
+
+            tree = cls(f.read(root_length).decode())
+            names = f.read(names_length).decode()
+            extensions = f.read(extensions_length).decode()
+            errors = f.read(errors_length)
+            tree.names = names.split("\0") if directories else []
+            tree.extensions = extensions.split("\0") if ext_pairs else []
+            tree.errors = {int(index): message for index, message in json.loads(errors).items()} if errors else {}
+
+            lengths = {'ext_ids': ext_pairs, 'ext_counts': ext_pairs,
+                       'year_values': year_pairs, 'year_counts': year_pairs,
+                       'ext_offsets': directories + 1, 'year_offsets': directories + 1}
+            for column, _ in COLUMNS:
+                values = getattr(tree, column)
+                values.fromfile(f, lengths.get(column, directories))
+                if bool(little_endian) != (sys.byteorder == 'little'):
+                    values.byteswap()
+        return tree
@@ -36,6 +36,15 @@ class Settings(BaseSettings):
     # Directory to monitor
     monitor_directory: str = str(Path.home() / "Downloads")
     
+    # File system observer: native (FSEvents/inotify) or scandir (polling,
+    # for NFS/SMB mounts and very large directories)
+    monitor_observer: str = "native"
+    
+    # Polling interval bounds in seconds for the scandir observer
+    # (the interval backs off towards the maximum while nothing changes)
+    monitor_poll_min_interval: float = 1.0
+    monitor_poll_max_interval: float = 30.0
+    
     # Enable/disable features
     auto_organize_enabled: bool = True
     enable_notifications: bool = True
@@ -59,9 +68,105 @@ class Settings(BaseSettings):
     # Log what data is sent to AI (for auditing)
     log_ai_requests: bool = False
     
+    # ============================================
+    # DUPLICATE DETECTION
+    # ============================================
+    # Skip classification for files whose content was already organized
+    enable_duplicate_detection: bool = True
+    
+    # What to do with a duplicate download: delete, hardlink, keep
+    # - delete: remove the new copy
+    # - hardlink: replace the new copy with a hardlink to the organized file
+    # - keep: leave the new copy in place and tag it in the database
+    duplicate_policy: str = "keep"
+    
+    # Keep a catalog of organized files for "where did it go" lookups and search
+    enable_file_catalog: bool = True
+    
+    # ============================================
+    # FILE TRANSFERS
+    # ============================================
+    # Verify cross-device copies with a BLAKE2 checksum before removing the source
+    transfer_verify_checksum: bool = False
+    
+    # Number of cross-device copies fsynced together during reorganizations
+    transfer_fsync_batch_size: int = 16
+    
+    # Reorganization operations run in parallel: in flight overall, and per device
+    reorganize_workers: int = 16
+    reorganize_device_concurrency: int = 8
+    
+    # Journal every reorganization operation (intent before, completion after)
+    # so interrupted runs can be resumed or rolled back, and runs undone
+    enable_reorg_journal: bool = True
+    reorg_journal_dir: str = "./data/journal"
+    
+    # Folder analysis: scanner threads, and directories queued before
+    # workers start scanning subtrees inline
+    scan_workers: int = 8
+    scan_queue_size: int = 1024
+    
+    # Incremental rescans reuse folders whose mtime is unchanged, which misses
+    # files rewritten in place; every folder is listed again after this many
+    # incremental scans or hours (0 = never), and on forced analyses
+    snapshot_full_rescan_scans: int = 10
+    snapshot_full_rescan_hours: float = 24
+    
+    # Token budget for the folder tree summary included in each analysis prompt
+    analysis_summary_tokens: int = 3000
+    
+    # Trees with more folders than this are analyzed map-reduce: one prompt per
+    # partition of at most this many folders, N at a time, then one merge prompt
+    analysis_partition_directories: int = 300
+    analysis_concurrency: int = 4
+    
+    # Hours an analysis of an unchanged tree is served from cache (0 = no cache)
+    analysis_cache_ttl_hours: float = 24
+    
+    # Analyzed trees are kept in a compact binary form here; /api/analyze
+    # returns this many folder levels inline, deeper ones via /api/analyze/tree
+    analysis_tree_dir: str = "./data/trees"
+    analysis_response_depth: int = 2
+    
+    # /api/optimize with execute: run migration plan operations while Claude
+    # is still generating the plan (each one passes a safety gate first)
+    pipelined_reorganization: bool = False
+    
     # Database
     database_path: str = "./data/file_organizer.db"
     
+    # Threads serving database queries for the async API handlers
+    db_executor_workers: int = 4
+    
+    # Write-behind operation logging: flush every N ms or M records
+    write_behind_flush_ms: int = 50
+    write_behind_batch_size: int = 500
+    
+    # Write operation records immediately in the caller's thread (tests/debugging)
+    write_behind_synchronous: bool = False
+    
+    # ============================================
+    # RETENTION
+    # ============================================
+    # Move old history into compressed monthly partitions of an archive database
+    # on a schedule (opt-in; POST /api/retention/run applies the policies once)
+    retention_enabled: bool = False
+    retention_archive_path: str = "./data/file_organizer_archive.db"
+    
+    # Age (days) after which operations / email reports are archived (0 = keep forever)
+    retention_operations_days: int = 180
+    retention_reports_days: int = 90
+    
+    # Number of most recent folder analyses kept in the main database (0 = keep all)
+    retention_analyses_keep: int = 5
+    
+    # Hourly statistics older than this are dropped; daily counts are kept forever
+    retention_hourly_stats_days: int = 30
+    
+    # Hours between retention runs, and free pages released per idle vacuum step
+    retention_interval_hours: float = 24
+    retention_vacuum_pages: int = 1000
+    
     # Logging
     log_level: str = "INFO"
     
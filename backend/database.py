@@ -3,99 +3,435 @@ Database management for file tracking and organization history
 """
 import sqlite3
 import json
+import time
+import threading
+import functools
+import weakref
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
 from contextlib import contextmanager
 
 
+# Bytes of the database file memory-mapped for reads
+MMAP_SIZE = 256 * 1024 * 1024
+
+# Milliseconds a connection waits for a lock held by another connection
+BUSY_TIMEOUT_MS = 5000
+
+# Prepared statements cached per connection
+STATEMENT_CACHE_SIZE = 256
+
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Released migrations must never be edited - append a new one instead.
+MIGRATIONS = [
+    (1, "Initial schema", [
+        # File operations history
+        """
+        CREATE TABLE IF NOT EXISTS file_operations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            original_path TEXT NOT NULL,
+            new_path TEXT,
+            operation_type TEXT NOT NULL,
+            file_type TEXT,
+            classification TEXT,
+            confidence REAL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'pending'
+        )
+        """,
+        # Folder structure analysis
+        """
+        CREATE TABLE IF NOT EXISTS folder_analysis (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            analysis_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+            total_files INTEGER,
+            folder_structure TEXT,
+            optimization_suggestions TEXT,
+            user_choice TEXT
+        )
+        """,
+        # File reminders
+        """
+        CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_path TEXT NOT NULL,
+            reminder_time DATETIME NOT NULL,
+            message TEXT,
+            status TEXT DEFAULT 'active',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # User preferences
+        """
+        CREATE TABLE IF NOT EXISTS preferences (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # Email reports
+        """
+        CREATE TABLE IF NOT EXISTS email_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipient_email TEXT NOT NULL,
+            report_data TEXT,
+            sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'sent'
+        )
+        """,
+    ]),
+    (2, "Content hashes of organized files (duplicate detection)", [
+        """
+        CREATE TABLE IF NOT EXISTS file_hashes (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime REAL,
+            quick_hash TEXT,
+            full_hash TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_file_hashes_size ON file_hashes(size)",
+    ]),
+    (3, "Indexes for recent operations, statistics and reminder polling", [
+        # get_recent_operations (ORDER BY timestamp) and the "today" range scan
+        "CREATE INDEX IF NOT EXISTS idx_file_operations_timestamp ON file_operations(timestamp)",
+        # get_statistics GROUP BY operation_type, answered from the index alone
+        "CREATE INDEX IF NOT EXISTS idx_file_operations_type ON file_operations(operation_type)",
+        # get_active_reminders: equality on status, range and order on reminder_time
+        "CREATE INDEX IF NOT EXISTS idx_reminders_status_time ON reminders(status, reminder_time)",
+        "ANALYZE",
+    ]),
+    (4, "Incrementally maintained operation statistics", [
+        # Counters per bucket: total, type, category, day (YYYY-MM-DD), hour (YYYY-MM-DD HH).
+        # There is deliberately no delete trigger - pruned history keeps its counts.
+        """
+        CREATE TABLE IF NOT EXISTS operation_stats (
+            bucket TEXT NOT NULL,
+            bucket_key TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket, bucket_key)
+        ) WITHOUT ROWID
+        """,
+        # One-off backfill from existing history
+        """
+        INSERT INTO operation_stats (bucket, bucket_key, count)
+        SELECT 'total', '', COUNT(*) FROM file_operations
+        """,
+        """
+        INSERT INTO operation_stats (bucket, bucket_key, count)
+        SELECT 'type', operation_type, COUNT(*) FROM file_operations GROUP BY operation_type
+        """,
+        """
+        INSERT INTO operation_stats (bucket, bucket_key, count)
+        SELECT 'category', COALESCE(file_type, 'unknown'), COUNT(*) FROM file_operations
+        GROUP BY COALESCE(file_type, 'unknown')
+        """,
+        """
+        INSERT INTO operation_stats (bucket, bucket_key, count)
+        SELECT 'day', substr(timestamp, 1, 10), COUNT(*) FROM file_operations
+        WHERE timestamp IS NOT NULL GROUP BY substr(timestamp, 1, 10)
+        """,
+        """
+        INSERT INTO operation_stats (bucket, bucket_key, count)
+        SELECT 'hour', substr(timestamp, 1, 13), COUNT(*) FROM file_operations
+        WHERE timestamp IS NOT NULL GROUP BY substr(timestamp, 1, 13)
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_file_operations_stats
+        AFTER INSERT ON file_operations
+        BEGIN
+            INSERT INTO operation_stats (bucket, bucket_key, count) VALUES ('total', '', 1)
+                ON CONFLICT(bucket, bucket_key) DO UPDATE SET count = count + 1;
+            INSERT INTO operation_stats (bucket, bucket_key, count) VALUES ('type', NEW.operation_type, 1)
+                ON CONFLICT(bucket, bucket_key) DO UPDATE SET count = count + 1;
+            INSERT INTO operation_stats (bucket, bucket_key, count) VALUES ('category', COALESCE(NEW.file_type, 'unknown'), 1)
+                ON CONFLICT(bucket, bucket_key) DO UPDATE SET count = count + 1;
+            INSERT INTO operation_stats (bucket, bucket_key, count) VALUES ('day', substr(COALESCE(NEW.timestamp, CURRENT_TIMESTAMP), 1, 10), 1)
+                ON CONFLICT(bucket, bucket_key) DO UPDATE SET count = count + 1;
+            INSERT INTO operation_stats (bucket, bucket_key, count) VALUES ('hour', substr(COALESCE(NEW.timestamp, CURRENT_TIMESTAMP), 1, 13), 1)
+                ON CONFLICT(bucket, bucket_key) DO UPDATE SET count = count + 1;
+        END
+        """,
+    ]),
+    (5, "Indexes for filtered keyset pagination of operation history", [
+        # Filters by type or category, walked in id order
+        "CREATE INDEX IF NOT EXISTS idx_file_operations_type_id ON file_operations(operation_type, id)",
+        "CREATE INDEX IF NOT EXISTS idx_file_operations_category_id ON file_operations(file_type, id)",
+        # Superseded by the composite index above
+        "DROP INDEX IF EXISTS idx_file_operations_type",
+    ]),
+    (6, "Catalog of organized files keyed by current path", [
+        # content_hash is the quick hash (size + first/last 64 KB, see duplicate_detector)
+        """
+        CREATE TABLE IF NOT EXISTS file_catalog (
+            path TEXT PRIMARY KEY,
+            directory TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            original_path TEXT,
+            category TEXT,
+            size INTEGER,
+            mtime REAL,
+            content_hash TEXT,
+            history TEXT NOT NULL DEFAULT '[]',
+            status TEXT NOT NULL DEFAULT 'present',
+            organized_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_file_catalog_filename ON file_catalog(filename COLLATE NOCASE)",
+        "CREATE INDEX IF NOT EXISTS idx_file_catalog_hash ON file_catalog(content_hash)",
+        "CREATE INDEX IF NOT EXISTS idx_file_catalog_original ON file_catalog(original_path)",
+        "CREATE INDEX IF NOT EXISTS idx_file_catalog_category ON file_catalog(category)",
+        "CREATE INDEX IF NOT EXISTS idx_file_catalog_directory ON file_catalog(directory)",
+        # Backfill from move history; size, mtime and hash are filled in by
+        # the catalog's startup reconciliation
+        """
+        INSERT OR REPLACE INTO file_catalog
+        (path, directory, filename, original_path, category, history, organized_at)
+        SELECT new_path,
+               substr(rtrim(new_path, replace(new_path, '/', '')), 1,
+                      length(rtrim(new_path, replace(new_path, '/', ''))) - 1),
+               filename, original_path, file_type,
+               json_array(json_object('from', original_path, 'to', new_path,
+                                      'at', timestamp, 'by', 'history')),
+               timestamp
+        FROM file_operations
+        WHERE operation_type = 'moved' AND new_path IS NOT NULL
+        ORDER BY id
+        """,
+    ]),
+    (7, "Searchable filename tokens and content previews in the catalog", [
+        # The FTS5 index over these columns is created by search_index, since
+        # FTS5 is an optional SQLite module
+        "ALTER TABLE file_catalog ADD COLUMN name_tokens TEXT",
+        "ALTER TABLE file_catalog ADD COLUMN preview TEXT",
+    ]),
+    (8, "Per-directory Merkle snapshots of analyzed trees", [
+        """
+        CREATE TABLE IF NOT EXISTS tree_snapshot_roots (
+            root TEXT PRIMARY KEY,
+            max_depth INTEGER NOT NULL,
+            hash TEXT,
+            directories INTEGER,
+            file_count INTEGER,
+            total_size INTEGER,
+            scanned_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # One row per directory; file_count/total_size are its own files,
+        # subtree_* include descendants; children is a JSON list of names
+        """
+        CREATE TABLE IF NOT EXISTS tree_snapshots (
+            root TEXT NOT NULL,
+            path TEXT NOT NULL,
+            mtime_ns INTEGER,
+            file_count INTEGER NOT NULL,
+            total_size INTEGER NOT NULL,
+            files_hash TEXT NOT NULL,
+            children TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            subtree_files INTEGER NOT NULL,
+            subtree_size INTEGER NOT NULL,
+            PRIMARY KEY (root, path)
+        ) WITHOUT ROWID
+        """,
+    ]),
+    (9, "Per-directory extension counts in tree snapshots", [
+        "ALTER TABLE tree_snapshots ADD COLUMN extensions TEXT",
+        # Existing snapshots have no counts; the next analysis rescans in full
+        "DELETE FROM tree_snapshots",
+        "DELETE FROM tree_snapshot_roots",
+    ]),
+    (10, "Cache of folder analyses keyed by tree fingerprint", [
+        """
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            fingerprint TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_version INTEGER NOT NULL,
+            root TEXT,
+            analysis TEXT NOT NULL,
+            suggestions TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (fingerprint, model, prompt_version)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_analysis_cache_created ON analysis_cache(created_at)",
+    ]),
+    (11, "Per-directory modification year counts in tree snapshots", [
+        "ALTER TABLE tree_snapshots ADD COLUMN years TEXT",
+        # Existing snapshots have no counts; the next analysis rescans in full
+        "DELETE FROM tree_snapshots",
+        "DELETE FROM tree_snapshot_roots",
+    ]),
+    (12, "Full rescan bookkeeping for tree snapshots", [
+        "ALTER TABLE tree_snapshot_roots ADD COLUMN full_scan_at DATETIME",
+        "ALTER TABLE tree_snapshot_roots ADD COLUMN incremental_scans INTEGER NOT NULL DEFAULT 0",
+    ]),
+]
+
+# Moves remembered per catalog entry
+CATALOG_HISTORY_LIMIT = 50
+
+
+def track_latency(method):
+    """Record the wall time of a Database method in its query metrics"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._record_latency(method.__name__, time.perf_counter() - start)
+    return wrapper
+
+
+class _ThreadConnection:
+    """A thread's connection; closed once the thread exits and drops its locals"""
+    
+    __slots__ = ('conn', 'generation', 'depth', '__weakref__')
+    
+    def __init__(self, conn: sqlite3.Connection, generation: int):
+        self.conn = conn
+        self.generation = generation
+        self.depth = 0
+        weakref.finalize(self, conn.close)
+
+
 class Database:
     """SQLite database for tracking file operations"""
     
     def __init__(self, db_path: str = "./data/file_organizer.db"):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # One long-lived connection per thread, closed when the thread exits
+        # (its locals are cleared) or all together at shutdown
+        self._local = threading.local()
+        self._connections: "weakref.WeakSet[_ThreadConnection]" = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
+        self._generation = 0
+        
+        self._query_stats: Dict[str, Dict] = {}
+        self._stats_lock = threading.Lock()
+        
         self.init_database()
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open a tuned connection for the calling thread"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        
+        # Only takes effect for a new database; retention converts older ones
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        
+        # WAL lets the API read while the monitor writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        
+        return conn
+    
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Context manager for the calling thread's database connection"""
+        local = getattr(self._local, 'holder', None)
+        if local is None or local.generation != self._generation:
+            local = self._local.holder = _ThreadConnection(self._connect(), self._generation)
+            with self._connections_lock:
+                self._connections.add(local)
+        
+        conn = local.conn
+        local.depth += 1
         try:
             yield conn
-            conn.commit()
+            # Only the outermost block commits
+            if local.depth == 1:
+                conn.commit()
         except Exception as e:
-            conn.rollback()
+            if local.depth == 1:
+                conn.rollback()
             raise e
         finally:
-            conn.close()
+            local.depth -= 1
+    
+    def close(self):
+        """Close every thread's connection (they reopen lazily on next use)"""
+        with self._connections_lock:
+            connections = [holder.conn for holder in self._connections]
+            self._connections = weakref.WeakSet()
+            self._generation += 1
+        
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"Error closing database connection: {e}")
+    
+    def _record_latency(self, name: str, seconds: float):
+        """Accumulate latency for one query method"""
+        with self._stats_lock:
+            stats = self._query_stats.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            stats['count'] += 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+    
+    def get_query_metrics(self) -> Dict:
+        """Get per-method query latency in milliseconds"""
+        with self._stats_lock:
+            return {
+                name: {
+                    'count': stats['count'],
+                    'avg_ms': round(stats['total'] / stats['count'] * 1000, 3),
+                    'max_ms': round(stats['max'] * 1000, 3),
+                    'total_ms': round(stats['total'] * 1000, 3)
+                }
+                for name, stats in sorted(self._query_stats.items())
+            }
     
     def init_database(self):
-        """Initialize database tables"""
+        """Initialize database tables by applying pending migrations"""
+        self.migrate()
+    
+    def get_schema_version(self) -> int:
+        """Get the version of the last applied migration"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # File operations history
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS file_operations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    filename TEXT NOT NULL,
-                    original_path TEXT NOT NULL,
-                    new_path TEXT,
-                    operation_type TEXT NOT NULL,
-                    file_type TEXT,
-                    classification TEXT,
-                    confidence REAL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    status TEXT DEFAULT 'pending'
-                )
-            """)
-            
-            # Folder structure analysis
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS folder_analysis (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    analysis_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    total_files INTEGER,
-                    folder_structure TEXT,
-                    optimization_suggestions TEXT,
-                    user_choice TEXT
-                )
-            """)
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+    
+    def migrate(self, target_version: Optional[int] = None):
+        """
+        Apply schema migrations newer than the database's user_version
+        
+        Each migration runs in its own write transaction together with the
+        version bump, so a failure leaves the database at the previous version.
+        """
+        for version, description, statements in MIGRATIONS:
+            if target_version is not None and version > target_version:
+                break
             
-            # File reminders
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS reminders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    file_path TEXT NOT NULL,
-                    reminder_time DATETIME NOT NULL,
-                    message TEXT,
-                    status TEXT DEFAULT 'active',
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+            with self.get_connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                # Re-check inside the lock in case another process migrated first
+                current = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version <= current:
+                    continue
+                
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
             
-            # User preferences
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS preferences (
-                    key TEXT PRIMARY KEY,
-                    value TEXT,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Email reports
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS email_reports (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    recipient_email TEXT NOT NULL,
-                    report_data TEXT,
-                    sent_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    status TEXT DEFAULT 'sent'
-                )
-            """)
+            print(f"🗄️  Applied database migration {version}: {description}")
     
+    @track_latency
     def log_file_operation(self, filename: str, original_path: str, 
                           new_path: Optional[str], operation_type: str,
                           file_type: Optional[str] = None,
@@ -111,6 +447,7 @@ class Database:
             """, (filename, original_path, new_path, operation_type, file_type, classification, confidence))
             return cursor.lastrowid
     
+    @track_latency
     def update_operation_status(self, operation_id: int, status: str):
         """Update the status of a file operation"""
         with self.get_connection() as conn:
@@ -119,6 +456,7 @@ class Database:
                 UPDATE file_operations SET status = ? WHERE id = ?
             """, (status, operation_id))
     
+    @track_latency
     def save_folder_analysis(self, total_files: int, folder_structure: Dict,
                             optimization_suggestions: Dict, user_choice: str = None):
         """Save folder structure analysis"""
@@ -132,6 +470,46 @@ class Database:
                   json.dumps(optimization_suggestions), user_choice))
             return cursor.lastrowid
     
+    @track_latency
+    def get_cached_analysis(self, fingerprint: str, model: str, prompt_version: int,
+                            max_age_hours: float) -> Optional[Dict]:
+        """
+        Get a cached analysis younger than max_age_hours
+        
+        Returns:
+            Dict with analysis, suggestions and created_at, or None
+        """
+        with self.get_connection() as conn:
+            row = conn.execute("""
+                SELECT analysis, suggestions, created_at FROM analysis_cache
+                WHERE fingerprint = ? AND model = ? AND prompt_version = ?
+                AND created_at >= datetime('now', ?)
+            """, (fingerprint, model, prompt_version, f"-{max_age_hours * 3600:.0f} seconds")).fetchone()
+            if row is None:
+                return None
+            return {
+                'analysis': json.loads(row['analysis']),
+                'suggestions': json.loads(row['suggestions']),
+                'created_at': row['created_at'],
+            }
+    
+    @track_latency
+    def save_cached_analysis(self, fingerprint: str, model: str, prompt_version: int,
+                             root: str, analysis: Dict, suggestions: Dict, max_age_hours: float):
+        """Cache an analysis, dropping entries older than max_age_hours"""
+        with self.get_connection() as conn:
+            conn.execute(
+                "DELETE FROM analysis_cache WHERE created_at < datetime('now', ?)",
+                (f"-{max_age_hours * 3600:.0f} seconds",)
+            )
+            conn.execute("""
+                INSERT OR REPLACE INTO analysis_cache
+                (fingerprint, model, prompt_version, root, analysis, suggestions)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (fingerprint, model, prompt_version, root,
+                  json.dumps(analysis), json.dumps(suggestions)))
+    
+    @track_latency
     def create_reminder(self, file_path: str, reminder_time: datetime, message: str = None) -> int:
         """Create a file reminder"""
         with self.get_connection() as conn:
@@ -142,6 +520,7 @@ class Database:
             """, (file_path, reminder_time, message))
             return cursor.lastrowid
     
+    @track_latency
     def get_active_reminders(self) -> List[Dict]:
         """Get all active reminders"""
         with self.get_connection() as conn:
@@ -153,6 +532,7 @@ class Database:
             """)
             return [dict(row) for row in cursor.fetchall()]
     
+    @track_latency
     def mark_reminder_completed(self, reminder_id: int):
         """Mark a reminder as completed"""
         with self.get_connection() as conn:
@@ -161,6 +541,7 @@ class Database:
                 UPDATE reminders SET status = 'completed' WHERE id = ?
             """, (reminder_id,))
     
+    @track_latency
     def save_preference(self, key: str, value: str):
         """Save a user preference"""
         with self.get_connection() as conn:
@@ -170,6 +551,7 @@ class Database:
                 VALUES (?, ?, datetime('now'))
             """, (key, value))
     
+    @track_latency
     def get_preference(self, key: str, default: str = None) -> Optional[str]:
         """Get a user preference"""
         with self.get_connection() as conn:
@@ -178,6 +560,7 @@ class Database:
             row = cursor.fetchone()
             return row['value'] if row else default
     
+    @track_latency
     def get_recent_operations(self, limit: int = 100) -> List[Dict]:
         """Get recent file operations"""
         with self.get_connection() as conn:
@@ -188,6 +571,118 @@ class Database:
             """, (limit,))
             return [dict(row) for row in cursor.fetchall()]
     
+    def _operation_filters(self, operation_type: Optional[str] = None,
+                           category: Optional[str] = None,
+                           start: Optional[str] = None,
+                           end: Optional[str] = None) -> Tuple[List[str], List]:
+        """Build WHERE clauses for operation history filters"""
+        clauses, params = [], []
+        if operation_type:
+            clauses.append("operation_type = ?")
+            params.append(operation_type)
+        if category:
+            clauses.append("file_type = ?")
+            params.append(category)
+        if start:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            clauses.append("timestamp < ?")
+            params.append(end)
+        return clauses, params
+    
+    @track_latency
+    def get_operations_page(self, limit: int = 50, cursor: Optional[int] = None,
+                            operation_type: Optional[str] = None,
+                            category: Optional[str] = None,
+                            start: Optional[str] = None,
+                            end: Optional[str] = None) -> Dict:
+        """
+        Get one page of operation history, newest first
+        
+        Keyset pagination on id: pass the returned next_cursor to get the next
+        (older) page. Each page is an index seek, however deep the history.
+        
+        Args:
+            limit: Page size
+            cursor: next_cursor from the previous page (None for the first page)
+            operation_type: Only this operation type
+            category: Only this category (file_type)
+            start: Only operations at or after this timestamp (YYYY-MM-DD[ HH:MM:SS])
+            end: Only operations before this timestamp
+        """
+        clauses, params = self._operation_filters(operation_type, category, start, end)
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        
+        with self.get_connection() as conn:
+            rows = conn.execute(f"""
+                SELECT * FROM file_operations {where}
+                ORDER BY id DESC LIMIT ?
+            """, (*params, limit)).fetchall()
+        
+        operations = [dict(row) for row in rows]
+        return {
+            'operations': operations,
+            'next_cursor': operations[-1]['id'] if len(operations) == limit else None
+        }
+    
+    @track_latency
+    def get_operations_since(self, since_id: int, limit: int = 500) -> Dict:
+        """
+        Get operations logged after since_id, oldest first (delta sync)
+        
+        Returns:
+            New operations and latest_id to pass as since_id on the next poll
+        """
+        with self.get_connection() as conn:
+            rows = conn.execute("""
+                SELECT * FROM file_operations WHERE id > ?
+                ORDER BY id LIMIT ?
+            """, (since_id, limit)).fetchall()
+        
+        operations = [dict(row) for row in rows]
+        return {
+            'operations': operations,
+            'latest_id': operations[-1]['id'] if operations else since_id,
+            'has_more': len(operations) == limit
+        }
+    
+    def iter_operations(self, chunk_size: int = 1000,
+                        operation_type: Optional[str] = None,
+                        category: Optional[str] = None,
+                        start: Optional[str] = None,
+                        end: Optional[str] = None) -> Iterator[List[Dict]]:
+        """
+        Iterate over the whole (filtered) history in id order, one chunk at a time
+        
+        Every chunk is a separate keyset query, so memory stays constant and
+        no read transaction is held open between chunks.
+        """
+        clauses, params = self._operation_filters(operation_type, category, start, end)
+        last_id = 0
+        
+        while True:
+            where = " AND ".join(clauses + ["id > ?"])
+            with self.get_connection() as conn:
+                rows = conn.execute(f"""
+                    SELECT * FROM file_operations WHERE {where}
+                    ORDER BY id LIMIT ?
+                """, (*params, last_id, chunk_size)).fetchall()
+            
+            if not rows:
+                return
+            
+            chunk = [dict(row) for row in rows]
+            last_id = chunk[-1]['id']
+            yield chunk
+            
+            if len(chunk) < chunk_size:
+                return
+    
+    @track_latency
     def save_email_report(self, recipient: str, report_data: Dict):
         """Save email report record"""
         with self.get_connection() as conn:
@@ -198,32 +693,370 @@ class Database:
             """, (recipient, json.dumps(report_data)))
             return cursor.lastrowid
     
+    @track_latency
     def get_statistics(self) -> Dict:
-        """Get usage statistics"""
+        """Get usage statistics from the incrementally maintained counters"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
             # Total operations
-            cursor.execute("SELECT COUNT(*) as count FROM file_operations")
-            total_ops = cursor.fetchone()['count']
+            cursor.execute("""
+                SELECT count FROM operation_stats WHERE bucket = 'total' AND bucket_key = ''
+            """)
+            row = cursor.fetchone()
+            total_ops = row['count'] if row else 0
             
             # Operations by type
             cursor.execute("""
-                SELECT operation_type, COUNT(*) as count 
-                FROM file_operations 
-                GROUP BY operation_type
+                SELECT bucket_key, count FROM operation_stats WHERE bucket = 'type'
+            """)
+            ops_by_type = {row['bucket_key']: row['count'] for row in cursor.fetchall()}
+            
+            # Operations by category
+            cursor.execute("""
+                SELECT bucket_key, count FROM operation_stats WHERE bucket = 'category'
             """)
-            ops_by_type = {row['operation_type']: row['count'] for row in cursor.fetchall()}
+            ops_by_category = {row['bucket_key']: row['count'] for row in cursor.fetchall()}
             
             # Files organized today
             cursor.execute("""
-                SELECT COUNT(*) as count FROM file_operations 
-                WHERE date(timestamp) = date('now')
+                SELECT count FROM operation_stats WHERE bucket = 'day' AND bucket_key = date('now')
             """)
-            today_count = cursor.fetchone()['count']
+            row = cursor.fetchone()
+            today_count = row['count'] if row else 0
             
             return {
                 'total_operations': total_ops,
                 'operations_by_type': ops_by_type,
+                'operations_by_category': ops_by_category,
                 'files_organized_today': today_count
             }
+    
+    @track_latency
+    def get_time_series(self, granularity: str = 'day', limit: int = 30) -> List[Dict]:
+        """
+        Get operation counts per day or hour for dashboard charts
+        
+        Args:
+            granularity: 'day' (keys YYYY-MM-DD) or 'hour' (keys YYYY-MM-DD HH)
+            limit: Number of most recent buckets to return
+            
+        Returns:
+            Buckets in chronological order; buckets without operations are omitted
+        """
+        if granularity not in ('day', 'hour'):
+            raise ValueError(f"Unknown granularity: {granularity}")
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT bucket_key, count FROM operation_stats 
+                WHERE bucket = ? ORDER BY bucket_key DESC LIMIT ?
+            """, (granularity, limit))
+            rows = [{'bucket': row['bucket_key'], 'count': row['count']} for row in cursor.fetchall()]
+            rows.reverse()
+            return rows
+    
+    @track_latency
+    def upsert_file_hash(self, path: str, size: int, mtime: float,
+                         quick_hash: Optional[str] = None,
+                         full_hash: Optional[str] = None):
+        """Insert or replace the hash record of an organized file"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT OR REPLACE INTO file_hashes 
+                (path, size, mtime, quick_hash, full_hash, updated_at)
+                VALUES (?, ?, ?, ?, ?, datetime('now'))
+            """, (path, size, mtime, quick_hash, full_hash))
+    
+    @track_latency
+    def update_file_hashes(self, path: str, quick_hash: Optional[str] = None,
+                           full_hash: Optional[str] = None):
+        """Store lazily computed hashes for an indexed file"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE file_hashes 
+                SET quick_hash = COALESCE(?, quick_hash),
+                    full_hash = COALESCE(?, full_hash),
+                    updated_at = datetime('now')
+                WHERE path = ?
+            """, (quick_hash, full_hash, path))
+    
+    @track_latency
+    def rename_file_hash(self, old_path: str, new_path: str):
+        """Re-key a hash record after its file was moved"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE OR REPLACE file_hashes SET path = ?, updated_at = datetime('now')
+                WHERE path = ?
+            """, (new_path, old_path))
+            return cursor.rowcount > 0
+    
+    @track_latency
+    def delete_file_hash(self, path: str):
+        """Remove a stale hash record"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM file_hashes WHERE path = ?", (path,))
+    
+    @track_latency
+    def get_file_hashes_by_size(self, size: int) -> List[Dict]:
+        """Get all indexed files with the given size"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM file_hashes WHERE size = ?", (size,))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    @track_latency
+    def count_file_hashes(self) -> int:
+        """Get the number of indexed files"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) as count FROM file_hashes")
+            return cursor.fetchone()['count']
+    
+    def _catalog_row(self, row: sqlite3.Row) -> Dict:
+        entry = dict(row)
+        entry['history'] = json.loads(entry['history'])
+        return entry
+    
+    @track_latency
+    def record_catalog_move(self, source: str, destination: str, size: Optional[int],
+                            mtime: Optional[float], content_hash: Optional[str],
+                            category: Optional[str] = None, moved_by: str = 'organizer',
+                            name_tokens: Optional[str] = None,
+                            preview: Optional[str] = None):
+        """
+        Point a catalog entry at a file's new location, appending to its history
+        
+        The entry for source (or destination, if a watcher already moved it)
+        is carried over; a file seen for the first time starts a new entry.
+        Category and preview are kept from the old entry unless given.
+        """
+        with self.get_connection() as conn:
+            row = conn.execute("""
+                SELECT * FROM file_catalog WHERE path IN (?, ?)
+                ORDER BY path = ? DESC LIMIT 1
+            """, (source, destination, source)).fetchone()
+            
+            history = json.loads(row['history']) if row else []
+            if not history or history[-1]['to'] != destination:
+                history.append({
+                    'from': source,
+                    'to': destination,
+                    'at': datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+                    'by': moved_by
+                })
+            history = history[-CATALOG_HISTORY_LIMIT:]
+            
+            original_path = (row['original_path'] if row else None) or source
+            category = category or (row['category'] if row else None)
+            preview = preview or (row['preview'] if row else None)
+            
+            if row and row['path'] != destination:
+                conn.execute("DELETE FROM file_catalog WHERE path = ?", (row['path'],))
+            conn.execute("""
+                INSERT INTO file_catalog
+                (path, directory, filename, original_path, category, size, mtime,
+                 content_hash, history, status, name_tokens, preview)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'present', ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    original_path = excluded.original_path,
+                    category = excluded.category,
+                    size = excluded.size,
+                    mtime = excluded.mtime,
+                    content_hash = excluded.content_hash,
+                    history = excluded.history,
+                    status = 'present',
+                    name_tokens = excluded.name_tokens,
+                    preview = excluded.preview,
+                    updated_at = CURRENT_TIMESTAMP
+            """, (destination, str(Path(destination).parent), Path(destination).name,
+                  original_path, category, size, mtime, content_hash, json.dumps(history),
+                  name_tokens, preview))
+    
+    @track_latency
+    def rename_catalog_directory(self, old_dir: str, new_dir: str) -> int:
+        """Re-point every entry under a renamed directory"""
+        with self.get_connection() as conn:
+            cursor = conn.execute("""
+                UPDATE file_catalog SET
+                    path = ? || substr(path, ?),
+                    directory = ? || substr(directory, ?),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE path > ? AND path < ?
+            """, (new_dir, len(old_dir) + 1, new_dir, len(old_dir) + 1,
+                  old_dir + '/', old_dir + '0'))
+            return cursor.rowcount
+    
+    @track_latency
+    def update_catalog_file(self, path: str, size: Optional[int], mtime: Optional[float],
+                            content_hash: Optional[str], status: str = 'present'):
+        """Refresh an entry's stat and hash, or mark it missing"""
+        with self.get_connection() as conn:
+            conn.execute("""
+                UPDATE file_catalog SET
+                    size = COALESCE(?, size), mtime = COALESCE(?, mtime),
+                    content_hash = COALESCE(?, content_hash),
+                    status = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE path = ?
+            """, (size, mtime, content_hash, status, path))
+    
+    @track_latency
+    def get_catalog_entry(self, path: str) -> Optional[Dict]:
+        """Get the catalog entry of a file by its current path"""
+        with self.get_connection() as conn:
+            row = conn.execute("SELECT * FROM file_catalog WHERE path = ?", (path,)).fetchone()
+            return self._catalog_row(row) if row else None
+    
+    @track_latency
+    def find_catalog_entries(self, name: Optional[str] = None,
+                             content_hash: Optional[str] = None,
+                             original_path: Optional[str] = None,
+                             category: Optional[str] = None,
+                             limit: int = 50) -> List[Dict]:
+        """
+        Look up organized files; every filter is an index lookup
+        
+        Args:
+            name: Exact filename (case-insensitive)
+            content_hash: Quick content hash
+            original_path: Where the file was first organized from
+            category: Category assigned by the classifier
+        """
+        clauses, params = [], []
+        if name:
+            clauses.append("filename = ? COLLATE NOCASE")
+            params.append(name)
+        if content_hash:
+            clauses.append("content_hash = ?")
+            params.append(content_hash)
+        if original_path:
+            clauses.append("original_path = ?")
+            params.append(original_path)
+        if category:
+            clauses.append("category = ?")
+            params.append(category)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        
+        with self.get_connection() as conn:
+            rows = conn.execute(f"""
+                SELECT * FROM file_catalog {where}
+                ORDER BY updated_at DESC LIMIT ?
+            """, (*params, limit)).fetchall()
+            return [self._catalog_row(row) for row in rows]
+    
+    @track_latency
+    def get_catalog_directories(self, limit: int = 1000) -> List[str]:
+        """Get the directories holding cataloged files, most recently used first"""
+        with self.get_connection() as conn:
+            rows = conn.execute("""
+                SELECT directory FROM file_catalog WHERE status = 'present'
+                GROUP BY directory ORDER BY MAX(updated_at) DESC LIMIT ?
+            """, (limit,)).fetchall()
+            return [row['directory'] for row in rows]
+    
+    def iter_catalog(self, chunk_size: int = 500) -> Iterator[List[Dict]]:
+        """Iterate over the catalog in rowid order, one chunk (and connection block) at a time"""
+        last_rowid = 0
+        while True:
+            with self.get_connection() as conn:
+                rows = conn.execute("""
+                    SELECT rowid, path, size, mtime, content_hash, status FROM file_catalog
+                    WHERE rowid > ? ORDER BY rowid LIMIT ?
+                """, (last_rowid, chunk_size)).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1]['rowid']
+            yield [dict(row) for row in rows]
+    
+    @track_latency
+    def get_tree_snapshot(self, root: str) -> Tuple[Optional[Dict], Dict[str, Dict]]:
+        """
+        Load the last snapshot of a tree
+        
+        Returns:
+            (root record or None, directory records keyed by path); the root
+            record includes full_scan_hours, the age of its last full scan
+            (None if it never had one)
+        """
+        with self.get_connection() as conn:
+            meta = conn.execute("""
+                SELECT *, (julianday('now') - julianday(full_scan_at)) * 24 AS full_scan_hours
+                FROM tree_snapshot_roots WHERE root = ?
+            """, (root,)).fetchone()
+            if meta is None:
+                return None, {}
+            
+            directories = {}
+            for row in conn.execute("SELECT * FROM tree_snapshots WHERE root = ?", (root,)):
+                record = dict(row)
+                record['children'] = json.loads(record['children'])
+                record['extensions'] = json.loads(record['extensions'] or '{}')
+                record['years'] = json.loads(record['years'] or '{}')
+                directories[record['path']] = record
+            return dict(meta), directories
+    
+    @track_latency
+    def save_tree_snapshot(self, root: str, max_depth: int, summary: Dict,
+                           changed: List[Dict], removed: List[str], replace: bool = False,
+                           full: bool = False):
+        """
+        Store a tree snapshot, writing only directories that changed
+        
+        Args:
+            summary: Root record fields (hash, directories, file_count, total_size)
+            changed: Directory records that are new or differ from the stored snapshot
+            removed: Paths of directories that no longer exist
+            replace: Drop the stored snapshot first (e.g. max_depth changed)
+            full: Every directory was listed again (resets the rescan schedule)
+        """
+        with self.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if replace:
+                conn.execute("DELETE FROM tree_snapshots WHERE root = ?", (root,))
+            conn.executemany(
+                "DELETE FROM tree_snapshots WHERE root = ? AND path = ?",
+                [(root, path) for path in removed]
+            )
+            conn.executemany("""
+                INSERT OR REPLACE INTO tree_snapshots
+                (root, path, mtime_ns, file_count, total_size, files_hash, children,
+                 hash, subtree_files, subtree_size, extensions, years)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(root, record['path'], record['mtime_ns'], record['file_count'],
+                   record['total_size'], record['files_hash'], json.dumps(record['children']),
+                   record['hash'], record['subtree_files'], record['subtree_size'],
+                   json.dumps(record['extensions']), json.dumps(record['years']))
+                  for record in changed])
+            conn.execute("""
+                INSERT INTO tree_snapshot_roots
+                (root, max_depth, hash, directories, file_count, total_size, scanned_at,
+                 full_scan_at, incremental_scans)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP,
+                        CASE WHEN ? THEN CURRENT_TIMESTAMP END, 0)
+                ON CONFLICT(root) DO UPDATE SET
+                    max_depth = excluded.max_depth,
+                    hash = excluded.hash,
+                    directories = excluded.directories,
+                    file_count = excluded.file_count,
+                    total_size = excluded.total_size,
+                    scanned_at = excluded.scanned_at,
+                    full_scan_at = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE full_scan_at END,
+                    incremental_scans = CASE WHEN ? THEN 0 ELSE incremental_scans + 1 END
+            """, (root, max_depth, summary['hash'], summary['directories'],
+                  summary['file_count'], summary['total_size'], full, full, full))
+    
+    @track_latency
+    def get_moved_destinations(self) -> List[str]:
+        """Get every destination path the organizer has moved a file to"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT DISTINCT new_path FROM file_operations 
+                WHERE operation_type = 'moved' AND new_path IS NOT NULL
+            """)
+            return [row['new_path'] for row in cursor.fetchall()]
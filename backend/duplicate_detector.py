@@ -0,0 +1,195 @@
+"""
+Arrival-time duplicate detection for organized files
+Matches new downloads against everything the organizer has placed using
+progressively more expensive checks: size, 64 KB head/tail hash, full BLAKE2
+"""
+import os
+import mmap
+import hashlib
+from pathlib import Path
+from typing import Dict, Optional
+from config import settings
+from database import Database
+
+
+# Bytes hashed from each end of a file for the quick hash
+HASH_CHUNK_SIZE = 64 * 1024
+
+# Window size when hashing a memory-mapped file
+MMAP_WINDOW_SIZE = 8 * 1024 * 1024
+
+
+def quick_hash(file_path: Path, size: int) -> str:
+    """Hash the size plus the first and last 64 KB of a file"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(size.to_bytes(8, 'little'))
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(HASH_CHUNK_SIZE))
+        if size > 2 * HASH_CHUNK_SIZE:
+            f.seek(-HASH_CHUNK_SIZE, os.SEEK_END)
+            digest.update(f.read(HASH_CHUNK_SIZE))
+        elif size > HASH_CHUNK_SIZE:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def full_hash(file_path: Path) -> str:
+    """Hash the whole file with BLAKE2 through a memory map"""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return digest.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, size, MMAP_WINDOW_SIZE):
+                    digest.update(view[offset:offset + MMAP_WINDOW_SIZE])
+            finally:
+                view.release()
+    return digest.hexdigest()
+
+
+class DuplicateIndex:
+    """
+    Content index over files placed by the organizer
+
+    Records are bucketed by size in the database. Hashes are only computed
+    when a size bucket collides, and cached so each file is read at most once.
+    """
+
+    POLICIES = ('delete', 'hardlink', 'keep')
+
+    def __init__(self, db: Database, policy: str = None):
+        self.db = db
+        self.policy = (policy or settings.duplicate_policy).lower()
+
+        if self.policy not in self.POLICIES:
+            raise ValueError(f"Unknown duplicate policy: {self.policy} "
+                             f"(expected one of {', '.join(self.POLICIES)})")
+
+        if self.db.count_file_hashes() == 0:
+            self._seed_from_history()
+
+    def _seed_from_history(self):
+        """Index files moved before duplicate detection was enabled"""
+        seeded = 0
+        for path in self.db.get_moved_destinations():
+            if self.add(Path(path)):
+                seeded += 1
+        if seeded:
+            print(f"🧬 Duplicate index seeded with {seeded} organized files")
+
+    def add(self, file_path: Path) -> bool:
+        """Index a file the organizer has placed (size only, hashes are lazy)"""
+        try:
+            stat = file_path.stat()
+        except OSError:
+            return False
+
+        if not file_path.is_file():
+            return False
+
+        self.db.upsert_file_hash(str(file_path), stat.st_size, stat.st_mtime)
+        return True
+
+    def moved(self, source: Path, destination: Path):
+        """Carry an indexed file's hashes over to its new location"""
+        if not self.db.rename_file_hash(str(source), str(destination)):
+            self.add(destination)
+
+    def find_duplicate(self, file_path: Path) -> Optional[Path]:
+        """
+        Find an organized file with the same content as file_path
+
+        Returns:
+            Path of the existing copy, or None
+        """
+        try:
+            size = file_path.stat().st_size
+        except OSError:
+            return None
+
+        # Empty files are trivially identical, never treat them as duplicates
+        if size == 0:
+            return None
+
+        candidates = [entry for entry in self.db.get_file_hashes_by_size(size)
+                      if entry['path'] != str(file_path)]
+        if not candidates:
+            return None
+
+        new_quick = quick_hash(file_path, size)
+        new_full = None
+
+        for entry in candidates:
+            candidate = Path(entry['path'])
+            if not self._is_current(candidate, entry):
+                continue
+
+            candidate_quick = entry['quick_hash']
+            if candidate_quick is None:
+                candidate_quick = quick_hash(candidate, size)
+                self.db.update_file_hashes(entry['path'], quick_hash=candidate_quick)
+
+            if candidate_quick != new_quick:
+                continue
+
+            # The quick hash already covers the whole file for small files
+            if size <= 2 * HASH_CHUNK_SIZE:
+                return candidate
+
+            if new_full is None:
+                new_full = full_hash(file_path)
+
+            candidate_full = entry['full_hash']
+            if candidate_full is None:
+                candidate_full = full_hash(candidate)
+                self.db.update_file_hashes(entry['path'], full_hash=candidate_full)
+
+            if candidate_full == new_full:
+                return candidate
+
+        return None
+
+    def _is_current(self, candidate: Path, entry: Dict) -> bool:
+        """Check an index entry still describes the file on disk, dropping it if not"""
+        try:
+            stat = candidate.stat()
+        except OSError:
+            self.db.delete_file_hash(entry['path'])
+            return False
+
+        if stat.st_size != entry['size'] or stat.st_mtime != entry['mtime']:
+            # Content changed since it was indexed - re-index without hashes
+            self.db.upsert_file_hash(entry['path'], stat.st_size, stat.st_mtime)
+            return False
+
+        return True
+
+    def resolve(self, duplicate: Path, existing: Path) -> str:
+        """
+        Apply the configured policy to a duplicate file
+
+        Returns:
+            Outcome: 'deleted', 'hardlinked' or 'kept'
+        """
+        if self.policy == 'delete':
+            duplicate.unlink()
+            return 'deleted'
+
+        if self.policy == 'hardlink':
+            temp_link = duplicate.with_name(f".{duplicate.name}.fimalink")
+            try:
+                os.link(existing, temp_link)
+                os.replace(temp_link, duplicate)
+                return 'hardlinked'
+            except OSError as e:
+                # Different filesystem or no hardlink support - fall back to keeping
+                print(f"⚠️  Could not hardlink duplicate ({e}), keeping it")
+                try:
+                    temp_link.unlink()
+                except OSError:
+                    pass
+
+        return 'kept'
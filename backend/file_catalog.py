@@ -0,0 +1,192 @@
+"""
+Catalog of organized files
+Keeps one row per organized file keyed by its current path, so "where did it
+go" is an index lookup by name, content hash, original path or category
+instead of a scan of the operation log or the filesystem.
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+from watchdog.events import FileSystemEventHandler
+from database import Database
+from duplicate_detector import quick_hash
+from search_index import tokenize_filename
+
+
+# Catalog directories are watched through a few recursive roots, each one
+# emitter (an inotify instance and thread, or a polling thread); directories
+# sharing an ancestor below the home folder are merged into it
+MAX_WATCH_ROOTS = 16
+
+# Catalog directories looked at when attaching
+MAX_CATALOG_DIRECTORIES = 1000
+
+
+class FileCatalog:
+    """
+    Records every move made by the monitor and the reorganizer
+
+    When attached to an observer, the directories holding cataloged files are
+    watched (through a few recursive roots) and renames, edits and deletions
+    made by the user are folded in.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.observer = None
+        self.watcher: Optional["CatalogWatcher"] = None
+        self._roots: Dict[str, object] = {}  # root -> ObservedWatch
+        self._watch_lock = threading.Lock()
+
+    def _stat_and_hash(self, path: Path):
+        """Size, mtime and quick hash of a file, or Nones if it can't be read"""
+        try:
+            stat = path.stat()
+            return stat.st_size, stat.st_mtime, quick_hash(path, stat.st_size)
+        except OSError:
+            return None, None, None
+
+    def record_move(self, source: Path, destination: Path,
+                    category: Optional[str] = None, moved_by: str = 'organizer',
+                    preview: Optional[str] = None):
+        """Catalog a file at its new location (preview: extracted text for search)"""
+        if not destination.is_file():
+            return
+        size, mtime, content_hash = self._stat_and_hash(destination)
+        self.db.record_catalog_move(str(source), str(destination), size, mtime,
+                                    content_hash, category, moved_by,
+                                    tokenize_filename(destination.name), preview)
+        self.watch_directory(destination.parent)
+
+    def refresh(self, path: Path):
+        """Re-read a cataloged file after it changed, or mark it missing"""
+        size, mtime, content_hash = self._stat_and_hash(path)
+        status = 'present' if size is not None else 'missing'
+        self.db.update_catalog_file(str(path), size, mtime, content_hash, status)
+
+    def lookup(self, name: Optional[str] = None, content_hash: Optional[str] = None,
+               original_path: Optional[str] = None, category: Optional[str] = None,
+               file: Optional[Path] = None, limit: int = 50) -> List[Dict]:
+        """
+        Find organized files
+
+        Args:
+            file: A local copy to look up by content (e.g. a re-download)
+        """
+        if file is not None:
+            content_hash = quick_hash(file, file.stat().st_size)
+        return self.db.find_catalog_entries(name, content_hash, original_path, category, limit)
+
+    def reconcile(self) -> Dict:
+        """
+        Bring the catalog in line with the disk after downtime
+
+        Marks vanished files missing, re-hashes files whose size or mtime
+        changed, and fills in hashes for entries backfilled from history.
+        """
+        counts = {'checked': 0, 'missing': 0, 'refreshed': 0}
+        for chunk in self.db.iter_catalog():
+            for entry in chunk:
+                counts['checked'] += 1
+                path = Path(entry['path'])
+                try:
+                    stat = path.stat()
+                except OSError:
+                    if entry['status'] != 'missing':
+                        self.db.update_catalog_file(entry['path'], None, None, None, 'missing')
+                        counts['missing'] += 1
+                    continue
+
+                if (entry['content_hash'] is None or entry['status'] != 'present'
+                        or stat.st_size != entry['size'] or stat.st_mtime != entry['mtime']):
+                    self.refresh(path)
+                    counts['refreshed'] += 1
+
+        print(f"📇 Catalog reconciled: {counts['checked']} files, "
+              f"{counts['missing']} missing, {counts['refreshed']} refreshed")
+        return counts
+
+    def attach(self, observer):
+        """Watch the directories of cataloged files on an (already started) observer"""
+        self.observer = observer
+        self.watcher = CatalogWatcher(self)
+        for directory in self.db.get_catalog_directories(MAX_CATALOG_DIRECTORIES):
+            self.watch_directory(Path(directory))
+
+    def watch_directory(self, directory: Path):
+        """Make sure a directory that received cataloged files is under a watched root"""
+        if self.observer is None:
+            return
+        key = os.path.normpath(str(directory))
+        with self._watch_lock:
+            if any(key == root or key.startswith(root.rstrip(os.sep) + os.sep) for root in self._roots):
+                return
+
+            # Merge with a root sharing a narrow enough ancestor, or start a new root
+            root = key
+            for existing in self._roots:
+                common = self._merge_root(existing, key)
+                if common:
+                    root = common
+                    break
+            if root == key and len(self._roots) >= MAX_WATCH_ROOTS:
+                print(f"⚠️  Not watching {directory}: {MAX_WATCH_ROOTS} catalog roots already watched")
+                return
+            if not os.path.isdir(root):
+                return
+            try:
+                watch = self.observer.schedule(self.watcher, root, recursive=True)
+            except OSError as e:
+                print(f"⚠️  Could not watch {root}: {e}")
+                return
+
+            # The new root covers any roots inside it
+            prefix = root.rstrip(os.sep) + os.sep
+            for covered in [r for r in self._roots if r == root or r.startswith(prefix)]:
+                self.observer.unschedule(self._roots.pop(covered))
+            self._roots[root] = watch
+
+    def _merge_root(self, root: str, directory: str) -> Optional[str]:
+        """Common ancestor of a root and a directory, if it is narrower than the home folder"""
+        try:
+            common = os.path.commonpath([root, directory])
+        except ValueError:
+            return None
+        home = str(Path.home())
+        if len(Path(common).parts) < 3 or common == home or home.startswith(common.rstrip(os.sep) + os.sep):
+            return None
+        return common
+
+    def detach(self):
+        """Forget the observer (it is stopped by its owner)"""
+        self.observer = None
+        with self._watch_lock:
+            self._roots.clear()
+
+
+class CatalogWatcher(FileSystemEventHandler):
+    """Folds changes made outside the organizer into the catalog"""
+
+    def __init__(self, catalog: FileCatalog):
+        super().__init__()
+        self.catalog = catalog
+        self.db = catalog.db
+
+    def on_moved(self, event):
+        source, destination = event.src_path, event.dest_path
+        if event.is_directory:
+            self.db.rename_catalog_directory(source, destination)
+        elif self.db.get_catalog_entry(source):
+            self.catalog.record_move(Path(source), Path(destination), moved_by='user')
+
+    def on_deleted(self, event):
+        if not event.is_directory and self.db.get_catalog_entry(event.src_path):
+            self.db.update_catalog_file(event.src_path, None, None, None, 'missing')
+
+    def on_modified(self, event):
+        if not event.is_directory and self.db.get_catalog_entry(event.src_path):
+            self.catalog.refresh(Path(event.src_path))
+
+    # A file replaced in place (editors that save via rename) arrives as created
+    on_created = on_modified
@@ -4,75 +4,253 @@ Detects new files and triggers AI classification
 """
 import time
 import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Callable, Optional
+from typing import Callable, Dict, Optional, Union
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileCreatedEvent
 from config import settings, get_downloads_folder
-from ai_classifier import AIFileClassifier
+from ai_classifier import AIFileClassifier, HEADER_SNIFF_BYTES
 from database import Database
 from notification_manager import NotificationManager
-import shutil
+from duplicate_detector import DuplicateIndex
+from scandir_observer import ScandirPollingObserver
+from file_transfer import transfer_engine
+from operation_log_writer import OperationLogWriter
+from file_catalog import FileCatalog
+
+
+# Browser temp-file suffixes (Chrome, Firefox, Safari)
+TEMP_DOWNLOAD_SUFFIXES = ('.crdownload', '.part', '.download')
+
+# Concurrent pre-classifications of in-progress downloads
+SPECULATION_WORKERS = 2
+
+# Seconds to wait for a download's header bytes before pre-classifying
+SPECULATION_HEADER_WAIT = 2.0
 
 
 class DownloadHandler(FileSystemEventHandler):
     """Handles file system events in the Downloads folder"""
     
     def __init__(self, classifier: AIFileClassifier, db: Database, 
-                 notifier: NotificationManager, enabled: bool = True):
+                 notifier: NotificationManager, enabled: bool = True,
+                 duplicates: Optional[DuplicateIndex] = None,
+                 op_log: Optional[OperationLogWriter] = None,
+                 catalog: Optional[FileCatalog] = None):
         super().__init__()
         self.classifier = classifier
         self.db = db
+        self.op_log = op_log or OperationLogWriter(db)
         self.notifier = notifier
         self.enabled = enabled
+        self.duplicates = duplicates
+        self.catalog = catalog
         self.processing_files = set()  # Track files being processed
+        
+        # Pre-classifications of in-progress downloads, keyed by final path
+        self.speculative: Dict[str, Future] = {}
+        self._speculation_lock = threading.Lock()
+        self._speculation_pool = ThreadPoolExecutor(
+            max_workers=SPECULATION_WORKERS,
+            thread_name_prefix="preclassify"
+        )
     
     def on_created(self, event):
         """Called when a file is created in the Downloads folder"""
+        path = Path(event.src_path)
+        
+        # Browser temp files (Safari's .download is a folder) start a pre-classification
+        if self._final_name(path):
+            self.start_speculation(path)
+            return
+        
         if event.is_directory:
             return
         
         # Only process files, not directories
         if isinstance(event, FileCreatedEvent):
-            file_path = Path(event.src_path)
+            file_path = path
             
             # Skip temporary files and hidden files
             if file_path.name.startswith('.') or file_path.name.startswith('~'):
                 return
             
+            # Firefox creates an empty placeholder next to its .part file;
+            # the real file arrives later as a rename
+            if self._has_temp_sibling(file_path):
+                return
+            
             # Skip if already processing
             if str(file_path) in self.processing_files:
                 return
             
+            speculative = self._take_speculation(file_path)
+            
             # Wait a bit for the file to finish downloading
-            time.sleep(1)
+            if speculative is None:
+                time.sleep(1)
             
             # Process the file
-            if self.enabled:
-                self.processing_files.add(str(file_path))
-                try:
-                    self.process_new_file(file_path)
-                finally:
-                    self.processing_files.discard(str(file_path))
+            self._process(file_path, speculative)
+    
+    def on_moved(self, event):
+        """Called when a browser renames a finished download to its final name"""
+        if event.is_directory:
+            return
+        
+        source = Path(event.src_path)
+        destination = Path(event.dest_path)
+        
+        # Chrome renames "Unconfirmed 123.crdownload" to "name.pdf.crdownload"
+        if self._final_name(destination):
+            self.cancel_speculation(source)
+            self.start_speculation(destination)
+            return
+        
+        # Only temp-file renames (and Safari bundles) mark a finished download
+        is_download = self._final_name(source) or self._final_name(source.parent)
+        if not is_download or destination.parent != self._download_dir(source):
+            return
+        
+        if destination.name.startswith('.') or str(destination) in self.processing_files:
+            return
+        
+        # The rename means the download is complete - no need to wait
+        self._process(destination, self._take_speculation(destination))
+    
+    def on_deleted(self, event):
+        """Drop pre-classifications of cancelled downloads"""
+        self.cancel_speculation(Path(event.src_path))
     
-    def process_new_file(self, file_path: Path):
-        """Process a newly downloaded file"""
+    def start_speculation(self, temp_path: Path):
+        """Start classifying an in-progress download in the background"""
+        final_name = self._final_name(temp_path)
+        if not self.enabled or not final_name or final_name.startswith('Unconfirmed '):
+            return
+        
+        final_path = self._download_dir(temp_path) / final_name
+        
+        with self._speculation_lock:
+            if str(final_path) in self.speculative:
+                return
+            print(f"⚡ Pre-classifying in-progress download: {final_name}")
+            self.speculative[str(final_path)] = self._speculation_pool.submit(
+                self._speculate, temp_path, final_name
+            )
+    
+    def cancel_speculation(self, temp_path: Path):
+        """Forget the pre-classification of a temp file that went away"""
+        final_name = self._final_name(temp_path)
+        if not final_name:
+            return
+        
+        final_path = self._download_dir(temp_path) / final_name
+        
+        with self._speculation_lock:
+            future = self.speculative.pop(str(final_path), None)
+        
+        if future:
+            future.cancel()
+    
+    def _speculate(self, temp_path: Path, final_name: str):
+        """Wait for the first header bytes, then classify under the final name"""
+        data_path = temp_path / final_name if temp_path.is_dir() else temp_path
+        
+        deadline = time.monotonic() + SPECULATION_HEADER_WAIT
+        while time.monotonic() < deadline:
+            try:
+                if data_path.stat().st_size >= HEADER_SNIFF_BYTES:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.1)
+        
+        return self.classifier.classify_partial_download(data_path, final_name)
+    
+    def shutdown(self):
+        """Abandon pending pre-classifications"""
+        self._speculation_pool.shutdown(wait=False, cancel_futures=True)
+        with self._speculation_lock:
+            self.speculative.clear()
+    
+    def _take_speculation(self, final_path: Path) -> Optional[Future]:
+        """Claim the pre-classification for a finished download, if any"""
+        with self._speculation_lock:
+            return self.speculative.pop(str(final_path), None)
+    
+    def _process(self, file_path: Path, speculative: Optional[Future] = None):
+        """Process a file unless auto-organization is disabled"""
+        if self.enabled:
+            self.processing_files.add(str(file_path))
+            try:
+                self.process_new_file(file_path, speculative)
+            finally:
+                self.processing_files.discard(str(file_path))
+    
+    def _final_name(self, path: Path) -> Optional[str]:
+        """Name a browser temp file will have once its download completes"""
+        for suffix in TEMP_DOWNLOAD_SUFFIXES:
+            if path.name.endswith(suffix) and len(path.name) > len(suffix):
+                return path.name[:-len(suffix)]
+        return None
+    
+    def _download_dir(self, path: Path) -> Path:
+        """Folder a download lands in (outside Safari's .download bundle)"""
+        if self._final_name(path.parent):
+            return path.parent.parent
+        return path.parent
+    
+    def _has_temp_sibling(self, file_path: Path) -> bool:
+        """Check whether a browser is still writing this file under a temp name"""
+        return any(
+            file_path.with_name(file_path.name + suffix).exists()
+            for suffix in TEMP_DOWNLOAD_SUFFIXES
+        )
+    
+    def process_new_file(self, file_path: Path, speculative: Optional[Future] = None):
+        """
+        Process a newly downloaded file
+        
+        Args:
+            file_path: The downloaded file
+            speculative: Pre-classification started while the file was downloading
+        """
         if not file_path.exists():
             return
         
         print(f"\n🔔 New file detected: {file_path.name}")
         
         try:
-            # Classify the file using Groq AI
-            print(f"🤖 Classifying file with AI...")
-            classification, confidence = self.classifier.classify_file(file_path)
+            # Skip classification entirely for content we already organized
+            if self.duplicates:
+                existing = self.duplicates.find_duplicate(file_path)
+                if existing:
+                    self.handle_duplicate(file_path, existing)
+                    return
+            
+            classification = None
+            if speculative is not None:
+                try:
+                    classification, confidence = speculative.result()
+                    # The partial file had no readable content yet
+                    classification['content_preview'] = self.classifier.extract_preview(file_path)
+                    print(f"⚡ Using pre-classification from download")
+                except Exception as e:
+                    print(f"⚠️  Pre-classification failed ({e}), classifying again")
+            
+            if classification is None:
+                # Classify the file using Claude
+                print(f"🤖 Classifying file with AI...")
+                classification, confidence = self.classifier.classify_file(file_path)
             
             print(f"📋 Classification: {classification.get('category', 'unknown')}")
             print(f"📊 Confidence: {confidence:.2%}")
             print(f"📁 Suggested path: {classification.get('suggested_path', 'unknown')}")
             
-            # Log to database
-            operation_id = self.db.log_file_operation(
+            # Log to database (write-behind, operation_id is a Future of the row id)
+            operation_id = self.op_log.log_operation(
                 filename=file_path.name,
                 original_path=str(file_path),
                 new_path=None,
@@ -88,7 +266,9 @@ class DownloadHandler(FileSystemEventHandler):
             
             # Move the file
             if confidence > 0.25:  # Only auto-move if reasonably confident
-                success = self.move_file(file_path, destination, operation_id)
+                success = self.move_file(file_path, destination, operation_id,
+                                         classification.get('category'),
+                                         classification.get('content_preview'))
                 
                 if success:
                     # Show notification
@@ -118,6 +298,31 @@ class DownloadHandler(FileSystemEventHandler):
                 sound=False
             )
     
+    def handle_duplicate(self, file_path: Path, existing: Path):
+        """Resolve a download whose content was already organized"""
+        print(f"🧬 Duplicate of: {existing}")
+        
+        outcome = self.duplicates.resolve(file_path, existing)
+        
+        self.op_log.log_operation(
+            filename=file_path.name,
+            original_path=str(file_path),
+            new_path=str(existing),
+            operation_type='duplicate',
+            file_type=None,
+            classification=outcome,
+            confidence=1.0,
+            status='completed'
+        )
+        
+        self.notifier.show_notification(
+            title="Duplicate File",
+            message=f"{file_path.name} already organized in {existing.parent.name}/ ({outcome})",
+            sound=False
+        )
+        
+        print(f"✅ Duplicate {outcome}")
+    
     def _build_destination_path(self, file_path: Path, suggested_path: str) -> Path:
         """Build the full destination path for a file"""
         # Get user's home directory
@@ -141,18 +346,28 @@ class DownloadHandler(FileSystemEventHandler):
         
         return destination
     
-    def move_file(self, source: Path, destination: Path, operation_id: int) -> bool:
+    def move_file(self, source: Path, destination: Path,
+                  operation_id: Union[int, Future],
+                  category: Optional[str] = None,
+                  preview: Optional[str] = None) -> bool:
         """Move a file from source to destination"""
         try:
             # Ensure destination directory exists
             destination.parent.mkdir(parents=True, exist_ok=True)
             
-            # Move the file
-            shutil.move(str(source), str(destination))
+            # Move the file (atomic rename, or a durable copy across devices)
+            transfer_engine.move(source, destination)
+            
+            if self.duplicates:
+                self.duplicates.add(destination)
+            
+            if self.catalog:
+                self.catalog.record_move(source, destination, category,
+                                         moved_by='monitor', preview=preview)
             
             # Update database
-            self.db.update_operation_status(operation_id, 'completed')
-            self.db.log_file_operation(
+            self.op_log.update_status(operation_id, 'completed')
+            self.op_log.log_operation(
                 filename=destination.name,
                 original_path=str(source),
                 new_path=str(destination),
@@ -166,7 +381,7 @@ class DownloadHandler(FileSystemEventHandler):
         
         except Exception as e:
             print(f"Error moving file: {e}")
-            self.db.update_operation_status(operation_id, 'failed')
+            self.op_log.update_status(operation_id, 'failed')
             return False
 
 
@@ -176,10 +391,19 @@ class FileMonitor:
     def __init__(self):
         self.classifier = AIFileClassifier()
         self.db = Database()
+        self.op_log = OperationLogWriter(self.db)
         self.notifier = NotificationManager()
         self.observer: Optional[Observer] = None
         self.handler: Optional[DownloadHandler] = None
         self.enabled = True
+        self.duplicates: Optional[DuplicateIndex] = None
+        self.catalog: Optional[FileCatalog] = None
+        
+        if settings.enable_duplicate_detection:
+            self.duplicates = DuplicateIndex(self.db)
+        
+        if settings.enable_file_catalog:
+            self.catalog = FileCatalog(self.db)
     
     def start(self):
         """Start monitoring the Downloads folder"""
@@ -197,14 +421,28 @@ class FileMonitor:
             classifier=self.classifier,
             db=self.db,
             notifier=self.notifier,
-            enabled=self.enabled
+            enabled=self.enabled,
+            duplicates=self.duplicates,
+            op_log=self.op_log,
+            catalog=self.catalog
         )
         
         # Create observer
-        self.observer = Observer()
+        if settings.monitor_observer == "scandir":
+            print(f"🔁 Using scandir polling observer")
+            self.observer = ScandirPollingObserver()
+        else:
+            self.observer = Observer()
         self.observer.schedule(self.handler, str(downloads_path), recursive=False)
         self.observer.start()
         
+        # Watch organized files for changes made by the user, and catch up
+        # on anything that changed while we weren't running
+        if self.catalog:
+            self.catalog.attach(self.observer)
+            threading.Thread(target=self.catalog.reconcile, name="catalog-reconcile",
+                             daemon=True).start()
+        
         print(f"✅ File monitor started successfully")
         
         # Show startup notification
@@ -220,8 +458,19 @@ class FileMonitor:
             print(f"🛑 Stopping file monitor...")
             self.observer.stop()
             self.observer.join()
+            if self.catalog:
+                self.catalog.detach()
+            if self.handler:
+                self.handler.shutdown()
+            self.op_log.close()
             print(f"✅ File monitor stopped")
     
+    def get_scan_stats(self) -> list:
+        """Get per-pass scan cost when the scandir polling observer is in use"""
+        if isinstance(self.observer, ScandirPollingObserver):
+            return self.observer.get_scan_stats()
+        return []
+    
     def toggle(self, enabled: bool):
         """Enable or disable auto-organization"""
         self.enabled = enabled
@@ -0,0 +1,472 @@
+"""
+Unified transfer engine for moving files and folders
+Same-device moves are a single atomic rename that never replaces an existing
+destination (two moves racing for the same free name can't clobber one
+another). Cross-device moves copy through
+the kernel (reflink, copy_file_range, sendfile) into a resumable temp file,
+optionally verify a checksum, and only remove the source once the copy is durable.
+"""
+import os
+import sys
+import time
+import errno
+import shutil
+import hashlib
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from config import settings
+from duplicate_detector import full_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# Bytes copied per kernel call / progress callback
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Linux FICLONE ioctl (reflink a whole file, e.g. across btrfs subvolumes)
+FICLONE = 0x40049409
+
+# Suffix of in-progress cross-device copies
+TEMP_SUFFIX = ".fimapart"
+
+# sendfile() and FICLONE only accept regular files as targets on Linux
+IS_LINUX = sys.platform.startswith('linux')
+
+# renameat2(RENAME_NOREPLACE): a rename that fails if the target exists (glibc 2.28+)
+AT_FDCWD = -100
+RENAME_NOREPLACE = 1
+_renameat2 = None
+if IS_LINUX:
+    try:
+        import ctypes
+        _renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+        _renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    except (OSError, AttributeError):
+        _renameat2 = None
+
+
+class TransferError(IOError):
+    """Raised when a cross-device copy fails verification"""
+
+
+class TransferEngine:
+    """
+    Moves files and folders for the monitor and the reorganizer
+
+    Cross-device copies are fsynced in batches: sources stay in place until
+    flush() has made their copies durable, so a crash never loses data. Each
+    caller has its own batch, keyed by the value it passes as batch, and can
+    pass before_remove to record which sources are about to go once their
+    copies are durable.
+    """
+
+    def __init__(self, verify: Optional[bool] = None,
+                 fsync_batch_size: Optional[int] = None):
+        self.verify = settings.transfer_verify_checksum if verify is None else verify
+        self.fsync_batch_size = max(1, fsync_batch_size or settings.transfer_fsync_batch_size)
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, List[Tuple[Path, Path]]] = {}  # batch -> [(destination, source)]
+        self._before_remove: Dict[Hashable, Callable[[List[Tuple[Path, Path]]], None]] = {}
+        self.recent_transfers = deque(maxlen=50)
+        self.totals = {
+            'transfers': 0,
+            'renames': 0,
+            'reflinks': 0,
+            'copies': 0,
+            'verified': 0,
+            'failures': 0,
+            'bytes': 0,
+            'seconds': 0.0
+        }
+
+    def move(self, source: Path, destination: Path,
+             progress_callback: Callable[[int, int], None] = None,
+             batch: Optional[Hashable] = None,
+             before_remove: Callable[[List[Tuple[Path, Path]]], None] = None) -> Dict:
+        """
+        Move a file or folder to destination
+
+        Args:
+            source: File or folder to move
+            destination: Target path (must not exist; FileExistsError if it
+                does, even when another move takes it concurrently)
+            progress_callback: Called with (bytes_done, bytes_total) during copies
+            batch: Defer fsync and source removal to the next flush(batch);
+                any hashable key identifying the caller's batch
+            before_remove: Called with the (destination, source) pairs whose
+                copies are durable, before any of those sources is removed;
+                if it raises, the sources are kept
+
+        Returns:
+            Transfer record with method, bytes, seconds and throughput
+        """
+        source = Path(source)
+        destination = Path(destination)
+
+        if destination.exists():
+            raise FileExistsError(f"Destination already exists: {destination}")
+
+        start = time.perf_counter()
+        try:
+            try:
+                self._rename_noreplace(source, destination)
+                method = 'rename'
+                # A renamed folder moves no data; don't walk it just for metrics
+                size = 0 if destination.is_dir() and not destination.is_symlink() else destination.lstat().st_size
+                if progress_callback:
+                    progress_callback(size, size)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                size = self._tree_size(source)
+                if source.is_dir():
+                    method = self._copy_tree(source, destination, size, progress_callback)
+                else:
+                    method = self._copy_file(source, destination, progress_callback)
+                if batch is None:
+                    errors = self._remove_sources([(destination, source)], before_remove)
+                    if errors:
+                        raise TransferError(errors[0])
+                else:
+                    self._defer_source_removal(batch, destination, source, before_remove)
+        except Exception:
+            with self._lock:
+                self.totals['failures'] += 1
+            raise
+
+        return self._record(source, destination, method, size, time.perf_counter() - start)
+
+    def flush(self, batch: Optional[Hashable] = None) -> List[str]:
+        """
+        Fsync a batch's pending cross-device copies, then remove their sources
+
+        Args:
+            batch: The key passed to move(), or None for every batch
+
+        Returns:
+            Errors for sources that could not be removed (the rest still are)
+        """
+        with self._lock:
+            keys = list(self._pending) if batch is None else [batch]
+            batches = [(self._pending.pop(key, []), self._before_remove.pop(key, None)) for key in keys]
+
+        errors = []
+        for pending, before_remove in batches:
+            if pending:
+                errors.extend(self._remove_sources(pending, before_remove))
+        return errors
+
+    def pending(self, batch: Hashable) -> int:
+        """Copies in a batch whose sources are still waiting for flush()"""
+        with self._lock:
+            return len(self._pending.get(batch, ()))
+
+    def _remove_sources(self, pending: List[Tuple[Path, Path]],
+                        before_remove: Callable[[List[Tuple[Path, Path]]], None] = None) -> List[str]:
+        """Make copies durable, then remove each source, skipping ones that moved on"""
+        directories = set()
+        for destination, _ in pending:
+            for path in self._iter_tree(destination):
+                if path.is_dir():
+                    directories.add(path)
+                else:
+                    self._fsync_path(path)
+            directories.add(destination.parent)
+
+        for directory in directories:
+            self._fsync_path(directory, directory=True)
+
+        if before_remove:
+            try:
+                before_remove(pending)
+            except Exception as e:
+                # The removals could not be recorded: keep every source (the copies are redundant)
+                print(f"❌ Keeping sources of {len(pending)} copies: {e}")
+                return [f"Kept sources of {len(pending)} copies: {e}"]
+
+        errors = []
+        for destination, source in pending:
+            try:
+                if not os.path.lexists(source):
+                    # Moved on by a later operation before the flush: keep the copy
+                    print(f"⚠️  Source of copy to {destination} no longer at {source}")
+                    continue
+                if source.is_dir() and not source.is_symlink():
+                    shutil.rmtree(source)
+                else:
+                    source.unlink()
+            except OSError as e:
+                errors.append(f"Error removing copied source {source}: {e}")
+                print(f"❌ Error removing copied source {source}: {e}")
+        return errors
+
+    def get_metrics(self) -> Dict:
+        """Get aggregate and per-transfer throughput metrics"""
+        with self._lock:
+            totals = dict(self.totals)
+            recent = list(self.recent_transfers)
+
+        seconds = totals['seconds']
+        totals['throughput_mbps'] = round(totals['bytes'] / seconds / (1024 * 1024), 2) if seconds else 0.0
+        with self._lock:
+            totals['pending_fsync'] = sum(len(items) for items in self._pending.values())
+
+        return {
+            'totals': totals,
+            'recent_transfers': recent
+        }
+
+    def _record(self, source: Path, destination: Path, method: str,
+                size: int, seconds: float) -> Dict:
+        """Record a completed transfer in the metrics"""
+        record = {
+            'source': str(source),
+            'destination': str(destination),
+            'method': method,
+            'bytes': size,
+            'seconds': round(seconds, 6),
+            'throughput_mbps': round(size / seconds / (1024 * 1024), 2) if seconds else 0.0
+        }
+
+        with self._lock:
+            self.totals['transfers'] += 1
+            self.totals['bytes'] += size
+            self.totals['seconds'] += seconds
+            if method == 'rename':
+                self.totals['renames'] += 1
+            elif method == 'reflink':
+                self.totals['reflinks'] += 1
+            else:
+                self.totals['copies'] += 1
+            if method != 'rename' and self.verify:
+                self.totals['verified'] += 1
+            self.recent_transfers.append(record)
+
+        return record
+
+    def _defer_source_removal(self, batch: Hashable, destination: Path, source: Path,
+                              before_remove: Callable[[List[Tuple[Path, Path]]], None] = None):
+        """Queue a copied source for removal once its copy is fsynced"""
+        with self._lock:
+            if before_remove:
+                self._before_remove[batch] = before_remove
+            items = self._pending.setdefault(batch, [])
+            items.append((destination, source))
+            should_flush = len(items) >= self.fsync_batch_size
+
+        if should_flush:
+            self.flush(batch)
+
+    def _copy_tree(self, source: Path, destination: Path, total: int,
+                   progress_callback: Callable[[int, int], None] = None) -> str:
+        """Copy a folder across devices file by file"""
+        done = 0
+        methods = set()
+
+        # Claim the destination first: raises FileExistsError if it was taken
+        destination.mkdir()
+
+        for directory, _, filenames in os.walk(source):
+            relative = Path(directory).relative_to(source)
+            target_dir = destination / relative
+            target_dir.mkdir(parents=True, exist_ok=True)
+            shutil.copystat(directory, target_dir)
+
+            for filename in filenames:
+                file_source = Path(directory) / filename
+                file_size = file_source.lstat().st_size
+                offset = done
+
+                def file_progress(copied, _total, offset=offset):
+                    if progress_callback:
+                        progress_callback(offset + copied, total)
+
+                methods.add(self._copy_file(file_source, target_dir / filename, file_progress))
+                done += file_size
+
+        return 'reflink' if methods == {'reflink'} else 'copy'
+
+    def _copy_file(self, source: Path, destination: Path,
+                   progress_callback: Callable[[int, int], None] = None) -> str:
+        """
+        Copy one file across devices through a resumable temp file
+
+        The temp name is derived from the source's path, size and mtime, so an
+        interrupted copy of an unchanged source resumes where it stopped.
+        """
+        if source.is_symlink():
+            os.symlink(os.readlink(source), destination)
+            return 'copy'
+
+        stat = source.stat()
+        size = stat.st_size
+        token = hashlib.blake2b(
+            f"{source}:{size}:{stat.st_mtime_ns}".encode(), digest_size=6
+        ).hexdigest()
+        temp = destination.with_name(f".{destination.name}.{token}{TEMP_SUFFIX}")
+
+        offset = temp.stat().st_size if temp.exists() else 0
+        if offset > size:
+            offset = 0
+
+        method = 'copy'
+        with open(source, 'rb') as src, open(temp, 'r+b' if offset else 'wb') as dst:
+            src_fd, dst_fd = src.fileno(), dst.fileno()
+            os.ftruncate(dst_fd, offset)
+
+            if offset == 0 and size > 0 and self._reflink(src_fd, dst_fd):
+                method = 'reflink'
+                if progress_callback:
+                    progress_callback(size, size)
+            else:
+                if offset:
+                    print(f"⏯️  Resuming copy of {source.name} at {offset} bytes")
+                self._copy_range(src_fd, dst_fd, offset, size, progress_callback)
+
+        if self.verify and full_hash(source) != full_hash(temp):
+            temp.unlink()
+            raise TransferError(f"Checksum mismatch copying {source} to {destination}")
+
+        shutil.copystat(source, temp)
+        try:
+            self._rename_noreplace(temp, destination)
+        except FileExistsError:
+            temp.unlink()
+            raise
+        return method
+
+    def _rename_noreplace(self, source: Path, destination: Path):
+        """
+        Rename source to destination unless destination exists (FileExistsError)
+
+        os.rename replaces an existing file silently. Where renameat2 can't
+        refuse to, a file is linked at the destination and then unlinked, and
+        a folder renamed onto an empty folder created to claim the name.
+        """
+        if _renameat2 is not None:
+            if _renameat2(AT_FDCWD, os.fsencode(source), AT_FDCWD, os.fsencode(destination),
+                          RENAME_NOREPLACE) == 0:
+                return
+            error = ctypes.get_errno()
+            # EINVAL: the filesystem doesn't support the flag
+            if error not in (errno.EINVAL, errno.ENOSYS):
+                raise OSError(error, os.strerror(error), str(source), None, str(destination))
+
+        if os.name == 'nt':
+            # Windows never replaces an existing target
+            os.rename(source, destination)
+            return
+
+        if source.is_dir() and not source.is_symlink():
+            os.mkdir(destination)
+            try:
+                os.rename(source, destination)
+            except OSError:
+                os.rmdir(destination)
+                raise
+            return
+
+        try:
+            os.link(source, destination, follow_symlinks=False)
+        except OSError as e:
+            if e.errno in (errno.EEXIST, errno.EXDEV):
+                raise
+            # No hard links on this filesystem (e.g. FAT): claim the name with an empty file
+            os.close(os.open(destination, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            try:
+                os.rename(source, destination)
+            except OSError:
+                os.unlink(destination)
+                raise
+            return
+        os.unlink(source)
+
+    def _copy_range(self, src_fd: int, dst_fd: int, offset: int, size: int,
+                    progress_callback: Callable[[int, int], None] = None):
+        """Copy bytes [offset, size) using the fastest primitive available"""
+        use_copy_file_range = hasattr(os, 'copy_file_range')
+        use_sendfile = IS_LINUX and hasattr(os, 'sendfile')
+
+        while offset < size:
+            count = min(COPY_CHUNK_SIZE, size - offset)
+            copied = 0
+
+            if use_copy_file_range:
+                try:
+                    copied = os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+                except OSError:
+                    use_copy_file_range = False
+
+            if not copied and use_sendfile:
+                try:
+                    os.lseek(dst_fd, offset, os.SEEK_SET)
+                    copied = os.sendfile(dst_fd, src_fd, offset, count)
+                except OSError:
+                    use_sendfile = False
+
+            if not copied:
+                data = os.pread(src_fd, count, offset)
+                if not data:
+                    raise TransferError("Source file shrank during copy")
+                copied = os.pwrite(dst_fd, data, offset)
+
+            offset += copied
+            if progress_callback:
+                progress_callback(offset, size)
+
+    def _reflink(self, src_fd: int, dst_fd: int) -> bool:
+        """Clone the file's extents if the filesystem supports it"""
+        if fcntl is None or not IS_LINUX:
+            return False
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            return True
+        except OSError:
+            return False
+
+    def _tree_size(self, path: Path) -> int:
+        """Total bytes of a file or folder"""
+        if not path.is_dir() or path.is_symlink():
+            return path.lstat().st_size
+        total = 0
+        for directory, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.lstat(os.path.join(directory, filename)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def _iter_tree(self, path: Path):
+        """Yield a path and, for folders, everything inside it"""
+        yield path
+        if path.is_dir() and not path.is_symlink():
+            for directory, dirnames, filenames in os.walk(path):
+                for name in dirnames + filenames:
+                    yield Path(directory) / name
+
+    def _fsync_path(self, path: Path, directory: bool = False):
+        """Flush a file or directory entry to stable storage"""
+        if path.is_symlink():
+            return
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            # Some platforms refuse fsync on directories
+            if not directory:
+                raise
+        finally:
+            os.close(fd)
+
+
+# Global instance shared by the monitor and the reorganizer
+transfer_engine = TransferEngine()
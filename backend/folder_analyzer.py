@@ -3,27 +3,53 @@ Deep folder structure analysis using Claude (Anthropic)
 This provides comprehensive analysis of existing file organization patterns
 """
 import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 from anthropic import Anthropic
 from config import settings
+from tree_scanner import TreeScanner
+from tree_snapshot import TreeSnapshotStore
+from tree_summarizer import TreeSummarizer
+from compact_tree import CompactTree
+from plan_stream import PlanItemParser
+from tree_diff import describe_changes, diff_structures, fingerprint_tree, summarize_changes
 import os
 
 
+# Bump when the analysis prompts change, so cached analyses are not reused
+PROMPT_VERSION = 2
+
+
 class FolderAnalyzer:
     """
     Analyzes existing folder structures and provides optimization suggestions
     Uses Claude for deep reasoning about file organization patterns
     """
     
-    def __init__(self):
-        """Initialize Claude client"""
+    def __init__(self, db=None):
+        """
+        Initialize Claude client
+        
+        Args:
+            db: Database for incremental tree snapshots and the analysis
+                cache (full scans and no caching without it)
+        """
         if not settings.anthropic_api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
         
         # ⭐ THIS IS WHERE THE CLAUDE API KEY IS USED ⭐
         self.client = Anthropic(api_key=settings.anthropic_api_key)
         self.model = settings.claude_model
+        self.scanner = TreeScanner()
+        self.db = db
+        self.snapshots = TreeSnapshotStore(db, self.scanner) if db else None
+        self.summarizer = TreeSummarizer()
+        
+        # Last analyzed tree per root, in compact form
+        self.trees: Dict[str, CompactTree] = {}
     
     def scan_directory_structure(self, root_path: Path, max_depth: int = 4) -> Dict:
         """
@@ -36,46 +62,44 @@ class FolderAnalyzer:
         Returns:
             Dictionary representing folder structure with file counts
         """
-        structure = {
-            'path': str(root_path),
-            'name': root_path.name,
-            'type': 'directory',
-            'children': [],
-            'file_count': 0,
-            'total_size': 0
-        }
+        structure = self.scanner.scan(root_path, max_depth)
         
-        try:
-            items = list(root_path.iterdir())
-            
-            for item in items:
-                # Skip hidden files and system folders
-                if item.name.startswith('.'):
-                    continue
-                
-                if item.is_file():
-                    structure['file_count'] += 1
-                    try:
-                        structure['total_size'] += item.stat().st_size
-                    except:
-                        pass
-                
-                elif item.is_dir() and max_depth > 0:
-                    child_structure = self.scan_directory_structure(item, max_depth - 1)
-                    structure['children'].append(child_structure)
-                    structure['file_count'] += child_structure['file_count']
-                    structure['total_size'] += child_structure['total_size']
-        
-        except PermissionError:
-            structure['error'] = 'Permission denied'
-        except Exception as e:
-            structure['error'] = str(e)
+        stats = self.scanner.last_stats
+        print(f"📊 Scanned {stats['files']} files in {stats['directories']} folders "
+              f"in {stats['seconds']:.2f}s ({stats['files_per_sec']} files/sec)")
         
         return structure
     
-    def analyze_organization_patterns(self, structure: Dict) -> Dict:
+    def scan_incremental(self, root_path: Path, max_depth: int = 4,
+                         progress: Optional[Callable[[Dict], None]] = None,
+                         full: bool = False) -> Tuple[Dict, Optional[Dict]]:
+        """
+        Scan against the tree's last snapshot, listing only changed directories
+        (progress receives the scanner's periodic reports; full lists them all)
+        
+        Returns:
+            Tuple of (structure, structural diff since the last analysis);
+            the diff is None when no database is configured
+        """
+        if self.snapshots is None:
+            structure = self.scanner.scan(root_path, max_depth, progress=progress)
+            stats = self.scanner.last_stats
+            print(f"📊 Scanned {stats['files']} files in {stats['directories']} folders "
+                  f"in {stats['seconds']:.2f}s ({stats['files_per_sec']} files/sec)")
+            return structure, None
+        
+        structure, diff, stats = self.snapshots.scan(root_path, max_depth, progress, full)
+        detail = "full rescan" if stats['full_scan'] else f"{stats['directories_reused']} folders unchanged"
+        print(f"📊 Scanned {stats['files']} files in {stats['directories']} folders "
+              f"in {stats['seconds']:.2f}s ({detail})")
+        
+        return structure, diff
+    
+    def analyze_organization_patterns(self, structure: Dict,
+                                      token_usage: Optional[Dict[str, Dict]] = None) -> Dict:
         """
-        Use Claude to analyze folder organization patterns
+        Use Claude to analyze folder organization patterns (token counts are
+        added to token_usage, by prompt name)
         
         Returns insights about:
         - Current organization style
@@ -83,7 +107,7 @@ class FolderAnalyzer:
         - Optimization opportunities
         """
         # Build a concise representation for Claude
-        summary = self._build_structure_summary(structure)
+        summary, summary_stats = self.summarizer.summarize(structure)
         
         prompt = f"""Analyze this file/folder organization structure and provide insights:
 
@@ -120,6 +144,7 @@ Respond in JSON format:
                     }
                 ]
             )
+            self._record_usage('patterns', summary_stats, response, token_usage)
             
             # Extract JSON from response
             content = response.content[0].text
@@ -136,16 +161,23 @@ Respond in JSON format:
             print(f"Error analyzing patterns: {e}")
             return {'error': str(e)}
     
-    def generate_optimization_suggestions(self, structure: Dict, analysis: Dict) -> Dict:
+    def generate_optimization_suggestions(self, structure: Dict, analysis: Dict,
+                                          on_plan_item: Optional[Callable[[Dict], None]] = None,
+                                          token_usage: Optional[Dict[str, Dict]] = None) -> Dict:
         """
         Generate specific optimization suggestions using Claude
         
+        Args:
+            on_plan_item: If given, the response is streamed and this is called
+                with each migration_plan operation as soon as it is complete
+            token_usage: Token counts of the prompt are added here
+        
         Returns:
         - Suggested folder structure
         - Migration plan
         - Expected benefits
         """
-        summary = self._build_structure_summary(structure)
+        summary, summary_stats = self.summarizer.summarize(structure)
         
         prompt = f"""Based on this folder structure and analysis, suggest an optimized organization:
 
@@ -162,13 +194,10 @@ Please suggest:
 4. Which empty or redundant folders should be archived
 5. Expected benefits of the reorganization
 
-Respond in JSON format:
+Use full paths under {structure['path']}, and create folders before moving anything into them.
+
+Respond in JSON format, starting with the migration plan:
 {{
-    "suggested_structure": {{
-        "root_folders": ["folder1", "folder2"],
-        "hierarchy_example": "detailed example path",
-        "naming_conventions": ["convention1", "convention2"]
-    }},
     "migration_plan": [
         {{
             "action": "move|create|archive",
@@ -177,6 +206,11 @@ Respond in JSON format:
             "reason": "explanation"
         }}
     ],
+    "suggested_structure": {{
+        "root_folders": ["folder1", "folder2"],
+        "hierarchy_example": "detailed example path",
+        "naming_conventions": ["convention1", "convention2"]
+    }},
     "folders_to_archive": ["folder/path"],
     "expected_benefits": ["benefit1", "benefit2"],
     "estimated_time": "time estimate",
@@ -185,7 +219,7 @@ Respond in JSON format:
 """
         
         try:
-            response = self.client.messages.create(
+            request = dict(
                 model=self.model,
                 max_tokens=4000,
                 temperature=settings.ai_temperature,
@@ -196,6 +230,17 @@ Respond in JSON format:
                     }
                 ]
             )
+            if on_plan_item:
+                # Hand each plan operation over while the rest is still generating
+                parser = PlanItemParser()
+                with self.client.messages.stream(**request) as stream:
+                    for text in stream.text_stream:
+                        for item in parser.feed(text):
+                            on_plan_item(item)
+                    response = stream.get_final_message()
+            else:
+                response = self.client.messages.create(**request)
+            self._record_usage('suggestions', summary_stats, response, token_usage)
             
             content = response.content[0].text
             if '{' in content:
@@ -210,60 +255,515 @@ Respond in JSON format:
             print(f"Error generating suggestions: {e}")
             return {'error': str(e)}
     
-    def _build_structure_summary(self, structure: Dict, indent: int = 0) -> str:
-        """Build a readable summary of folder structure"""
-        lines = []
-        prefix = "  " * indent
+    def partition_structure(self, structure: Dict, max_directories: Optional[int] = None) -> List[Dict]:
+        """
+        Split a tree into partitions of at most max_directories folders
+        
+        Subtrees that fit are kept whole; larger ones are split at their
+        children, and small sibling subtrees are packed together.
+        
+        Returns:
+            List of {label, path, structure} with a structure dict per partition
+        """
+        max_directories = max_directories or settings.analysis_partition_directories
         
-        name = structure.get('name', 'root')
-        file_count = structure.get('file_count', 0)
-        size_mb = structure.get('total_size', 0) / (1024 * 1024)
+        # Folders per subtree, bottom-up
+        counts: Dict[int, int] = {}
+        order = [structure]
+        for node in order:
+            order.extend(node.get('children', []))
+        for node in reversed(order):
+            counts[id(node)] = 1 + sum(counts[id(child)] for child in node.get('children', []))
         
-        lines.append(f"{prefix}📁 {name}/ ({file_count} files, {size_mb:.1f} MB)")
+        partitions: List[Dict] = []
         
-        # Add children (limit depth to avoid token overflow)
-        if indent < 3:
-            for child in structure.get('children', [])[:20]:  # Limit to 20 children
-                lines.append(self._build_structure_summary(child, indent + 1))
+        def add(label: str, node: Dict):
+            partitions.append({'label': label, 'path': node['path'], 'structure': node})
         
-        return "\n".join(lines)
+        def split(node: Dict, label: str):
+            if counts[id(node)] <= max_directories or not node.get('children'):
+                add(label, node)
+                return
+            
+            # The folder's own files travel with its first packed group
+            own_files = node['file_count'] - sum(child['file_count'] for child in node['children'])
+            own_size = node['total_size'] - sum(child['total_size'] for child in node['children'])
+            group: List[Dict] = []
+            group_directories = 0
+            
+            def flush():
+                nonlocal group, group_directories, own_files, own_size
+                if not group:
+                    return
+                if len(group) == 1 and not own_files:
+                    add(f"{label}/{group[0]['name']}", group[0])
+                    group, group_directories = [], 0
+                    return
+                packed = {
+                    'path': node['path'],
+                    'name': node['name'],
+                    'type': 'directory',
+                    'children': group,
+                    'file_count': own_files + sum(child['file_count'] for child in group),
+                    'total_size': own_size + sum(child['total_size'] for child in group),
+                    'extensions': node.get('extensions', {}) if own_files else {},
+                }
+                names = ", ".join(child['name'] for child in group[:3])
+                more = f" +{len(group) - 3}" if len(group) > 3 else ""
+                add(f"{label} ({names}{more})", packed)
+                own_files = own_size = 0
+                group, group_directories = [], 0
+            
+            for child in sorted(node['children'], key=lambda child: -counts[id(child)]):
+                if counts[id(child)] > max_directories:
+                    split(child, f"{label}/{child['name']}")
+                    continue
+                if group_directories + counts[id(child)] > max_directories:
+                    flush()
+                group.append(child)
+                group_directories += counts[id(child)]
+            flush()
+            
+            if own_files:
+                # Every child was split further: the folder's own files form a partition
+                add(label, {**node, 'children': [], 'file_count': own_files, 'total_size': own_size})
+        
+        split(structure, structure.get('name') or 'root')
+        return partitions
+    
+    def analyze_partition(self, partition: Dict, index: int,
+                          token_usage: Optional[Dict[str, Dict]] = None) -> Dict:
+        """
+        Map step: analyze one partition and plan its migrations in a single prompt
+        
+        Returns:
+            Partial analysis with patterns, pain points and a migration plan
+        """
+        summary, summary_stats = self.summarizer.summarize(partition['structure'])
+        
+        prompt = f"""You are analyzing one part of a larger folder tree. This part is rooted at:
+{partition['path']}
+
+STRUCTURE:
+{summary}
+
+Identify its organization patterns and problems, and plan moves within this part only.
+Use full paths under the root above.
+
+Respond in JSON format:
+{{
+    "patterns_observed": ["list of patterns"],
+    "organization_style": "description",
+    "strengths": ["list of strengths"],
+    "weaknesses": ["list of weaknesses"],
+    "consistency_score": 0.0-1.0,
+    "pain_points": ["specific issues"],
+    "migration_plan": [
+        {{
+            "action": "move|create|archive",
+            "source": "current/path",
+            "destination": "new/path",
+            "reason": "explanation"
+        }}
+    ],
+    "folders_to_archive": ["folder/path"]
+}}
+"""
+        
+        try:
+            response = self.client.messages.create(
+                model=self.model,
+                max_tokens=settings.max_tokens,
+                temperature=settings.ai_temperature,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            self._record_usage(f"partition {index + 1}", summary_stats, response, token_usage)
+            return self._parse_json(response.content[0].text)
+        
+        except Exception as e:
+            print(f"Error analyzing partition {partition['label']}: {e}")
+            return {'error': str(e)}
     
-    def perform_full_analysis(self, root_path: Path) -> Tuple[Dict, Dict, Dict]:
+    def reduce_partitions(self, structure: Dict, partitions: List[Dict],
+                          results: List[Dict],
+                          token_usage: Optional[Dict[str, Dict]] = None) -> Tuple[Dict, Dict]:
+        """
+        Reduce step: merge partial analyses into one analysis and one set of suggestions
+        
+        Migration plans are merged locally; Claude sees each partition's
+        assessment and the top of the whole tree, and writes the overall
+        analysis, the target hierarchy and any moves across partitions.
+        """
+        summary, summary_stats = self.summarizer.summarize(
+            structure, self.summarizer.budget_tokens // 2
+        )
+        
+        digests = []
+        for partition, result in zip(partitions, results):
+            if 'error' in result:
+                continue
+            digests.append({
+                'partition': partition['label'],
+                'path': partition['path'],
+                'files': partition['structure'].get('file_count', 0),
+                'organization_style': result.get('organization_style'),
+                'consistency_score': result.get('consistency_score'),
+                'patterns_observed': result.get('patterns_observed', [])[:3],
+                'weaknesses': result.get('weaknesses', [])[:3],
+                'pain_points': result.get('pain_points', [])[:3],
+                'planned_moves': len(result.get('migration_plan', [])),
+            })
+        
+        prompt = f"""A large folder tree was analyzed in {len(partitions)} parts. Merge the partial analyses.
+
+TOP OF THE TREE:
+{summary}
+
+PARTIAL ANALYSES:
+{json.dumps(digests, indent=1)}
+
+Each part already has its own migration plan. Only add moves that span parts
+(e.g. consolidating the same kind of content found in several parts).
+
+Respond in JSON format:
+{{
+    "patterns_observed": ["list of patterns"],
+    "organization_style": "description",
+    "strengths": ["list of strengths"],
+    "weaknesses": ["list of weaknesses"],
+    "consistency_score": 0.0-1.0,
+    "pain_points": ["specific issues"],
+    "overall_assessment": "brief summary",
+    "suggested_structure": {{
+        "root_folders": ["folder1", "folder2"],
+        "hierarchy_example": "detailed example path",
+        "naming_conventions": ["convention1", "convention2"]
+    }},
+    "cross_partition_moves": [
+        {{
+            "action": "move|create|archive",
+            "source": "current/path",
+            "destination": "new/path",
+            "reason": "explanation"
+        }}
+    ],
+    "expected_benefits": ["benefit1", "benefit2"],
+    "estimated_time": "time estimate",
+    "risk_level": "low|medium|high"
+}}
+"""
+        
+        try:
+            response = self.client.messages.create(
+                model=self.model,
+                max_tokens=4000,
+                temperature=settings.ai_temperature,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            self._record_usage('reduce', summary_stats, response, token_usage)
+            merged = self._parse_json(response.content[0].text)
+        except Exception as e:
+            print(f"Error merging partition analyses: {e}")
+            merged = {'error': str(e)}
+        
+        analysis = {key: merged.get(key) for key in (
+            'patterns_observed', 'organization_style', 'strengths', 'weaknesses',
+            'consistency_score', 'pain_points', 'overall_assessment'
+        ) if key in merged}
+        if 'error' in merged:
+            analysis['error'] = merged['error']
+        analysis['partitions'] = [
+            {
+                'label': partition['label'],
+                'path': partition['path'],
+                'files': partition['structure'].get('file_count', 0),
+                'consistency_score': result.get('consistency_score'),
+                'error': result.get('error'),
+            }
+            for partition, result in zip(partitions, results)
+        ]
+        
+        # Cross-partition moves first, then each partition's plan, without repeats
+        migration_plan = []
+        seen = set()
+        folders_to_archive = []
+        for plan in [merged.get('cross_partition_moves', [])] + [
+                result.get('migration_plan', []) for result in results]:
+            for item in plan:
+                key = (item.get('action'), item.get('source'), item.get('destination'))
+                if key not in seen:
+                    seen.add(key)
+                    migration_plan.append(item)
+        for result in results:
+            for folder in result.get('folders_to_archive', []):
+                if folder not in folders_to_archive:
+                    folders_to_archive.append(folder)
+        
+        suggestions = {key: merged.get(key) for key in (
+            'suggested_structure', 'expected_benefits', 'estimated_time', 'risk_level'
+        ) if key in merged}
+        suggestions['migration_plan'] = migration_plan
+        suggestions['folders_to_archive'] = folders_to_archive
+        
+        return analysis, suggestions
+    
+    def perform_map_reduce_analysis(self, structure: Dict, partitions: List[Dict],
+                                    progress: Optional[Callable[[Dict], None]] = None,
+                                    on_plan_item: Optional[Callable[[Dict], None]] = None,
+                                    token_usage: Optional[Dict[str, Dict]] = None) -> Tuple[Dict, Dict]:
+        """
+        Analyze partitions concurrently (analysis_concurrency at a time), then merge them
+        
+        Args:
+            progress: Called with an event dict as each partition finishes
+                (phase, completed, total, label, seconds, error, and the
+                partition's result) and around the reduce step
+            on_plan_item: Called with each partition's migration plan
+                operations as soon as that partition finishes
+            token_usage: Token counts of every prompt are added here
+        
+        Returns:
+            Tuple of (analysis, suggestions)
+        """
+        total = len(partitions)
+        results: List[Dict] = [{} for _ in partitions]
+        completed = 0
+        start = time.perf_counter()
+        
+        def analyze(index: int) -> Tuple[int, Dict, float]:
+            partition_start = time.perf_counter()
+            result = self.analyze_partition(partitions[index], index, token_usage)
+            return index, result, time.perf_counter() - partition_start
+        
+        with ThreadPoolExecutor(max_workers=max(1, settings.analysis_concurrency),
+                                thread_name_prefix="analysis") as executor:
+            for future in as_completed([executor.submit(analyze, i) for i in range(total)]):
+                index, result, seconds = future.result()
+                results[index] = result
+                completed += 1
+                
+                label = partitions[index]['label']
+                status = "❌" if 'error' in result else "✅"
+                print(f"🧩 {status} Partition {completed}/{total}: {label} ({seconds:.1f}s)")
+                if progress:
+                    progress({
+                        'phase': 'map',
+                        'completed': completed,
+                        'total': total,
+                        'label': label,
+                        'path': partitions[index]['path'],
+                        'seconds': round(seconds, 2),
+                        'error': result.get('error'),
+                        'result': result,
+                    })
+                if on_plan_item:
+                    for item in result.get('migration_plan', []):
+                        on_plan_item(item)
+        
+        print(f"🧩 Analyzed {total} partitions in {time.perf_counter() - start:.1f}s, merging...")
+        if progress:
+            progress({'phase': 'reduce', 'completed': completed, 'total': total})
+        
+        analysis, suggestions = self.reduce_partitions(structure, partitions, results, token_usage)
+        
+        if progress:
+            progress({'phase': 'reduced', 'completed': completed, 'total': total,
+                      'seconds': round(time.perf_counter() - start, 2)})
+        return analysis, suggestions
+    
+    def _parse_json(self, content: str) -> Dict:
+        """Extract the JSON object from a response"""
+        if '{' in content:
+            json_start = content.index('{')
+            json_end = content.rindex('}') + 1
+            return json.loads(content[json_start:json_end])
+        return {'error': 'Could not parse response'}
+    
+    def _record_usage(self, prompt_name: str, summary_stats: Optional[Dict], response,
+                      token_usage: Optional[Dict[str, Dict]] = None):
+        """Log the token counts of one prompt, adding them to token_usage (summary_stats is None without a tree summary)"""
+        usage = {
+            'input_tokens': getattr(response.usage, 'input_tokens', None),
+            'output_tokens': getattr(response.usage, 'output_tokens', None),
+        }
+        tree = ""
+        if summary_stats:
+            usage.update({
+                'summary_tokens': summary_stats['tokens'],
+                'summary_budget': summary_stats['budget'],
+                'directories_shown': summary_stats['directories_shown'],
+                'directories': summary_stats['directories'],
+            })
+            tree = (f"~{usage['summary_tokens']}/{usage['summary_budget']} summary tokens "
+                    f"({usage['directories_shown']}/{usage['directories']} folders), ")
+        if token_usage is not None:
+            token_usage[prompt_name] = usage
+        print(f"🧮 {prompt_name} prompt: {tree}"
+              f"{usage['input_tokens']} input / {usage['output_tokens']} output tokens")
+    
+    def _tree_file(self, root: str) -> Path:
+        name = hashlib.blake2b(root.encode(), digest_size=8).hexdigest()
+        return Path(settings.analysis_tree_dir) / f"{name}.tree"
+    
+    def keep_tree(self, structure: Dict) -> CompactTree:
+        """Keep a scanned tree in compact form, in memory and on disk, for later subtree requests"""
+        tree = CompactTree.from_structure(structure)
+        self.trees[tree.root_path] = tree
+        try:
+            tree.save(self._tree_file(tree.root_path))
+        except OSError as e:
+            print(f"⚠️  Could not save compact tree: {e}")
+        print(f"🗜️  Compact tree: {len(tree)} folders in {tree.nbytes() / (1024 * 1024):.1f} MB")
+        return tree
+    
+    def get_tree(self, root_path: Path) -> Optional[CompactTree]:
+        """The last analyzed tree of root_path, from memory or disk"""
+        root = str(root_path)
+        if root not in self.trees:
+            tree_file = self._tree_file(root)
+            if not tree_file.exists():
+                return None
+            self.trees[root] = CompactTree.load(tree_file)
+        return self.trees[root]
+    
+    def fingerprint_structure(self, structure: Dict) -> str:
+        """
+        Fingerprint of everything the prompts are built from
+        
+        Combines the content fingerprint of the whole scanned tree (counts,
+        sizes and extensions of every folder) with its root and the settings
+        that shape the prompts.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps([
+            structure['path'],
+            fingerprint_tree(structure)[id(structure)],
+            self.summarizer.budget_tokens,
+            settings.analysis_partition_directories,
+        ]).encode())
+        return digest.hexdigest()
+    
+    def perform_full_analysis(self, root_path: Path,
+                              progress: Optional[Callable[[Dict], None]] = None,
+                              force: bool = False,
+                              on_plan_item: Optional[Callable[[Dict], None]] = None
+                              ) -> Tuple[Dict, Dict, Dict, Optional[Dict], Dict]:
         """
         Perform complete analysis: scan, analyze, and suggest
         
+        Trees larger than one partition are analyzed map-reduce
+        (see perform_map_reduce_analysis). An unchanged tree is answered from
+        the analysis cache unless force is set, which also rescans every folder.
+        
+        Args:
+            progress: Called with event dicts as the analysis advances:
+                phase 'scan' (periodic counts), 'analyzing' (partitions),
+                'cached', 'map'/'reduce'/'reduced', or 'patterns' (with the
+                partial analysis) and 'suggestions'
+            on_plan_item: Called once with each migration plan operation as
+                early as it is known: streamed from the suggestions response,
+                per finished partition, or all at once from the cache
+        
         Returns:
-            Tuple of (structure, analysis, suggestions)
+            Tuple of (structure, analysis, suggestions, diff since the last
+            analysis, run), where run holds this analysis's own token_usage
+            (by prompt name), cache lookup (fingerprint, hit, created_at) and
+            compact tree; concurrent analyses never see each other's
         """
+        def report(event: Dict):
+            if progress:
+                progress(event)
+        
+        plan_items_seen = set()
+        
+        def plan_item(item: Dict):
+            key = (item.get('action'), item.get('source'), item.get('destination'))
+            if on_plan_item and key not in plan_items_seen:
+                plan_items_seen.add(key)
+                on_plan_item(item)
+        
+        def finish_plan(suggestions: Dict):
+            # Operations not seen yet (cross-partition moves, anything the stream missed)
+            for item in suggestions.get('migration_plan') or []:
+                plan_item(item)
+        
         print(f"📊 Scanning folder structure: {root_path}")
-        structure = self.scan_directory_structure(root_path)
+        token_usage: Dict[str, Dict] = {}
+        structure, diff = self.scan_incremental(root_path, progress=progress, full=force)
+        tree = self.keep_tree(structure)
+        stats = self.scanner.last_stats
+        report({'phase': 'scanned', 'directories': stats['directories'], 'files': stats['files'],
+                'files_per_sec': stats['files_per_sec'], 'seconds': stats['seconds']})
+        
+        fingerprint = self.fingerprint_structure(structure)
+        ttl = settings.analysis_cache_ttl_hours
+        cache = {'fingerprint': fingerprint, 'hit': False, 'created_at': None}
+        run = {'token_usage': token_usage, 'cache': cache, 'tree': tree}
+        if self.db and ttl > 0 and not force:
+            cached = self.db.get_cached_analysis(fingerprint, self.model, PROMPT_VERSION, ttl)
+            if cached:
+                print(f"⚡ Tree unchanged since {cached['created_at']}, using cached analysis")
+                cache.update(hit=True, created_at=cached['created_at'])
+                report({'phase': 'cached', 'created_at': cached['created_at']})
+                finish_plan(cached['suggestions'])
+                return structure, cached['analysis'], cached['suggestions'], diff, run
         
-        print(f"🔍 Analyzing organization patterns...")
-        analysis = self.analyze_organization_patterns(structure)
+        partitions = self.partition_structure(structure)
+        report({'phase': 'analyzing', 'partitions': len(partitions)})
+        if len(partitions) > 1:
+            print(f"🧩 Analyzing {len(partitions)} partitions, "
+                  f"{settings.analysis_concurrency} at a time...")
+            analysis, suggestions = self.perform_map_reduce_analysis(
+                structure, partitions, progress, plan_item if on_plan_item else None, token_usage
+            )
+        else:
+            print(f"🔍 Analyzing organization patterns...")
+            analysis = self.analyze_organization_patterns(structure, token_usage)
+            report({'phase': 'patterns', 'analysis': analysis})
+            
+            print(f"💡 Generating optimization suggestions...")
+            report({'phase': 'suggestions'})
+            suggestions = self.generate_optimization_suggestions(
+                structure, analysis, plan_item if on_plan_item else None, token_usage
+            )
+        finish_plan(suggestions)
         
-        print(f"💡 Generating optimization suggestions...")
-        suggestions = self.generate_optimization_suggestions(structure, analysis)
+        # Failed calls are not cached, so the next request retries them
+        if self.db and ttl > 0 and 'error' not in analysis and 'error' not in suggestions:
+            self.db.save_cached_analysis(fingerprint, self.model, PROMPT_VERSION, str(root_path),
+                                         analysis, suggestions, ttl)
         
-        return structure, analysis, suggestions
+        return structure, analysis, suggestions, diff, run
     
-    def compare_structures(self, old_structure: Dict, new_structure: Dict) -> Dict:
+    def compare_structures(self, old_structure: Dict, new_structure: Dict,
+                           narrate: bool = True) -> Dict:
         """
         Compare old and new structures to generate a change report
+        
+        Counts and change lists come from a local diff (see tree_diff);
+        Claude only writes the improvement_summary, and only if narrate is set.
         """
-        prompt = f"""Compare these two folder structures and generate a change report:
+        diff = diff_structures(old_structure, new_structure)
+        report = {
+            **diff,
+            'major_changes': describe_changes(diff),
+            'improvement_summary': summarize_changes(diff),
+        }
+        if not narrate or not (diff['moved'] or diff['created'] or diff['deleted']):
+            return report
+        
+        counts = {key: value for key, value in diff.items() if not isinstance(value, list)}
+        prompt = f"""A folder tree was reorganized. These are the exact changes:
 
-OLD STRUCTURE:
-{self._build_structure_summary(old_structure)}
+COUNTS:
+{json.dumps(counts, indent=1)}
 
-NEW STRUCTURE:
-{self._build_structure_summary(new_structure)}
+LARGEST CHANGES:
+{chr(10).join(report['major_changes'])}
 
-Provide a summary of changes in JSON:
+In 2-3 sentences, describe how the organization improved (or did not).
+Respond in JSON format:
 {{
-    "files_moved": number,
-    "folders_created": number,
-    "folders_archived": number,
-    "major_changes": ["change1", "change2"],
     "improvement_summary": "brief description"
 }}
 """
@@ -271,20 +771,17 @@ Provide a summary of changes in JSON:
         try:
             response = self.client.messages.create(
                 model=self.model,
-                max_tokens=1000,
+                max_tokens=300,
                 temperature=0.3,
                 messages=[{"role": "user", "content": prompt}]
             )
+            self._record_usage('compare', None, response)
             
-            content = response.content[0].text
-            if '{' in content:
-                json_start = content.index('{')
-                json_end = content.rindex('}') + 1
-                json_str = content[json_start:json_end]
-                return json.loads(json_str)
-            else:
-                return {'error': 'Could not parse response'}
+            narrative = self._parse_json(response.content[0].text)
+            if narrative.get('improvement_summary'):
+                report['improvement_summary'] = narrative['improvement_summary']
                 
         except Exception as e:
-            print(f"Error comparing structures: {e}")
-            return {'error': str(e)}
+            print(f"Error summarizing structure changes: {e}")
+        
+        return report
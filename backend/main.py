@@ -5,10 +5,14 @@ Provides REST API for the frontend application
 This addresses the Annapurna Labs System Architecture & Integration track
 """
 import asyncio
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import csv
+import io
+import json
+import time
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 from pathlib import Path
@@ -20,22 +24,28 @@ from config import settings, validate_api_keys, get_downloads_folder
 from ai_classifier import AIFileClassifier
 from notification_manager import NotificationManager
 from first_launch import check_and_run_first_launch
+from duplicate_detector import quick_hash
 
 # Optional imports - gracefully handle missing dependencies
 try:
     from database import Database
+    from async_database import AsyncDatabase
     db = None  # Will be initialized later
+    adb = None
 except ImportError:
     print("⚠️  Database module not available - running in limited mode")
     Database = None
     db = None
+    adb = None
 
 try:
     from folder_analyzer import FolderAnalyzer
+    from analysis_jobs import AnalysisJobManager
     analyzer = None
 except ImportError:
     print("⚠️  Folder analyzer not available")
     FolderAnalyzer = None
+    AnalysisJobManager = None
     analyzer = None
 
 try:
@@ -56,9 +66,27 @@ except ImportError:
 
 try:
     from reorganizer import FileReorganizer
+    from plan_stream import PlanPipeline
+    from migration_planner import MigrationPlanner
+    from reorg_journal import ReorgJournal
 except ImportError:
     print("⚠️  Reorganizer not available")
     FileReorganizer = None
+    PlanPipeline = None
+    MigrationPlanner = None
+    ReorgJournal = None
+
+try:
+    from search_index import SearchIndex
+except ImportError:
+    print("⚠️  Search index not available")
+    SearchIndex = None
+
+try:
+    from retention import RetentionManager
+except ImportError:
+    print("⚠️  Retention not available")
+    RetentionManager = None
 
 try:
     from reminder_service import ReminderService
@@ -91,13 +119,32 @@ notifier = NotificationManager()
 # Initialize optional components
 if Database:
     db = Database()
+    # Handlers await queries on DB threads instead of blocking the event loop
+    adb = AsyncDatabase(db)
 if FolderAnalyzer:
-    analyzer = FolderAnalyzer()
+    analyzer = FolderAnalyzer(db)
+
+analysis_jobs = None
+if analyzer and db:
+    analysis_jobs = AnalysisJobManager(analyzer, db)
 if EmailReporter:
     email_reporter = EmailReporter()
 if ReminderService and db:
     reminder_service = ReminderService(db, notifier)
 
+search_index = None
+if SearchIndex and db and settings.enable_file_catalog:
+    search_index = SearchIndex(db)
+
+retention_manager = None
+if RetentionManager and db:
+    retention_manager = RetentionManager(db)
+
+# Shared so every reorganizer knows which journaled runs are still in progress
+reorg_journal = None
+if ReorgJournal and settings.enable_reorg_journal:
+    reorg_journal = ReorgJournal()
+
 file_monitor: Optional[FileMonitor] = None
 
 
@@ -107,6 +154,7 @@ file_monitor: Optional[FileMonitor] = None
 
 class AnalysisRequest(BaseModel):
     directory: Optional[str] = None
+    force: bool = False  # Ignore a cached analysis of an unchanged tree
 
 
 class UserChoiceRequest(BaseModel):
@@ -117,6 +165,21 @@ class ReorganizeRequest(BaseModel):
     migration_plan: List[Dict]
 
 
+class PlanRequest(BaseModel):
+    migration_plan: List[Dict]
+    directory: Optional[str] = None  # Analyzed folder whose tree gives folder sizes
+
+
+class RecoverRequest(BaseModel):
+    mode: str = "resume"  # "resume" or "rollback"
+
+
+class OptimizeRequest(BaseModel):
+    directory: Optional[str] = None
+    force: bool = False
+    execute: bool = False  # Run plan operations while they are generated
+
+
 class EmailReportRequest(BaseModel):
     email: str
     operations: List[Dict]
@@ -157,7 +220,7 @@ async def root():
 @app.get("/api/status")
 async def get_status():
     """Get system status"""
-    stats = db.get_statistics()
+    stats = await adb.get_statistics()
     
     return {
         "monitor_active": file_monitor is not None and file_monitor.enabled,
@@ -189,21 +252,32 @@ async def analyze_folder_structure(request: AnalysisRequest):
         
         print(f"\n🔍 Starting folder analysis...")
         
-        # Perform full analysis using Claude
-        structure, analysis, suggestions = analyzer.perform_full_analysis(root_path)
+        # Perform full analysis using Claude (scan and prompts block, so off the event loop)
+        structure, analysis, suggestions, diff, run = await asyncio.to_thread(
+            analyzer.perform_full_analysis, root_path, force=request.force
+        )
+        
+        # The full tree is kept in compact form; return and store only its top levels
+        tree = run['tree']
+        top_levels = tree.to_dict(max_depth=settings.analysis_response_depth)
+        del structure
         
-        # Save to database
-        total_files = structure.get('file_count', 0)
-        db.save_folder_analysis(
+        # Save to database (the full tree lives in the snapshot, store only the diff)
+        total_files = top_levels.get('file_count', 0)
+        await adb.save_folder_analysis(
             total_files=total_files,
-            folder_structure=structure,
+            folder_structure={"root": str(root_path), "diff": diff} if diff else top_levels,
             optimization_suggestions=suggestions
         )
         
         return {
-            "structure": structure,
+            "structure": top_levels,
+            "tree": {"directories": len(tree), "bytes": tree.nbytes()},
             "analysis": analysis,
             "suggestions": suggestions,
+            "diff": diff,
+            "token_usage": run['token_usage'],
+            "cache": run['cache'],
             "total_files": total_files
         }
     
@@ -212,6 +286,115 @@ async def analyze_folder_structure(request: AnalysisRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/analyze/jobs")
+async def start_analysis_job(request: AnalysisRequest):
+    """
+    Start a folder analysis in the background
+    
+    Returns a job id at once; follow /api/analyze/jobs/{job_id}/events for
+    progress and fetch the result from /api/analyze/jobs/{job_id}.
+    """
+    if not analysis_jobs:
+        raise HTTPException(status_code=503, detail="Folder analyzer not available")
+    
+    root_path = Path(request.directory).expanduser() if request.directory else Path.home() / "Documents"
+    if not root_path.exists():
+        raise HTTPException(status_code=404, detail="Directory not found")
+    
+    job = analysis_jobs.start(root_path, force=request.force)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "events_url": f"/api/analyze/jobs/{job.id}/events",
+        "result_url": f"/api/analyze/jobs/{job.id}"
+    }
+
+
+def get_analysis_job(job_id: str):
+    job = analysis_jobs.get(job_id) if analysis_jobs else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+    return job
+
+
+@app.get("/api/analyze/jobs/{job_id}")
+async def get_analysis_job_status(job_id: str):
+    """Status of an analysis job, with its result once done"""
+    return get_analysis_job(job_id).to_dict()
+
+
+@app.get("/api/analyze/jobs/{job_id}/events")
+async def stream_analysis_job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events for an analysis job
+    
+    Event types: progress (phase, directories/files scanned, files/sec,
+    partitions), partial (a partial analysis as it arrives), done, failed.
+    Reconnecting clients send Last-Event-ID to resume where they left off.
+    """
+    job = get_analysis_job(job_id)
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    return StreamingResponse(
+        analysis_jobs.stream(job, after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/analyze/jobs/{job_id}/structure")
+async def get_analysis_job_structure(job_id: str, offset: int = 0, limit: int = 1000):
+    """
+    Page through the analyzed tree of a finished job
+    
+    Folders come in pre-order as flat rows with index, parent and subtree end.
+    """
+    job = get_analysis_job(job_id)
+    if job.status != 'done':
+        raise HTTPException(status_code=409, detail=f"Analysis job is {job.status}")
+    
+    # This job's own tree, not whatever was analyzed last under the same root
+    tree = job.tree
+    if tree is None:
+        raise HTTPException(status_code=404, detail="Analyzed tree not found")
+    
+    limit = max(1, min(limit, 10000))
+    rows = await asyncio.to_thread(tree.rows, offset, limit)
+    next_offset = offset + len(rows)
+    return {
+        "directories": rows,
+        "total": len(tree),
+        "next_offset": next_offset if next_offset < len(tree) else None
+    }
+
+
+@app.get("/api/analyze/tree")
+async def get_analyzed_subtree(directory: str, path: str = "", depth: int = 2):
+    """
+    Get part of the last analyzed tree of a directory
+    
+    Args:
+        directory: Root that was analyzed
+        path: Subfolder, absolute or relative to the root (default: the root)
+        depth: Folder levels to include below it
+    """
+    if not analyzer:
+        raise HTTPException(status_code=503, detail="Folder analyzer not available")
+    
+    tree = await asyncio.to_thread(analyzer.get_tree, Path(directory).expanduser())
+    if tree is None:
+        raise HTTPException(status_code=404, detail="Directory has not been analyzed")
+    
+    index = tree.find(path or ".")
+    if index is None:
+        raise HTTPException(status_code=404, detail="Folder not found in the analyzed tree")
+    
+    return {
+        "structure": tree.to_dict(index, max_depth=max(0, depth)),
+        "extensions": tree.extension_histogram(index),
+        "ages": tree.age_histogram(index)
+    }
+
+
 @app.post("/api/user-choice")
 async def handle_user_choice(request: UserChoiceRequest):
     """
@@ -223,7 +406,7 @@ async def handle_user_choice(request: UserChoiceRequest):
         choice = request.choice.lower()
         
         # Save preference
-        db.save_preference("organization_choice", choice)
+        await adb.save_preference("organization_choice", choice)
         
         # Show notification
         notifier.show_user_choice_confirmation(choice)
@@ -251,11 +434,13 @@ async def reorganize_files(request: ReorganizeRequest, background_tasks: Backgro
     Shows progress notifications at 50%, 90%, 100%
     """
     try:
-        reorganizer = FileReorganizer(db, notifier)
+        # Share the monitor's catalog so new destination folders are watched
+        catalog = file_monitor.catalog if file_monitor else None
+        reorganizer = FileReorganizer(db, notifier, catalog=catalog, journal=reorg_journal)
         
-        # Execute reorganization
-        summary = reorganizer.execute_reorganization(
-            migration_plan=request.migration_plan
+        # Execute reorganization off the event loop; large plans take a while
+        summary = await asyncio.to_thread(
+            reorganizer.execute_reorganization, request.migration_plan
         )
         
         return {
@@ -268,6 +453,158 @@ async def reorganize_files(request: ReorganizeRequest, background_tasks: Backgro
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/reorganize/plan")
+async def plan_reorganization(request: PlanRequest):
+    """
+    Dry run: validate a migration plan without touching any file
+    
+    Returns per-operation results, the issues found (duplicates, missing
+    sources, cycles, collisions with the names they would get, moves into
+    folders archived later), same- vs cross-device counts, estimated bytes
+    and time, and the validated plan to pass to /api/reorganize.
+    """
+    if not MigrationPlanner:
+        raise HTTPException(status_code=503, detail="Reorganizer not available")
+    
+    def plan():
+        folder_size = None
+        tree = analyzer.get_tree(Path(request.directory).expanduser()) if analyzer and request.directory else None
+        if tree is not None:
+            sizes = tree.subtree_totals()[1]
+            
+            def folder_size(path: str) -> Optional[int]:
+                index = tree.find(path)
+                return int(sizes[index]) if index is not None else None
+        
+        return MigrationPlanner(folder_size).plan(request.migration_plan)
+    
+    try:
+        return await asyncio.to_thread(plan)
+    except Exception as e:
+        print(f"Error planning reorganization: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/reorganize/runs")
+async def get_reorganization_runs(limit: int = 50):
+    """
+    Journaled reorganization runs, most recent first
+    
+    Status is complete, running, incomplete (interrupted: resume or roll it
+    back via /recover), resumed, rolled_back or undone; done, failed and
+    pending count the operations journaled so far.
+    """
+    if not reorg_journal:
+        raise HTTPException(status_code=503, detail="Reorganization journal is disabled")
+    runs = await asyncio.to_thread(reorg_journal.list_runs, max(1, min(limit, 1000)))
+    return {"runs": runs}
+
+
+def run_journal_action(action: str, run_id: str) -> Dict:
+    """Resume, roll back or undo a journaled run on a new reorganizer"""
+    if not (FileReorganizer and reorg_journal):
+        raise HTTPException(status_code=503, detail="Reorganization journal is disabled")
+    catalog = file_monitor.catalog if file_monitor else None
+    reorganizer = FileReorganizer(db, notifier, catalog=catalog, journal=reorg_journal)
+    try:
+        return getattr(reorganizer, action)(run_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.post("/api/reorganize/runs/{run_id}/recover")
+async def recover_reorganization_run(run_id: str, request: RecoverRequest):
+    """
+    Recover an interrupted run
+    
+    resume executes the plan operations that did not take effect; rollback
+    moves everything the run did back. Copies left half-done by the
+    interruption are removed first in both cases.
+    """
+    actions = {"resume": "resume_run", "rollback": "rollback_run"}
+    if request.mode not in actions:
+        raise HTTPException(status_code=400, detail="Mode must be 'resume' or 'rollback'")
+    
+    summary = await asyncio.to_thread(run_journal_action, actions[request.mode], run_id)
+    return {"status": "completed", "summary": summary}
+
+
+@app.post("/api/reorganize/runs/{run_id}/undo")
+async def undo_reorganization_run(run_id: str):
+    """Undo a run by replaying its operations in reverse on the parallel executor"""
+    summary = await asyncio.to_thread(run_journal_action, "undo_run", run_id)
+    return {"status": "completed", "summary": summary}
+
+
+@app.post("/api/optimize")
+async def optimize_folder_structure(request: OptimizeRequest):
+    """
+    Analyze a folder and, with execute set, reorganize it in the same request
+    
+    Migration plan operations are streamed from Claude's suggestions and
+    executed as each one arrives, after passing the reorganizer's safety gate.
+    Requires PIPELINED_REORGANIZATION=true.
+    """
+    if not analyzer:
+        raise HTTPException(status_code=503, detail="Folder analyzer not available")
+    if request.execute and not (settings.pipelined_reorganization and PlanPipeline):
+        raise HTTPException(status_code=403, detail="Pipelined reorganization is disabled")
+    
+    root_path = Path(request.directory).expanduser() if request.directory else Path.home() / "Documents"
+    if not root_path.exists():
+        raise HTTPException(status_code=404, detail="Directory not found")
+    
+    def optimize():
+        pipeline = None
+        if request.execute:
+            catalog = file_monitor.catalog if file_monitor else None
+            pipeline = PlanPipeline(FileReorganizer(db, notifier, catalog=catalog, journal=reorg_journal), root_path)
+        
+        started = time.perf_counter()
+        try:
+            structure, analysis, suggestions, diff, run = analyzer.perform_full_analysis(
+                root_path, force=request.force,
+                on_plan_item=pipeline.submit if pipeline else None
+            )
+        finally:
+            analysis_seconds = time.perf_counter() - started
+            execution = pipeline.finish() if pipeline else None
+        
+        del structure
+        return analysis, suggestions, diff, run, execution, {
+            'analysis_seconds': round(analysis_seconds, 3),
+            'total_seconds': round(time.perf_counter() - started, 3),
+        }
+    
+    try:
+        print(f"\n🔍 Starting folder optimization{' (pipelined)' if request.execute else ''}...")
+        analysis, suggestions, diff, run, execution, timings = await asyncio.to_thread(optimize)
+        
+        tree = run['tree']
+        top_levels = tree.to_dict(max_depth=settings.analysis_response_depth)
+        await adb.save_folder_analysis(
+            total_files=top_levels.get('file_count', 0),
+            folder_structure={"root": str(root_path), "diff": diff} if diff else top_levels,
+            optimization_suggestions=suggestions
+        )
+        
+        return {
+            "analysis": analysis,
+            "suggestions": suggestions,
+            "diff": diff,
+            "execution": execution,
+            "timings": timings,
+            "token_usage": run['token_usage'],
+            "cache": run['cache']
+        }
+    
+    except Exception as e:
+        print(f"Error in optimization: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/email-report")
 async def send_email_report(request: EmailReportRequest):
     """Send email report of file operations"""
@@ -342,6 +679,19 @@ async def toggle_monitoring(request: ToggleRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/monitor/stats")
+async def get_monitor_stats():
+    """Get scan cost of the polling observer (empty for native observers)"""
+    try:
+        return {
+            "observer": settings.monitor_observer,
+            "scans": file_monitor.get_scan_stats() if file_monitor else []
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/classify-file")
 async def classify_single_file(file_path: str):
     """Classify a single file"""
@@ -395,24 +745,207 @@ async def create_file_reminder(request: ReminderRequest):
 async def get_recent_operations(limit: int = 50):
     """Get recent file operations"""
     try:
-        operations = db.get_recent_operations(limit)
+        operations = await adb.get_recent_operations(limit)
         return {"operations": operations}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/operations")
+async def get_operations_page(limit: int = 50, cursor: Optional[int] = None,
+                              operation_type: Optional[str] = None,
+                              category: Optional[str] = None,
+                              start: Optional[str] = None,
+                              end: Optional[str] = None):
+    """
+    Page through operation history, newest first
+    
+    Pass next_cursor from a response as cursor to get the next page.
+    """
+    try:
+        return await adb.get_operations_page(
+            max(1, min(limit, 1000)), cursor, operation_type, category, start, end
+        )
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/operations/since")
+async def get_operations_since(since: int = 0, limit: int = 500):
+    """Get only operations newer than the last id the client has seen"""
+    try:
+        return await adb.get_operations_since(since, max(1, min(limit, 5000)))
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/operations/export")
+async def export_operations(format: str = "ndjson",
+                            operation_type: Optional[str] = None,
+                            category: Optional[str] = None,
+                            start: Optional[str] = None,
+                            end: Optional[str] = None):
+    """Stream the full (filtered) operation history as NDJSON or CSV"""
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    
+    chunks = db.iter_operations(
+        operation_type=operation_type, category=category, start=start, end=end
+    )
+    
+    def ndjson_lines():
+        for chunk in chunks:
+            yield "".join(json.dumps(row) + "\n" for row in chunk)
+    
+    def csv_lines():
+        buffer = io.StringIO()
+        writer = None
+        for chunk in chunks:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(chunk[0].keys()))
+                writer.writeheader()
+            writer.writerows(chunk)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    # Sync generators are iterated on the threadpool, one DB chunk at a time
+    if format == "csv":
+        return StreamingResponse(
+            csv_lines(), media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=operations.csv"}
+        )
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+
+@app.get("/api/catalog")
+async def lookup_catalog(name: Optional[str] = None, hash: Optional[str] = None,
+                         original_path: Optional[str] = None,
+                         category: Optional[str] = None,
+                         file: Optional[str] = None, limit: int = 50):
+    """
+    Find where organized files are now
+    
+    Look up by filename, content hash, original path or category, or pass
+    file=<path> to find where a file with the same content was organized.
+    """
+    if not settings.enable_file_catalog:
+        raise HTTPException(status_code=503, detail="File catalog not enabled")
+    
+    if file:
+        file_path = Path(file).expanduser()
+        if not file_path.is_file():
+            raise HTTPException(status_code=404, detail="File not found")
+        hash = await asyncio.to_thread(quick_hash, file_path, file_path.stat().st_size)
+    
+    try:
+        entries = await adb.find_catalog_entries(name, hash, original_path, category, min(limit, 500))
+        return {"entries": entries, "count": len(entries)}
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/search")
+async def search_files(q: str, limit: int = 20, category: Optional[str] = None):
+    """
+    Full-text search over organized files' names and content previews
+    
+    Terms must all match; use "quoted phrases" and trailing * for prefixes
+    (e.g. budg* "quarterly report").
+    """
+    if not search_index or not search_index.available:
+        raise HTTPException(status_code=503, detail="Search not available")
+    
+    try:
+        return await asyncio.to_thread(search_index.search, q, min(limit, 200), category)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/statistics")
 async def get_statistics():
     """Get usage statistics"""
     try:
-        stats = db.get_statistics()
+        stats = await adb.get_statistics()
         return stats
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/db/metrics")
+async def get_database_metrics():
+    """Get per-query database latency"""
+    try:
+        return {"queries": db.get_query_metrics()}
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/transfers/metrics")
+async def get_transfer_metrics():
+    """Get file transfer throughput metrics"""
+    try:
+        from file_transfer import transfer_engine
+        return transfer_engine.get_metrics()
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/retention")
+async def get_retention_status():
+    """Get database/archive sizes, retention policies and space reclaimed by the last run"""
+    if not retention_manager:
+        raise HTTPException(status_code=503, detail="Retention not available")
+    
+    try:
+        return await asyncio.to_thread(retention_manager.get_status)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/retention/run")
+async def run_retention(convert_auto_vacuum: bool = False):
+    """
+    Apply retention policies now and report the space reclaimed
+    
+    With convert_auto_vacuum, a database created before incremental
+    auto-vacuum is converted first: a one-time full VACUUM that blocks
+    writers while it runs.
+    """
+    if not retention_manager:
+        raise HTTPException(status_code=503, detail="Retention not available")
+    
+    try:
+        return await asyncio.to_thread(retention_manager.run, convert_auto_vacuum)
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/statistics/series")
+async def get_statistics_series(granularity: str = "day", limit: int = 30):
+    """Get operation counts per day or hour for charts"""
+    try:
+        return {
+            "granularity": granularity,
+            "series": await adb.get_time_series(granularity, limit)
+        }
+    
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/lava/stats")
 async def get_lava_stats():
     """Get Lava API usage statistics"""
@@ -429,7 +962,7 @@ async def get_lava_stats():
         
         # Get stats from Lava (this would be a real API call in production)
         # For now, return mock data based on operations count
-        operations = db.get_recent_operations(1000) if db else []
+        operations = await adb.get_recent_operations(1000) if adb else []
         total_requests = len(operations)
         
         # Estimate: ~$0.001 per request, ~1000 tokens per request
@@ -456,7 +989,7 @@ async def get_lava_stats():
 async def get_status():
     """Get current system status"""
     try:
-        operations = db.get_recent_operations(100) if db else []
+        operations = await adb.get_recent_operations(100) if adb else []
         
         # Calculate stats
         files_organized = len(operations)
@@ -502,10 +1035,27 @@ async def startup_event():
         print("The application will start but AI features may not work.")
         print("Please configure your .env file with valid API keys.\n")
     
+    # Reorganizations interrupted by a crash wait to be resumed or rolled back
+    if reorg_journal:
+        incomplete = reorg_journal.incomplete_runs()
+        for run in incomplete:
+            print(f"⚠️  Interrupted reorganization {run['run_id']}: {run['done']} of "
+                  f"{run['planned']} operations done - POST /api/reorganize/runs/{run['run_id']}/recover")
+        if incomplete:
+            notifier.show_notification(
+                "Reorganization Interrupted",
+                f"{len(incomplete)} reorganization(s) did not finish - resume or roll back",
+                sound=True
+            )
+    
     # Start reminder service in background
     if reminder_service:
         asyncio.create_task(reminder_service.start_background_task())
     
+    # Archive old history and vacuum while idle
+    if retention_manager and settings.retention_enabled:
+        asyncio.create_task(retention_manager.retention_loop())
+    
     # Auto-start file monitor
     global file_monitor
     if FileMonitor and file_monitor is None:
@@ -531,6 +1081,16 @@ async def shutdown_event():
         file_monitor.stop()
     
     reminder_service.stop()
+    if retention_manager:
+        retention_manager.stop()
+    if analysis_jobs:
+        analysis_jobs.shutdown()
+    
+    # Close long-lived database connections
+    if file_monitor:
+        file_monitor.db.close()
+    if adb:
+        await adb.close()
     
     print("✅ Shutdown complete\n")
 
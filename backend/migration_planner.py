@@ -0,0 +1,377 @@
+"""
+Dry-run validation of migration plans
+Simulates a whole plan in memory, in the order the parallel executor runs it
+(creates, then moves, then archives), against one snapshot of the folders it
+touches. Reports duplicates, missing sources, moves into themselves, swap
+cycles, collisions (with the unique names the reorganizer would pick),
+moves into folders archived later, same- vs cross-device moves, and
+estimated bytes to copy and time. The validated plan, with resolved destinations,
+can be passed to /api/reorganize as is.
+"""
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from config import settings
+from plan_executor import PHASES, DeviceResolver, normalize_path, parent_path, parent_paths
+from reorganizer import ARCHIVE_ROOT, OPERATION_PATHS
+
+
+# Rough costs used for the time estimate: a same-device rename or mkdir, and
+# cross-device copy throughput
+RENAME_SECONDS = 0.0002
+COPY_BYTES_PER_SEC = 100 * 1024 * 1024
+
+# Issues listed in the response (counts always cover all of them)
+ISSUE_LIST_LIMIT = 500
+
+_UNLISTED = object()
+
+
+class FilesystemSnapshot:
+    """Directory listings read once, on first use, with one scandir per folder"""
+
+    def __init__(self):
+        self.listings: Dict[str, Optional[Dict[str, os.DirEntry]]] = {}
+
+    def entry(self, path: str) -> Optional[os.DirEntry]:
+        parent = parent_path(path)
+        name = path[len(parent):].lstrip(os.sep)
+        listing = self.listings.get(parent, _UNLISTED)
+        if listing is _UNLISTED:
+            try:
+                with os.scandir(parent) as entries:
+                    listing = {entry.name: entry for entry in entries}
+            except OSError:
+                listing = None
+            self.listings[parent] = listing
+        return listing.get(name) if listing else None
+
+    def kind(self, path: str) -> Optional[str]:
+        """'dir', 'file' or None if path does not exist"""
+        if parent_path(path) == path:
+            return 'dir'
+        entry = self.entry(path)
+        if entry is None:
+            return None
+        return 'dir' if entry.is_dir(follow_symlinks=False) else 'file'
+
+    def size(self, path: str) -> int:
+        entry = self.entry(path)
+        try:
+            return entry.stat(follow_symlinks=False).st_size if entry else 0
+        except OSError:
+            return 0
+
+
+class MigrationPlanner:
+    """Validates a migration plan against the filesystem without changing anything"""
+
+    def __init__(self, folder_size: Optional[Callable[[str], Optional[int]]] = None):
+        """
+        Args:
+            folder_size: Bytes below a folder, if known (e.g. from the last
+                analyzed tree); folders of unknown size count as 0 bytes
+        """
+        self.folder_size = folder_size
+
+    def plan(self, migration_plan: List[Dict]) -> Dict:
+        """
+        Validate a plan
+
+        Returns:
+            Dict with the executable 'plan' (valid operations with resolved
+            destinations), 'issues' (plan index, code, severity, message)
+            and a 'summary' with counts, bytes to copy and time estimates
+        """
+        start = time.perf_counter()
+        self.snapshot = FilesystemSnapshot()
+        self.devices = DeviceResolver()
+        # Simulated changes: path -> ('dir'|'file', path on disk or None if new), or None if gone
+        self.overlay: Dict[str, Optional[Tuple[str, Optional[str]]]] = {}
+        self.claimed = set()
+        # Nearest overlay entry at or above a folder, valid while generation is unchanged
+        self.generation = 0
+        self.nearest: Dict[str, Tuple[int, Optional[str]]] = {}
+
+        results = [self._normalize(index, operation) for index, operation in enumerate(migration_plan)]
+        self._mark_duplicates(results)
+        self._mark_cycles(results)
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        for result in sorted(results, key=lambda result: (PHASES.get(result['action'], 1), result['index'])):
+            if result['status'] != 'ok':
+                continue
+            if result['action'] == 'create':
+                self._simulate_create(result)
+            elif result['action'] == 'move':
+                self._simulate_move(result)
+            else:
+                self._simulate_archive(result, timestamp)
+
+        self._mark_archived_later(results)
+        return self._report(migration_plan, results, time.perf_counter() - start)
+
+    # ------------------------------------------------------------------
+    # Normalization
+    # ------------------------------------------------------------------
+
+    def _normalize(self, index: int, operation: Dict) -> Dict:
+        action = operation.get('action')
+        result = {'index': index, 'action': action, 'status': 'ok', 'issues': [],
+                  'source': None, 'destination': None, 'device': None, 'bytes': 0}
+        required = OPERATION_PATHS.get(action)
+        if required is None:
+            return self._fail(result, 'invalid', f"unknown action: {action!r}")
+        for key in required:
+            value = operation.get(key)
+            if not value or not isinstance(value, str):
+                return self._fail(result, 'invalid', f"missing {key}")
+            result[key] = normalize_path(value)
+        return result
+
+    def _fail(self, result: Dict, code: str, message: str) -> Dict:
+        result['status'] = 'error'
+        result['issues'].append({'code': code, 'severity': 'error', 'message': message})
+        return result
+
+    def _warn(self, result: Dict, code: str, message: str):
+        result['issues'].append({'code': code, 'severity': 'warning', 'message': message})
+
+    def _mark_duplicates(self, results: List[Dict]):
+        seen: Dict[Tuple, int] = {}
+        for result in results:
+            if result['status'] != 'ok':
+                continue
+            key = (result['action'], result['source'], result['destination'])
+            if key in seen:
+                result['status'] = 'duplicate'
+                self._warn(result, 'duplicate', f"same as operation {seen[key] + 1}")
+            else:
+                seen[key] = result['index']
+
+    def _mark_cycles(self, results: List[Dict]):
+        """Moves into their own subtree, and chains of moves that lead back to their start"""
+        moves = {}
+        for result in results:
+            if result['status'] == 'ok' and result['action'] == 'move':
+                source, destination = result['source'], result['destination']
+                if destination == source or destination.startswith(source.rstrip(os.sep) + os.sep):
+                    self._fail(result, 'cycle', f"destination is inside the source: {destination}")
+                else:
+                    moves.setdefault(source, result)
+
+        state: Dict[str, int] = {}  # 1 = on the current chain, 2 = done
+        for start in moves:
+            chain = []
+            path = start
+            while path in moves and state.get(path) is None:
+                state[path] = 1
+                chain.append(path)
+                path = moves[path]['destination']
+            if state.get(path) == 1:
+                loop = chain[chain.index(path):]
+                for member in loop:
+                    self._fail(moves[member], 'cycle',
+                               f"moves {' → '.join(loop + [path])} form a cycle")
+            for member in chain:
+                state[member] = 2
+
+    # ------------------------------------------------------------------
+    # Simulation
+    # ------------------------------------------------------------------
+
+    def _state(self, path: str, stop: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """
+        (kind, path on disk) of path after the operations simulated so far,
+        or None if nothing is there
+
+        Paths inside a moved folder resolve through the folder's original
+        location (changes made there before the move still apply).
+        """
+        if path in self.overlay:
+            return self.overlay[path]
+        folder = self._nearest(parent_path(path))
+        if folder is not None and (stop is None or folder.startswith(stop + os.sep)):
+            state = self.overlay[folder]
+            if state is None or state[1] is None:
+                return None
+            return self._state(state[1] + path[len(folder):], stop=state[1])
+        kind = self.snapshot.kind(path)
+        return (kind, path) if kind else None
+
+    def _nearest(self, folder: str) -> Optional[str]:
+        """The deepest overlay entry at or above folder (memoized per generation)"""
+        cached = self.nearest.get(folder)
+        if cached is not None and cached[0] == self.generation:
+            return cached[1]
+        if folder in self.overlay:
+            found = folder
+        else:
+            parent = parent_path(folder)
+            found = self._nearest(parent) if parent and parent != folder else None
+        self.nearest[folder] = (self.generation, found)
+        return found
+
+    def _set(self, path: str, state: Optional[Tuple[str, Optional[str]]], folder: bool):
+        """Record a simulated change; changes to folders invalidate the memoized lookups"""
+        self.overlay[path] = state
+        if folder:
+            self.generation += 1
+
+    def _kind(self, path: str) -> Optional[str]:
+        state = self._state(path)
+        return state[0] if state else None
+
+    def _make_parents(self, result: Dict, path: str) -> bool:
+        for parent in parent_paths(path):
+            kind = self._kind(parent)
+            if kind == 'dir':
+                return True
+            if kind == 'file':
+                self._fail(result, 'parent_is_file', f"{parent} is a file")
+                return False
+            self._set(parent, ('dir', None), True)
+        return True
+
+    def _unique(self, path: str) -> str:
+        """The name the reorganizer would pick if path is taken (name_1, name_2, ...)"""
+        if self._kind(path) is None and path not in self.claimed:
+            return path
+        stem, suffix = os.path.splitext(path)
+        counter = 1
+        while self._kind(f"{stem}_{counter}{suffix}") is not None or f"{stem}_{counter}{suffix}" in self.claimed:
+            counter += 1
+        return f"{stem}_{counter}{suffix}"
+
+    def _simulate_create(self, result: Dict):
+        destination = result['destination']
+        kind = self._kind(destination)
+        if kind == 'file':
+            self._fail(result, 'collision', f"a file exists at {destination}")
+        elif kind == 'dir':
+            self._warn(result, 'exists', f"folder already exists: {destination}")
+        elif self._make_parents(result, destination):
+            self._set(destination, ('dir', None), True)
+
+    def _simulate_move(self, result: Dict):
+        source, destination = result['source'], result['destination']
+        state = self._state(source)
+        if state is None:
+            self._fail(result, 'missing_source', f"source not found: {source}")
+            return
+        kind, origin = state
+        if not self._make_parents(result, destination):
+            return
+
+        resolved = self._unique(destination)
+        if resolved != destination:
+            self._warn(result, 'collision', f"{destination} exists, renamed to {os.path.basename(resolved)}")
+            result['destination'] = resolved
+        self.claimed.add(resolved)
+
+        self._set(source, None, kind == 'dir')
+        self._set(resolved, (kind, origin), kind == 'dir')
+        self._measure(result, kind, origin, source, resolved)
+
+    def _simulate_archive(self, result: Dict, timestamp: str):
+        source = result['source']
+        state = self._state(source)
+        if state is None:
+            self._fail(result, 'missing_source', f"folder not found: {source}")
+            return
+        kind, origin = state
+        if kind != 'dir':
+            self._fail(result, 'not_a_folder', f"archive source is not a folder: {source}")
+            return
+
+        archive_to = self._unique(os.path.join(str(ARCHIVE_ROOT), f"{os.path.basename(source)}_{timestamp}"))
+        self.claimed.add(archive_to)
+        result['destination'] = archive_to
+
+        self._set(source, None, True)
+        self._set(archive_to, ('dir', origin), True)
+        self._measure(result, kind, origin, source, archive_to)
+
+    def _measure(self, result: Dict, kind: str, origin: Optional[str], source: str, destination: str):
+        """Whether the move crosses devices, and if so the bytes it copies"""
+        same = self.devices.device(source) == self.devices.device(destination)
+        result['device'] = 'same' if same else 'cross'
+        if same or origin is None:
+            return
+        if kind == 'file':
+            result['bytes'] = self.snapshot.size(origin)
+        elif self.folder_size:
+            result['bytes'] = self.folder_size(origin) or 0
+
+    def _mark_archived_later(self, results: List[Dict]):
+        archived = {result['source']: result['index'] for result in results
+                    if result['action'] == 'archive' and result['status'] == 'ok'}
+        if not archived:
+            return
+        shortest = min(map(len, archived))
+        for result in results:
+            if result['action'] != 'move' or result['status'] != 'ok':
+                continue
+            for folder in parent_paths(result['destination']):
+                if len(folder) < shortest:
+                    break
+                if folder in archived:
+                    self._warn(result, 'archived_later',
+                               f"{folder} is archived by operation {archived[folder] + 1}")
+                    break
+
+    # ------------------------------------------------------------------
+    # Report
+    # ------------------------------------------------------------------
+
+    def _report(self, migration_plan: List[Dict], results: List[Dict], seconds: float) -> Dict:
+        issues = []
+        counts: Dict[str, int] = {}
+        plan = []
+        valid = cross_device = collisions = warnings = 0
+        bytes_to_copy = 0
+        for result in results:
+            for issue in result['issues']:
+                counts[issue['code']] = counts.get(issue['code'], 0) + 1
+                if len(issues) < ISSUE_LIST_LIMIT:
+                    issues.append({'index': result['index'], **issue})
+            if result['status'] != 'ok':
+                continue
+
+            valid += 1
+            warnings += len(result['issues'])
+            collisions += any(issue['code'] == 'collision' for issue in result['issues'])
+            if result['device'] == 'cross':
+                cross_device += 1
+                bytes_to_copy += result['bytes']
+
+            operation = dict(migration_plan[result['index']])
+            if result['action'] == 'move':
+                operation['destination'] = result['destination']
+            elif result['action'] == 'archive':
+                operation['archive_to'] = result['destination']
+            plan.append(operation)
+
+        # Same-device operations are metadata updates; cross-device ones copy
+        sequential = valid * RENAME_SECONDS + bytes_to_copy / COPY_BYTES_PER_SEC
+        workers = max(1, min(settings.reorganize_workers, settings.reorganize_device_concurrency))
+
+        return {
+            'plan': plan,
+            'issues': issues,
+            'summary': {
+                'total_operations': len(results),
+                'valid': valid,
+                'duplicates': sum(1 for result in results if result['status'] == 'duplicate'),
+                'errors': sum(1 for result in results if result['status'] == 'error'),
+                'warnings': warnings,
+                'issue_counts': counts,
+                'collisions_resolved': collisions,
+                'cross_device': cross_device,
+                'bytes_to_copy': bytes_to_copy,
+                'estimated_seconds': round(sequential / workers, 3),
+                'estimated_sequential_seconds': round(sequential, 3),
+                'planning_ms': round(seconds * 1000, 1),
+            },
+        }
@@ -0,0 +1,194 @@
+"""
+Write-behind logger for the file_operations table
+Callers enqueue operation records and status updates; a single writer thread
+group-commits them with executemany, one transaction per batch, instead of one
+connect/commit per row.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple, Union
+from config import settings
+from database import Database
+
+
+# Queue marker asking the writer thread to flush and exit
+_STOP = object()
+
+
+class OperationLogWriter:
+    """
+    Batches file_operations inserts and status updates
+
+    log_operation() returns a Future resolving to the new row id. That Future
+    can be passed straight to update_status(), which is applied after the
+    insert because the queue preserves order.
+    """
+
+    def __init__(self, db: Database, flush_interval_ms: Optional[int] = None,
+                 batch_size: Optional[int] = None, synchronous: Optional[bool] = None):
+        self.db = db
+        self.flush_interval = (flush_interval_ms or settings.write_behind_flush_ms) / 1000
+        self.batch_size = max(1, batch_size or settings.write_behind_batch_size)
+        self.synchronous = settings.write_behind_synchronous if synchronous is None else synchronous
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def log_operation(self, filename: str, original_path: str,
+                      new_path: Optional[str], operation_type: str,
+                      file_type: Optional[str] = None,
+                      classification: Optional[str] = None,
+                      confidence: Optional[float] = None,
+                      status: str = 'pending') -> Future:
+        """Queue a file operation record, returning a Future of its row id"""
+        row = (filename, original_path, new_path, operation_type,
+               file_type, classification, confidence, status)
+        return self._submit(('insert', row, Future()))
+
+    def update_status(self, operation_id: Union[int, Future], status: str) -> Future:
+        """Queue a status update for a logged (or still queued) operation"""
+        return self._submit(('update', (operation_id, status), Future()))
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until everything queued so far has been written"""
+        if self.synchronous:
+            return
+        barrier = self._submit(('barrier', None, Future()))
+        barrier.result(timeout)
+
+    def close(self):
+        """Flush pending records and stop the writer thread"""
+        with self._thread_lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _submit(self, item: Tuple) -> Future:
+        """Write an item now (synchronous mode) or hand it to the writer thread"""
+        if self.synchronous:
+            self._write_batch([item])
+        else:
+            self._ensure_thread()
+            self._queue.put(item)
+        return item[2]
+
+    def _ensure_thread(self):
+        """Start the writer thread on first use (or after close)"""
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="operation-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        """Collect up to batch_size items or flush_interval seconds, then commit"""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or batch[-1][0] == 'barrier':
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._write_batch(batch)
+
+        # Drain anything queued after the stop marker
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        if leftover:
+            self._write_batch(leftover)
+
+    def _write_batch(self, batch: List[Tuple]):
+        """Write a batch in one transaction, grouping consecutive items by kind"""
+        start = time.perf_counter()
+        try:
+            self._execute_batch(batch)
+            self.db._record_latency('write_behind_batch', time.perf_counter() - start)
+        except Exception as e:
+            print(f"❌ Error writing operation log batch: {e}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _execute_batch(self, batch: List[Tuple]):
+        """Execute a batch; futures are resolved only after the commit"""
+        results = []
+        failed = []
+        row_ids = {}
+        with self.db.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            start = 0
+            while start < len(batch):
+                kind = batch[start][0]
+                end = start
+                while end < len(batch) and batch[end][0] == kind:
+                    end += 1
+                group = batch[start:end]
+
+                if kind == 'insert':
+                    conn.executemany("""
+                        INSERT INTO file_operations
+                        (filename, original_path, new_path, operation_type,
+                         file_type, classification, confidence, status)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """, [row for _, row, _ in group])
+                    # AUTOINCREMENT ids are consecutive within one write transaction
+                    last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                    first_id = last_id - len(group) + 1
+                    for i, (_, _, future) in enumerate(group):
+                        row_ids[future] = first_id + i
+                        results.append((future, first_id + i))
+
+                elif kind == 'update':
+                    updates = []
+                    for _, (operation_id, status), future in group:
+                        if isinstance(operation_id, Future):
+                            if operation_id in row_ids:
+                                # Inserted earlier in this batch
+                                operation_id = row_ids[operation_id]
+                            elif operation_id.exception() is not None:
+                                # Its insert failed in an earlier batch: fail this
+                                # update alone, not the whole transaction
+                                failed.append((future, operation_id.exception()))
+                                continue
+                            else:
+                                operation_id = operation_id.result()
+                        updates.append((status, operation_id))
+                        results.append((future, None))
+                    conn.executemany(
+                        "UPDATE file_operations SET status = ? WHERE id = ?", updates
+                    )
+
+                else:
+                    results.extend((future, None) for _, _, future in group)
+
+                start = end
+
+        for future, value in results:
+            future.set_result(value)
+        for future, error in failed:
+            future.set_exception(error)
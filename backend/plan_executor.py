@@ -0,0 +1,218 @@
+"""
+Parallel execution of migration plans
+The plan is compiled into a dependency graph: folders are created before
+anything is moved into them, operations on the same path (or a path inside
+it) keep their plan order, and archives wait for every move into or out of
+the archived folder. Ready operations run on a worker pool, with at most
+reorganize_device_concurrency operations in flight per storage device.
+"""
+import os
+import time
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+from config import settings
+
+
+# Creates run first and archives last; moves keep plan order between them
+PHASES = {'create': 0, 'move': 1, 'archive': 2}
+
+
+def operation_paths(operation: Dict) -> List[str]:
+    """Normalized paths an operation reads or writes"""
+    paths = []
+    for key in ('source', 'destination', 'archive_to'):
+        value = operation.get(key)
+        if value and isinstance(value, str):
+            paths.append(normalize_path(value))
+    return paths
+
+
+def normalize_path(value: str) -> str:
+    if value.startswith('~'):
+        value = os.path.expanduser(value)
+    # Most plan paths are already normal; normpath only the others
+    if '//' in value or '/.' in value or value.endswith(os.sep) or value.startswith('.'):
+        return os.path.normpath(value)
+    return value
+
+
+def parent_path(path: str) -> str:
+    """os.path.dirname for normalized paths, without its overhead"""
+    end = path.rfind(os.sep)
+    if end > 0:
+        return path[:end]
+    return os.sep if end == 0 else ''
+
+
+def parent_paths(path: str) -> Iterator[str]:
+    """Folders containing a normalized path, nearest first"""
+    end = path.rfind(os.sep)
+    while end > 0:
+        yield path[:end]
+        end = path.rfind(os.sep, 0, end)
+    if end == 0 and len(path) > 1:
+        yield os.sep
+
+
+def build_dependencies(migration_plan: List[Dict]) -> List[Set[int]]:
+    """
+    Indices of the operations each operation must wait for
+
+    Operations are visited creates first, then moves, then archives (plan
+    order within each). A visited operation depends on the last earlier one
+    that touched the same path or one of its ancestors, and on every earlier
+    one that touched a path inside it; the latter are then collapsed into a
+    single entry, so the graph stays linear in plan size.
+    """
+    order = sorted(range(len(migration_plan)),
+                   key=lambda i: (PHASES.get(migration_plan[i].get('action'), 1), i))
+    dependencies: List[Set[int]] = [set() for _ in migration_plan]
+    last_touch: Dict[str, int] = {}
+    touched_below: Dict[str, List[int]] = {}
+
+    for index in order:
+        needs = dependencies[index]
+        paths = operation_paths(migration_plan[index])
+        for path in paths:
+            # Earlier operations on this path or on a folder containing it
+            if path in last_touch:
+                needs.add(last_touch[path])
+            for ancestor in parent_paths(path):
+                if ancestor in last_touch:
+                    needs.add(last_touch[ancestor])
+            # Earlier operations inside this path
+            needs.update(touched_below.get(path, ()))
+
+        for path in paths:
+            last_touch[path] = index
+            touched_below[path] = [index]
+            for ancestor in parent_paths(path):
+                touched_below.setdefault(ancestor, []).append(index)
+        needs.discard(index)
+
+    return dependencies
+
+
+class DeviceResolver:
+    """st_dev of paths that may not exist yet, via their nearest existing folder (cached)"""
+
+    def __init__(self):
+        self.devices: Dict[str, Optional[int]] = {}
+
+    def device(self, path: str) -> Optional[int]:
+        # A file or folder is on its parent folder's device (mount points aside)
+        missing = []
+        current = parent_path(path) or path
+        while current not in self.devices:
+            try:
+                self.devices[current] = os.stat(current).st_dev
+            except OSError:
+                missing.append(current)
+                parent = parent_path(current)
+                if not parent or parent == current:
+                    self.devices[current] = None
+                    break
+                current = parent
+        for path in missing:
+            self.devices[path] = self.devices[current]
+        return self.devices[current]
+
+    def operation_devices(self, operation: Dict, archive_root: Optional[Path] = None) -> Tuple[int, ...]:
+        """Devices an operation reads from or writes to (archives also write to archive_root)"""
+        paths = operation_paths(operation)
+        if operation.get('action') == 'archive' and archive_root is not None:
+            paths.append(str(archive_root))
+        return tuple(sorted({device for device in map(self.device, paths) if device is not None}))
+
+
+class ParallelPlanExecutor:
+    """Runs a migration plan's operations in dependency order on a worker pool"""
+
+    def __init__(self, run_operation: Callable[[Dict], Optional[str]],
+                 workers: Optional[int] = None,
+                 device_concurrency: Optional[int] = None,
+                 archive_root: Optional[Path] = None):
+        """
+        Args:
+            run_operation: Performs one operation and returns the summary
+                counter it increments (FileReorganizer.execute_operation)
+            workers: Operations in flight overall
+            device_concurrency: Operations in flight per device
+            archive_root: Where archived folders are moved to
+        """
+        self.run_operation = run_operation
+        self.workers = max(1, workers or settings.reorganize_workers)
+        self.device_concurrency = max(1, device_concurrency or settings.reorganize_device_concurrency)
+        self.archive_root = archive_root
+        self.devices = DeviceResolver()
+
+    def execute(self, migration_plan: List[Dict],
+                on_complete: Callable[[int, Optional[str], Optional[Exception]], None]) -> float:
+        """
+        Run every operation once its dependencies are done
+
+        Args:
+            on_complete: Called on this thread with (plan index, counter,
+                exception or None) as each operation finishes
+
+        Returns:
+            Seconds taken
+        """
+        start = time.perf_counter()
+        total = len(migration_plan)
+        dependencies = build_dependencies(migration_plan)
+        dependents: List[List[int]] = [[] for _ in migration_plan]
+        waiting = [len(needs) for needs in dependencies]
+        for index, needs in enumerate(dependencies):
+            for need in needs:
+                dependents[need].append(index)
+        devices = [self.devices.operation_devices(operation, self.archive_root)
+                   for operation in migration_plan]
+
+        # Ready operations queued by the devices they use, so a busy device
+        # never holds up operations on the others
+        ready: Dict[Tuple[int, ...], deque] = {}
+        for index in range(total):
+            if not waiting[index]:
+                ready.setdefault(devices[index], deque()).append(index)
+        in_flight: Dict[int, int] = {}
+        running = 0
+        finished: "queue.SimpleQueue[Tuple[int, Optional[str], Optional[Exception]]]" = queue.SimpleQueue()
+
+        def run(index: int):
+            try:
+                finished.put((index, self.run_operation(migration_plan[index]), None))
+            except Exception as e:
+                finished.put((index, None, e))
+
+        def has_capacity(key: Tuple[int, ...]) -> bool:
+            return all(in_flight.get(device, 0) < self.device_concurrency for device in key)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reorganize") as pool:
+            while ready or running:
+                # Start ready operations on devices with a free slot, in order
+                for key in list(ready):
+                    pending = ready[key]
+                    while pending and running < self.workers and has_capacity(key):
+                        index = pending.popleft()
+                        for device in key:
+                            in_flight[device] = in_flight.get(device, 0) + 1
+                        running += 1
+                        pool.submit(run, index)
+                    if not pending:
+                        del ready[key]
+
+                index, counter, error = finished.get()
+                running -= 1
+                for device in devices[index]:
+                    in_flight[device] -= 1
+                on_complete(index, counter, error)
+                for dependent in dependents[index]:
+                    waiting[dependent] -= 1
+                    if not waiting[dependent]:
+                        ready.setdefault(devices[dependent], deque()).append(dependent)
+
+        return time.perf_counter() - start
@@ -0,0 +1,165 @@
+"""
+Streamed migration plans and their pipelined execution
+Claude's suggestions arrive as one JSON object, token by token. The parser
+finds the "migration_plan" array in the text received so far and returns
+each operation object as soon as its closing brace arrives; the pipeline
+passes each one through the reorganizer's safety gate and executes it on a
+background thread while the rest of the response is generated.
+"""
+import json
+import re
+import time
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+PLAN_START = re.compile(r'"migration_plan"\s*:\s*\[')
+
+# Characters kept when the array has not been found yet, so a key split
+# across chunks is still matched
+SEEK_OVERLAP = 40
+
+
+class PlanItemParser:
+    """Feed response text chunks; get back completed migration_plan items"""
+
+    def __init__(self):
+        self.text = ""
+        self.position = 0
+        self.state = 'seek'  # seek -> array -> done
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.item_start = -1
+        self.items = 0
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Add a chunk of response text and return the operations it completed"""
+        self.text += chunk
+        completed: List[Dict] = []
+
+        if self.state == 'seek':
+            match = PLAN_START.search(self.text, self.position)
+            if not match:
+                self.position = max(0, len(self.text) - SEEK_OVERLAP)
+                return completed
+            self.state = 'array'
+            self.position = match.end()
+
+        if self.state != 'array':
+            return completed
+
+        text = self.text
+        i = self.position
+        while i < len(text):
+            char = text[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                if self.depth == 0 and char == '{':
+                    self.item_start = i
+                self.depth += 1
+            elif char in '}]':
+                if self.depth == 0:
+                    # End of the migration_plan array
+                    self.state = 'done'
+                    i += 1
+                    break
+                self.depth -= 1
+                if self.depth == 0 and char == '}' and self.item_start >= 0:
+                    try:
+                        item = json.loads(text[self.item_start:i + 1])
+                    except ValueError:
+                        item = None
+                    if isinstance(item, dict):
+                        self.items += 1
+                        completed.append(item)
+                    self.item_start = -1
+            i += 1
+
+        self.position = i
+        return completed
+
+
+class PlanPipeline:
+    """Executes migration plan operations as they are submitted, one at a time, in order"""
+
+    def __init__(self, reorganizer, root_path: Path):
+        self.reorganizer = reorganizer
+        self.root_path = Path(root_path)
+        self.queue: "queue.Queue[Optional[Dict]]" = queue.Queue()
+        self.seen = set()
+        self.submitted = 0
+        self.completed = 0
+        self.counts = {'files_moved': 0, 'folders_created': 0, 'folders_archived': 0}
+        self.errors: List[str] = []
+        self.rejected: List[Dict] = []
+        self.started_at = time.perf_counter()
+        self.first_operation_at: Optional[float] = None
+        # Journaled as one run whose plan grows with each accepted operation
+        self.reorganizer.begin_run([], kind='optimize')
+        self.thread = threading.Thread(target=self._run, name="plan-pipeline", daemon=True)
+        self.thread.start()
+
+    def submit(self, operation: Dict) -> Optional[str]:
+        """
+        Queue an operation if it passes the safety gate
+
+        Returns:
+            Why it was rejected, or None if it was queued (or is a repeat)
+        """
+        key = (operation.get('action'), operation.get('source'), operation.get('destination'))
+        if key in self.seen:
+            return None
+        self.seen.add(key)
+
+        reason = self.reorganizer.check_operation(operation, self.root_path)
+        if reason:
+            print(f"🛑 Rejected {operation.get('action')}: {reason}")
+            self.rejected.append({'operation': operation, 'reason': reason})
+            return reason
+
+        self.submitted += 1
+        self.reorganizer.extend_run(operation)
+        self.queue.put(operation)
+        return None
+
+    def _run(self):
+        while True:
+            operation = self.queue.get()
+            if operation is None:
+                return
+            if self.first_operation_at is None:
+                self.first_operation_at = time.perf_counter() - self.started_at
+            try:
+                counter = self.reorganizer.execute_operation(operation)
+                if counter:
+                    self.counts[counter] += 1
+                self.completed += 1
+            except Exception as e:
+                error_msg = f"Error in {operation.get('action')} operation: {str(e)}"
+                self.errors.append(error_msg)
+                print(f"❌ {error_msg}")
+
+    def finish(self) -> Dict:
+        """Wait for queued operations, then flush and summarize as execute_reorganization does"""
+        self.queue.put(None)
+        self.thread.join()
+        summary = self.reorganizer.finish_reorganization(
+            self.submitted, self.completed, self.counts, self.errors
+        )
+        summary['rejected'] = self.rejected
+        summary['first_operation_seconds'] = (
+            round(self.first_operation_at, 3) if self.first_operation_at is not None else None
+        )
+        summary['seconds'] = round(time.perf_counter() - self.started_at, 3)
+        return summary
@@ -68,8 +68,8 @@ class ReminderService:
         
         while self.running:
             try:
-                # Check for active reminders
-                active_reminders = self.db.get_active_reminders()
+                # Check for active reminders (off the event loop)
+                active_reminders = await asyncio.to_thread(self.db.get_active_reminders)
                 
                 for reminder in active_reminders:
                     # Show notification
@@ -84,7 +84,7 @@ class ReminderService:
                     print(f"🔔 Reminder triggered: {message}")
                     
                     # Mark as completed
-                    self.db.mark_reminder_completed(reminder['id'])
+                    await asyncio.to_thread(self.db.mark_reminder_completed, reminder['id'])
                 
                 # Check every 30 seconds
                 await asyncio.sleep(30)
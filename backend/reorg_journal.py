@@ -0,0 +1,372 @@
+"""
+Write-ahead journal of reorganization runs
+Each run appends JSON lines to its own file: the plan when it begins, an
+intent record before every file operation (fsynced before the operation
+starts) and a completion record after it. Concurrent workers' intents are
+group-committed by one writer thread with a single fsync per batch. A run
+without an end record was interrupted; it can be resumed, rolled back, or,
+like any finished run, undone by replaying its operations in reverse.
+"""
+import os
+import json
+import stat
+import shutil
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from config import settings
+
+
+# Run states recorded in end records
+COMPLETE = 'complete'
+RESUMED = 'resumed'
+ROLLED_BACK = 'rolled_back'
+UNDONE = 'undone'
+
+
+class JournalError(OSError):
+    """The journal could not be written; the operation it was recording must not run"""
+
+
+def path_identity(path) -> Optional[List[int]]:
+    """Device, inode, size and mtime of a path (not following symlinks), or None if it is gone"""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return None
+    return [info.st_dev, info.st_ino, info.st_size, info.st_mtime_ns]
+
+
+def plan_key(operation: Dict) -> Tuple:
+    """Identity of a plan operation, as recorded with its intents"""
+    return (operation.get('action'), operation.get('source'), operation.get('destination'))
+
+
+class JournalRun:
+    """One run's journal file; intent() returns once the record is on disk"""
+
+    def __init__(self, path: Path, run_id: str):
+        self.path = path
+        self.id = run_id
+        self._file = open(path, 'a', encoding='utf-8')
+        self._cond = threading.Condition()
+        self._pending: List[str] = []
+        self._appended = 0
+        self._synced = 0
+        self._seq = 0
+        self._closing = False
+        self._error: Optional[OSError] = None
+        self.fsyncs = 0
+        self._thread = threading.Thread(target=self._run, name=f"journal-{run_id}", daemon=True)
+        self._thread.start()
+
+    def begin(self, kind: str, migration_plan: List[Dict], parent: Optional[str] = None):
+        self._append({'t': 'begin', 'run': self.id, 'kind': kind, 'parent': parent,
+                      'ts': datetime.now().isoformat(), 'plan': migration_plan}, durable=True)
+
+    def planned(self, operation: Dict):
+        """Add an operation to the run's plan (for plans that stream in while executing)"""
+        self._append({'t': 'plan', 'op': operation})
+
+    def intent(self, operation: Dict, action: str, source: Optional[str], target: Optional[str],
+               **extra) -> int:
+        """
+        Record an operation about to run and return its sequence number
+
+        Blocks until the record is fsynced; raises JournalError if it could
+        not be, in which case the operation must not run.
+        """
+        with self._cond:
+            self._seq += 1
+            seq = self._seq
+        self._append({'t': 'intent', 'seq': seq, 'action': action, 'source': source,
+                      'target': target, 'planned': list(plan_key(operation)), **extra}, durable=True)
+        return seq
+
+    def done(self, seq: int, copied: bool = False):
+        """Record an operation as done; copied: its source waits for the batch flush"""
+        record = {'t': 'done', 'seq': seq}
+        if copied:
+            record['copied'] = True
+        self._append(record)
+
+    def failed(self, seq: int, error: str):
+        self._append({'t': 'failed', 'seq': seq, 'error': error})
+
+    def removing(self, targets: List[str]):
+        """
+        Record that the sources of these (durable) copies are about to be removed
+
+        Blocks until the records are fsynced (one fsync for the lot); from
+        then on recovery keeps the copies whatever is left at the sources.
+        """
+        for number, target in enumerate(targets, 1):
+            self._append({'t': 'removing', 'target': target}, durable=number == len(targets))
+
+    def close(self, status: str = COMPLETE, **extra):
+        """Write the end record, wait for it to be durable and stop the writer"""
+        try:
+            self._append({'t': 'end', 'status': status, 'ts': datetime.now().isoformat(), **extra},
+                         durable=True)
+        finally:
+            with self._cond:
+                self._closing = True
+                self._cond.notify_all()
+            self._thread.join()
+            self._file.close()
+
+    def _append(self, record: Dict, durable: bool = False):
+        line = json.dumps(record, default=str) + "\n"
+        with self._cond:
+            if self._error is not None:
+                # Completion records after a failure are dropped (recovery checks
+                # the disk for those); new intents must not go ahead
+                if durable:
+                    raise JournalError(f"Reorganization journal unavailable: {self._error}")
+                return
+            self._pending.append(line)
+            self._appended += 1
+            number = self._appended
+            self._cond.notify_all()
+            while durable and self._synced < number and self._error is None:
+                self._cond.wait()
+            if durable and self._synced < number:
+                raise JournalError(f"Could not write reorganization journal: {self._error}")
+
+    def _run(self):
+        """Write whatever has been appended since the last batch, then fsync once"""
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+                last = self._appended
+            try:
+                self._file.write(''.join(batch))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self.fsyncs += 1
+            except OSError as e:
+                # Nothing from this batch on is known to be durable: fail its
+                # waiters and every later intent
+                print(f"❌ Error writing reorganization journal: {e}")
+                with self._cond:
+                    self._error = e
+                    self._pending = []
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._synced = last
+                self._cond.notify_all()
+
+
+class ReorgJournal:
+    """Reorganization run journals in one folder: listing, recovery and undo plans"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = Path(directory or settings.reorg_journal_dir)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.active = set()
+
+    def start_run(self, migration_plan: List[Dict], kind: str = 'reorganize',
+                  parent: Optional[str] = None) -> JournalRun:
+        run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        run = JournalRun(self.directory / f"{run_id}.jsonl", run_id)
+        run.begin(kind, migration_plan, parent)
+        self.active.add(run_id)
+        return run
+
+    def finish_run(self, run: JournalRun, status: str = COMPLETE, **extra):
+        run.close(status, **extra)
+        self.active.discard(run.id)
+
+    # ------------------------------------------------------------------
+    # Reading runs
+    # ------------------------------------------------------------------
+
+    def load_run(self, run_id: str) -> Optional[Dict]:
+        """
+        A run's records folded together
+
+        Returns:
+            Dict with id, kind, parent, started, plan, status (None while
+            incomplete), ends, and operations in sequence order, each an
+            intent record with its state: 'done', 'failed' or 'pending',
+            and for cross-device copies, copied and (once their sources were
+            about to be removed) removing
+        """
+        path = self.directory / f"{Path(run_id).name}.jsonl"
+        if not path.exists():
+            return None
+        run = {'id': run_id, 'kind': None, 'parent': None, 'started': None, 'plan': [],
+               'status': None, 'ends': [], 'operations': {}}
+        by_target = {}
+        with open(path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A record cut short by a crash; nothing after it was acknowledged
+                    break
+                kind = record.get('t')
+                if kind == 'begin':
+                    run.update(kind=record['kind'], parent=record.get('parent'),
+                               started=record['ts'], plan=record.get('plan') or [])
+                elif kind == 'plan':
+                    run['plan'].append(record['op'])
+                elif kind == 'intent':
+                    run['operations'][record['seq']] = {**record, 'state': 'pending'}
+                    by_target[record['target']] = run['operations'][record['seq']]
+                elif kind in ('done', 'failed') and record['seq'] in run['operations']:
+                    operation = run['operations'][record['seq']]
+                    operation['state'] = kind
+                    if kind == 'failed':
+                        operation['error'] = record.get('error')
+                    elif record.get('copied'):
+                        operation['copied'] = True
+                elif kind == 'removing' and record['target'] in by_target:
+                    # May precede the copy's done record (a flush during the move)
+                    by_target[record['target']]['removing'] = True
+                elif kind == 'end':
+                    run['ends'].append(record)
+                    run['status'] = record['status']
+        run['operations'] = [run['operations'][seq] for seq in sorted(run['operations'])]
+        return run
+
+    def summarize(self, run: Dict) -> Dict:
+        states = {'done': 0, 'failed': 0, 'pending': 0}
+        for operation in run['operations']:
+            states[operation['state']] += 1
+        if run['status']:
+            status = run['status']
+        else:
+            status = 'running' if run['id'] in self.active else 'incomplete'
+        return {'run_id': run['id'], 'kind': run['kind'], 'parent': run['parent'],
+                'started': run['started'], 'status': status, 'planned': len(run['plan']),
+                **states}
+
+    def list_runs(self, limit: int = 50) -> List[Dict]:
+        """Most recent runs first"""
+        paths = sorted(self.directory.glob("*.jsonl"), reverse=True)[:limit]
+        runs = (self.load_run(path.stem) for path in paths)
+        return [self.summarize(run) for run in runs if run]
+
+    def incomplete_runs(self) -> List[Dict]:
+        return [run for run in self.list_runs(limit=1000) if run['status'] == 'incomplete']
+
+    def mark(self, run_id: str, status: str, **extra):
+        """Append an end record to a finished or interrupted run"""
+        path = self.directory / f"{Path(run_id).name}.jsonl"
+        with open(path, 'a', encoding='utf-8') as journal:
+            journal.write(json.dumps({'t': 'end', 'status': status,
+                                      'ts': datetime.now().isoformat(), **extra}) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    # ------------------------------------------------------------------
+    # Recovery
+    # ------------------------------------------------------------------
+
+    def _applied(self, operation: Dict, interrupted: bool) -> bool:
+        """
+        Whether an operation took effect
+
+        A rename that completed, or a copy whose source removal was
+        journaled, is trusted (its target may since have been moved on by a
+        later operation, and its source may be partly deleted). A copy still
+        waiting for its flush when the run was interrupted left its source
+        in place: the copy is removed and the operation counts as not applied.
+        """
+        if operation['action'] == 'create':
+            return operation['state'] == 'done' or Path(operation['target']).is_dir()
+        if operation.get('removing'):
+            return True
+        if operation['state'] == 'done' and not operation.get('copied'):
+            return True
+        if interrupted and self._is_unflushed_copy(operation):
+            target = Path(operation['target'])
+            print(f"🧹 Removing interrupted copy: {target}")
+            if target.is_dir() and not target.is_symlink():
+                shutil.rmtree(target)
+            else:
+                target.unlink()
+            return False
+        if operation['state'] == 'done':
+            return True
+        # Interrupted midway: applied once the original is no longer at the source
+        return (os.path.lexists(operation['target'])
+                and not self._is_original(operation['source'], operation.get('identity')))
+
+    def _is_original(self, path: str, identity: Optional[List[int]]) -> bool:
+        """Whether path is still the file or folder recorded by the intent"""
+        current = path_identity(path)
+        if current is None or identity is None or current[:2] != identity[:2]:
+            return False
+        # Inode numbers can be reused once freed; files must also match size and mtime
+        return os.path.isdir(path) or current[2:] == identity[2:]
+
+    def _is_unflushed_copy(self, operation: Dict) -> bool:
+        """
+        Whether the target is a copy of a source that is still in place
+
+        The source must still be the very file recorded in the intent, and a
+        copied file must match its size and mtime (copies keep the mtime). A
+        copied folder's source must also keep its mtime, which removing its
+        entries changes.
+        """
+        identity = operation.get('identity')
+        if not self._is_original(operation['source'], identity):
+            return False
+        try:
+            target = os.lstat(operation['target'])
+        except OSError:
+            return False
+        if stat.S_ISDIR(target.st_mode):
+            return (os.path.isdir(operation['source'])
+                    and os.lstat(operation['source']).st_mtime_ns == identity[3])
+        return [target.st_size, target.st_mtime_ns] == identity[2:]
+
+    def remaining_plan(self, run_id: str) -> Tuple[List[Dict], int]:
+        """
+        Plan operations of a run that did not take effect
+
+        Returns:
+            Tuple of (operations to run again, operations already applied)
+        """
+        run = self.load_run(run_id)
+        interrupted = run['status'] is None
+        applied = set()
+        for operation in run['operations']:
+            if operation['state'] != 'failed' and self._applied(operation, interrupted):
+                applied.add(tuple(operation['planned']))
+        remaining = [operation for operation in run['plan'] if plan_key(operation) not in applied]
+        return remaining, len(applied)
+
+    def inverse_plan(self, run_id: str) -> Tuple[List[Dict], List[str]]:
+        """
+        Operations that revert a run, newest first
+
+        Returns:
+            Tuple of (moves back to where things were, folders the run created,
+            deepest first, to remove once they are empty)
+        """
+        run = self.load_run(run_id)
+        interrupted = run['status'] is None
+        inverse = []
+        created = []
+        for operation in reversed(run['operations']):
+            if operation['state'] == 'failed' or not self._applied(operation, interrupted):
+                continue
+            # Folders made along the way, including a move's missing parents
+            created.extend(operation.get('made', ()))
+            if operation['action'] == 'create':
+                continue
+            inverse.append({'action': 'move', 'source': operation['target'],
+                            'destination': operation['source'],
+                            'reason': f"undo {operation['action']} ({run_id})"})
+        created.sort(key=lambda path: -path.count(os.sep))
+        return inverse, created
@@ -2,100 +2,276 @@
 File reorganization orchestrator
 Handles the actual moving of files during optimization
 """
-import shutil
 from pathlib import Path
-from typing import Dict, List, Tuple, Callable
+from typing import Dict, List, Tuple, Callable, Optional
 from datetime import datetime
+from config import settings
 from database import Database
 from notification_manager import NotificationManager
+from duplicate_detector import DuplicateIndex
+from file_transfer import transfer_engine
+from operation_log_writer import OperationLogWriter
+from file_catalog import FileCatalog
+from plan_executor import ParallelPlanExecutor
+from reorg_journal import (ReorgJournal, JournalRun, JournalError, path_identity,
+                           COMPLETE, RESUMED, ROLLED_BACK, UNDONE)
+import os
+import threading
 import time
 
 
+# Plan fields each action needs
+OPERATION_PATHS = {
+    'move': ('source', 'destination'),
+    'create': ('destination',),
+    'archive': ('source',),
+}
+
+# Free names tried when concurrent moves keep taking the chosen one
+UNIQUE_PATH_ATTEMPTS = 5
+
+# Archived folders are moved here
+ARCHIVE_ROOT = Path.home() / "Documents" / "fima" / "_archived"
+
+
 class FileReorganizer:
     """Orchestrates file reorganization operations"""
     
-    def __init__(self, db: Database, notifier: NotificationManager):
+    def __init__(self, db: Database, notifier: NotificationManager,
+                 duplicates: Optional[DuplicateIndex] = None,
+                 catalog: Optional[FileCatalog] = None,
+                 journal: Optional[ReorgJournal] = None):
         self.db = db
         self.notifier = notifier
         self.operations_log = []
+        self.duplicates = duplicates
+        self.catalog = catalog
+        self.op_log = OperationLogWriter(db)
+        self.journal = journal
+        self.run: Optional[JournalRun] = None
+        
+        # Bytes moved by this reorganizer's operations (workers run in parallel)
+        self.bytes_moved = 0
+        self._bytes_lock = threading.Lock()
+        
+        if self.duplicates is None and settings.enable_duplicate_detection:
+            self.duplicates = DuplicateIndex(db)
+        
+        if self.catalog is None and settings.enable_file_catalog:
+            self.catalog = FileCatalog(db)
+        
+        if self.journal is None and settings.enable_reorg_journal:
+            self.journal = ReorgJournal()
+    
+    def begin_run(self, migration_plan: List[Dict], kind: str = 'reorganize',
+                  parent: Optional[str] = None):
+        """Start journaling a run (execute_reorganization does this itself)"""
+        if self.journal:
+            self.run = self.journal.start_run(migration_plan, kind, parent)
+    
+    def extend_run(self, operation: Dict):
+        """Add an operation to the journaled plan of a run whose plan streams in"""
+        if self.run:
+            self.run.planned(operation)
     
     def execute_reorganization(self, 
                               migration_plan: List[Dict],
-                              progress_callback: Callable[[int, int], None] = None) -> Dict:
+                              progress_callback: Callable[[int, int], None] = None,
+                              kind: str = 'reorganize',
+                              parent: Optional[str] = None) -> Dict:
         """
         Execute a reorganization plan
         
+        Operations run in parallel in dependency order (see plan_executor):
+        creates before moves into them, archives after moves into or out of
+        them, and at most reorganize_device_concurrency per device.
+        
         Args:
             migration_plan: List of operations to perform
             progress_callback: Function to call with progress updates
+            kind: Journal run kind ('reorganize', 'undo' or 'resume')
+            parent: Journal run an undo or resume applies to
             
         Returns:
-            Summary of operations performed
+            Summary of operations performed, with throughput and the journal run_id
         """
         total_operations = len(migration_plan)
         completed = 0
-        files_moved = 0
-        folders_created = 0
-        folders_archived = 0
+        counts = {'files_moved': 0, 'folders_created': 0, 'folders_archived': 0}
         errors = []
+        milestones = [50, 90, 100]
         
-        print(f"\n🚀 Starting reorganization: {total_operations} operations")
+        if self.run is None:
+            self.begin_run(migration_plan, kind, parent)
         
-        for i, operation in enumerate(migration_plan):
-            try:
-                action = operation.get('action', 'unknown')
-                
-                if action == 'move':
-                    success = self._move_file(operation)
-                    if success:
-                        files_moved += 1
-                
-                elif action == 'create':
-                    success = self._create_folder(operation)
-                    if success:
-                        folders_created += 1
-                
-                elif action == 'archive':
-                    success = self._archive_folder(operation)
-                    if success:
-                        folders_archived += 1
-                
-                completed += 1
-                
-                # Progress notifications at 50%, 90%, 100%
-                percentage = int((completed / total_operations) * 100)
-                if percentage in [50, 90, 100]:
-                    self._show_progress_notification(completed, total_operations, percentage)
-                
-                # Call progress callback
-                if progress_callback:
-                    progress_callback(completed, total_operations)
-                
-            except Exception as e:
-                error_msg = f"Error in operation {i+1}: {str(e)}"
+        executor = ParallelPlanExecutor(self.execute_operation, archive_root=ARCHIVE_ROOT)
+        print(f"\n🚀 Starting reorganization: {total_operations} operations, "
+              f"{executor.workers} workers ({executor.device_concurrency} per device)")
+        
+        def on_complete(index: int, counter: Optional[str], error: Optional[Exception]):
+            nonlocal completed
+            if error is not None:
+                error_msg = f"Error in operation {index+1}: {str(error)}"
                 errors.append(error_msg)
                 print(f"❌ {error_msg}")
+                return
+            
+            if counter:
+                counts[counter] += 1
+            completed += 1
+            
+            # Progress notifications at 50%, 90%, 100%, once each
+            percentage = int((completed / total_operations) * 100)
+            if percentage in milestones:
+                milestones.remove(percentage)
+                self._show_progress_notification(completed, total_operations, percentage)
+            
+            # Call progress callback
+            if progress_callback:
+                progress_callback(completed, total_operations)
+        
+        seconds = executor.execute(migration_plan, on_complete)
+        
+        summary = self.finish_reorganization(total_operations, completed, counts, errors)
+        summary.update({
+            'seconds': round(seconds, 3),
+            'bytes_moved': self.bytes_moved,
+            'operations_per_sec': round(completed / seconds, 1) if seconds else 0.0,
+            'bytes_per_sec': round(self.bytes_moved / seconds) if seconds else 0,
+        })
+        print(f"   Throughput: {summary['operations_per_sec']} ops/sec, "
+              f"{summary['bytes_per_sec'] / (1024 * 1024):.1f} MB/sec")
+        
+        return summary
+    
+    def execute_operation(self, operation: Dict) -> Optional[str]:
+        """
+        Perform one plan operation
+        
+        Returns:
+            The summary counter it increments ('files_moved', 'folders_created'
+            or 'folders_archived'), or None if it did nothing
+        """
+        action = operation.get('action', 'unknown')
+        
+        if action == 'move':
+            return 'files_moved' if self._move_file(operation) else None
+        
+        elif action == 'create':
+            return 'folders_created' if self._create_folder(operation) else None
+        
+        elif action == 'archive':
+            return 'folders_archived' if self._archive_folder(operation) else None
+        
+        return None
+    
+    def finish_reorganization(self, total_operations: int, completed: int,
+                              counts: Dict[str, int], errors: List[str]) -> Dict:
+        """Flush batched transfers and queued log records, notify, and build the summary"""
+        # Make batched cross-device copies durable and remove their sources
+        try:
+            errors.extend(transfer_engine.flush(self))
+        except Exception as e:
+            errors.append(f"Error flushing transfers: {str(e)}")
+            print(f"❌ Error flushing transfers: {e}")
+        
+        # Commit any operation records still queued
+        self.op_log.close()
+        
+        # Everything above is on disk: the run is complete
+        run_id = None
+        if self.run:
+            run_id = self.run.id
+            try:
+                self.journal.finish_run(self.run, COMPLETE, completed=completed, errors=len(errors))
+            except JournalError as e:
+                # Left without an end record, the run shows up as incomplete
+                errors.append(str(e))
+            self.run = None
         
         # Final notification
-        self.notifier.show_optimization_complete(files_moved, folders_created)
+        self.notifier.show_optimization_complete(counts['files_moved'], counts['folders_created'])
         
         summary = {
             'total_operations': total_operations,
             'completed': completed,
-            'files_moved': files_moved,
-            'folders_created': folders_created,
-            'folders_archived': folders_archived,
+            'files_moved': counts['files_moved'],
+            'folders_created': counts['folders_created'],
+            'folders_archived': counts['folders_archived'],
             'errors': errors,
-            'operations_log': self.operations_log
+            'operations_log': self.operations_log,
+            'run_id': run_id
         }
         
         print(f"\n✅ Reorganization complete!")
-        print(f"   Files moved: {files_moved}")
-        print(f"   Folders created: {folders_created}")
-        print(f"   Folders archived: {folders_archived}")
+        print(f"   Files moved: {counts['files_moved']}")
+        print(f"   Folders created: {counts['folders_created']}")
+        print(f"   Folders archived: {counts['folders_archived']}")
         
         return summary
     
+    def check_operation(self, operation: Dict, allowed_root: Path) -> Optional[str]:
+        """
+        Safety gate for operations executed without review (pipelined plans)
+        
+        Every path must be absolute and inside allowed_root, must not be the
+        root itself or pass through a hidden folder, and sources must exist.
+        An archive named in advance (archive_to) must go directly into
+        ARCHIVE_ROOT.
+        
+        Returns:
+            Why the operation is rejected, or None if it may run
+        """
+        action = operation.get('action')
+        required = OPERATION_PATHS.get(action)
+        if required is None:
+            return f"unknown action: {action!r}"
+        
+        root = Path(allowed_root).expanduser().resolve()
+        paths = {}
+        for key in required:
+            value = operation.get(key)
+            if not value or not isinstance(value, str):
+                return f"missing {key}"
+            path = Path(value).expanduser()
+            if not path.is_absolute():
+                return f"{key} is not an absolute path: {value}"
+            path = path.resolve()
+            if path == root:
+                return f"{key} is the analyzed folder itself"
+            try:
+                relative = path.relative_to(root)
+            except ValueError:
+                return f"{key} is outside {root}: {value}"
+            if any(part.startswith('.') for part in relative.parts):
+                return f"{key} is inside a hidden folder: {value}"
+            paths[key] = path
+        
+        source = paths.get('source')
+        if source is not None and not source.exists():
+            return f"source not found: {source}"
+        if action == 'archive' and not source.is_dir():
+            return f"archive source is not a folder: {source}"
+        if action == 'archive' and operation.get('archive_to') is not None:
+            return self._check_archive_to(operation['archive_to'])
+        if action == 'move':
+            destination = paths['destination']
+            if destination == source or source in destination.parents:
+                return f"destination is inside the source: {destination}"
+        
+        return None
+    
+    def _check_archive_to(self, value) -> Optional[str]:
+        """Why an archive_to path is rejected, or None if it names a folder in ARCHIVE_ROOT"""
+        if not value or not isinstance(value, str):
+            return "archive_to is not a path"
+        path = Path(value)
+        if not path.is_absolute():
+            return f"archive_to is not an absolute path: {value}"
+        if path.name.startswith('.') or path.resolve().parent != ARCHIVE_ROOT.resolve():
+            return f"archive_to is not a folder in {ARCHIVE_ROOT}: {value}"
+        return None
+    
     def _move_file(self, operation: Dict) -> bool:
         """Move a file from source to destination"""
         try:
@@ -106,18 +282,19 @@ class FileReorganizer:
                 print(f"⚠️  Source file not found: {source}")
                 return False
             
-            # Create destination directory
-            destination.parent.mkdir(parents=True, exist_ok=True)
+            # Move file, renamed if the name is taken (sources of cross-device
+            # copies are removed at the final flush)
+            destination = self._move_unique(operation, 'move', source, destination)
             
-            # Handle duplicates
-            if destination.exists():
-                destination = self._get_unique_path(destination)
+            # Keep the duplicate index pointing at the file's new location
+            if self.duplicates:
+                self.duplicates.moved(source, destination)
             
-            # Move file
-            shutil.move(str(source), str(destination))
+            if self.catalog:
+                self.catalog.record_move(source, destination, moved_by='reorganizer')
             
-            # Log operation
-            self.db.log_file_operation(
+            # Log operation (group-committed by the write-behind logger)
+            self.op_log.log_operation(
                 filename=source.name,
                 original_path=str(source),
                 new_path=str(destination),
@@ -139,15 +316,22 @@ class FileReorganizer:
             
             return True
         
+        except JournalError:
+            # Not journaled, so not run: report it as this operation's error
+            raise
         except Exception as e:
             print(f"❌ Error moving file: {e}")
             return False
     
     def _create_folder(self, operation: Dict) -> bool:
         """Create a new folder"""
+        seq = None
         try:
             folder_path = Path(operation['destination']).expanduser()
+            seq = self._journal_intent(operation, 'create', None, folder_path,
+                                       self._missing_folders(folder_path))
             folder_path.mkdir(parents=True, exist_ok=True)
+            self._journal_result(seq)
             
             self.operations_log.append({
                 'action': 'create',
@@ -159,7 +343,11 @@ class FileReorganizer:
             
             return True
         
+        except JournalError:
+            # Not journaled, so not run: report it as this operation's error
+            raise
         except Exception as e:
+            self._journal_result(seq, e)
             print(f"❌ Error creating folder: {e}")
             return False
     
@@ -173,15 +361,25 @@ class FileReorganizer:
                 return False
             
             # Create archive directory
-            archive_base = Path.home() / "Documents" / "fima" / "_archived"
-            archive_base.mkdir(parents=True, exist_ok=True)
+            ARCHIVE_ROOT.mkdir(parents=True, exist_ok=True)
             
-            # Create timestamped archive folder
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            archive_dest = archive_base / f"{source.name}_{timestamp}"
+            # Create timestamped archive folder (named in advance by a planned plan)
+            if operation.get('archive_to'):
+                error = self._check_archive_to(operation['archive_to'])
+                if error:
+                    raise ValueError(error)
+                archive_dest = Path(operation['archive_to'])
+            else:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                archive_dest = ARCHIVE_ROOT / f"{source.name}_{timestamp}"
+            
+            # Remove sources of pending copies first, or they'd be archived along with the folder
+            errors = transfer_engine.flush(self)
+            if errors:
+                raise OSError(errors[0])
             
             # Move to archive
-            shutil.move(str(source), str(archive_dest))
+            archive_dest = self._move_unique(operation, 'archive', source, archive_dest)
             
             self.operations_log.append({
                 'action': 'archive',
@@ -194,10 +392,164 @@ class FileReorganizer:
             
             return True
         
+        except JournalError:
+            # Not journaled, so not run: report it as this operation's error
+            raise
         except Exception as e:
             print(f"❌ Error archiving folder: {e}")
             return False
     
+    def _move_unique(self, operation: Dict, action: str, source: Path, destination: Path) -> Path:
+        """
+        Journal and move source to destination, or to a free variant of its name
+        
+        The transfer engine never replaces an existing file, so when another
+        move takes the chosen name first, this one fails (journaled as such)
+        and is retried under the next free name.
+        
+        Returns:
+            Where source was moved to
+        """
+        made = []
+        for attempt in range(UNIQUE_PATH_ATTEMPTS):
+            if destination.exists():
+                destination = self._get_unique_path(destination)
+            
+            # Journal the move, and the folders it makes (possibly on a failed
+            # attempt), before touching anything
+            made = made or self._missing_folders(destination.parent)
+            seq = self._journal_intent(operation, action, source, destination, made)
+            try:
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                transfer = transfer_engine.move(source, destination, batch=self,
+                                                before_remove=self._journal_removing)
+            except FileExistsError as e:
+                self._journal_result(seq, e)
+                if attempt == UNIQUE_PATH_ATTEMPTS - 1 or not destination.parent.is_dir():
+                    raise
+                print(f"⚠️  {destination.name} was taken meanwhile, trying another name")
+                continue
+            except Exception as e:
+                self._journal_result(seq, e)
+                raise
+            
+            self._count_bytes(transfer)
+            self._journal_result(seq, transfer=transfer)
+            return destination
+    
+    def _journal_intent(self, operation: Dict, action: str, source: Optional[Path],
+                        target: Path, made: Optional[List[str]] = None) -> Optional[int]:
+        """
+        Durably record an operation about to run; returns its journal sequence number
+        
+        The source's identity (device, inode, size, mtime) lets recovery tell
+        an interrupted copy from a different file later moved to the same path.
+        Raises JournalError if the record could not be written.
+        """
+        if not self.run:
+            return None
+        extra = {'made': made or []}
+        if source is not None:
+            extra['identity'] = path_identity(source)
+        return self.run.intent(operation, action, str(source) if source else None,
+                               str(target), **extra)
+    
+    def _journal_result(self, seq: Optional[int], error: Optional[Exception] = None,
+                        transfer: Optional[Dict] = None):
+        if seq is None:
+            return
+        if error is None:
+            # A copy's source is only removed when the batch is flushed
+            self.run.done(seq, copied=bool(transfer) and transfer.get('method') != 'rename')
+        else:
+            self.run.failed(seq, str(error))
+    
+    def _journal_removing(self, pending: List[Tuple[Path, Path]]):
+        """Durably record copies whose sources the transfer engine is about to remove"""
+        if self.run:
+            self.run.removing([str(destination) for destination, _ in pending])
+    
+    def _missing_folders(self, folder: Path) -> List[str]:
+        """Folders mkdir(parents=True) would create for folder, deepest first"""
+        missing = []
+        while not folder.exists() and folder != folder.parent:
+            missing.append(str(folder))
+            folder = folder.parent
+        return missing
+    
+    def undo_run(self, run_id: str, progress_callback: Callable[[int, int], None] = None,
+                 status: str = UNDONE) -> Dict:
+        """
+        Revert a journaled run
+        
+        Its applied operations are replayed in reverse as moves back to where
+        things were, on the same parallel executor (and journaled as an 'undo'
+        run, so an undo can itself be undone). Folders the run made are then
+        removed if empty.
+        
+        Returns:
+            Summary of the undo run, with folders_removed
+        """
+        run = self._recoverable_run(run_id)
+        if run['status'] in (UNDONE, ROLLED_BACK):
+            raise ValueError(f"Run {run_id} was already {run['status'].replace('_', ' ')}")
+        
+        inverse, made = self.journal.inverse_plan(run_id)
+        print(f"\n↩️  Undoing run {run_id}: {len(inverse)} operations")
+        summary = self.execute_reorganization(inverse, progress_callback, kind='undo', parent=run_id)
+        
+        removed = 0
+        for folder in dict.fromkeys(made):
+            try:
+                os.rmdir(folder)
+                removed += 1
+            except OSError:
+                pass
+        summary['folders_removed'] = removed
+        
+        self.journal.mark(run_id, status, by=summary['run_id'])
+        return summary
+    
+    def resume_run(self, run_id: str, progress_callback: Callable[[int, int], None] = None) -> Dict:
+        """
+        Finish an interrupted run: execute the plan operations that did not take effect
+        
+        Returns:
+            Summary of the resume run, with already_applied
+        """
+        run = self._recoverable_run(run_id)
+        if run['status'] is not None:
+            raise ValueError(f"Run {run_id} is not incomplete ({run['status']})")
+        
+        remaining, applied = self.journal.remaining_plan(run_id)
+        print(f"\n⏯️  Resuming run {run_id}: {applied} operations applied, {len(remaining)} remaining")
+        summary = self.execute_reorganization(remaining, progress_callback, kind='resume', parent=run_id)
+        summary['already_applied'] = applied
+        
+        self.journal.mark(run_id, RESUMED, by=summary['run_id'])
+        return summary
+    
+    def rollback_run(self, run_id: str, progress_callback: Callable[[int, int], None] = None) -> Dict:
+        """Revert an interrupted run (see undo_run)"""
+        run = self._recoverable_run(run_id)
+        if run['status'] is not None:
+            raise ValueError(f"Run {run_id} is not incomplete ({run['status']})")
+        return self.undo_run(run_id, progress_callback, status=ROLLED_BACK)
+    
+    def _recoverable_run(self, run_id: str) -> Dict:
+        if not self.journal:
+            raise ValueError("Reorganization journal is disabled")
+        run = self.journal.load_run(run_id)
+        if run is None:
+            raise LookupError(f"Run not found: {run_id}")
+        if run_id in self.journal.active:
+            raise ValueError(f"Run {run_id} is still running")
+        return run
+    
+    def _count_bytes(self, transfer: Dict):
+        with self._bytes_lock:
+            self.bytes_moved += transfer.get('bytes', 0)
+    
     def _get_unique_path(self, path: Path) -> Path:
         """Generate a unique path if file already exists"""
         counter = 1
@@ -256,7 +608,7 @@ class FileReorganizer:
                 source = Path(folder_path).expanduser()
                 if source.exists() and source.is_dir():
                     dest = archive_folder / source.name
-                    shutil.move(str(source), str(dest))
+                    transfer_engine.move(source, dest)
                     print(f"   ✓ Archived: {source.name}")
             except Exception as e:
                 print(f"   ❌ Error archiving {folder_path}: {e}")
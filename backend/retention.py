@@ -0,0 +1,329 @@
+"""
+Retention for the history tables
+Moves old file_operations, email_reports and folder_analysis rows into
+zlib-compressed monthly partitions in an attached archive database, prunes
+hourly statistics that are already summed into daily buckets, and gives the
+freed pages back to the filesystem with incremental VACUUM while idle.
+"""
+import asyncio
+import json
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from config import settings
+from database import Database
+
+
+# Rows moved per transaction, so the monitor's writes never wait long
+ARCHIVE_CHUNK_ROWS = 2000
+
+# How often the idle loop wakes up to look for vacuum work
+IDLE_CHECK_SECONDS = 60
+
+# The first scheduled run waits this long after startup
+FIRST_RUN_DELAY_SECONDS = 15 * 60
+
+# Archived tables: table -> timestamp column
+ARCHIVED_TABLES = {
+    'file_operations': 'timestamp',
+    'email_reports': 'sent_at',
+    'folder_analysis': 'analysis_date',
+}
+
+ARCHIVE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS archive.archive_partitions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source_table TEXT NOT NULL,
+        partition TEXT NOT NULL,
+        first_id INTEGER NOT NULL,
+        last_id INTEGER NOT NULL,
+        row_count INTEGER NOT NULL,
+        raw_bytes INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS archive.idx_archive_partitions_table
+    ON archive_partitions(source_table, partition)
+    """,
+]
+
+
+class RetentionManager:
+    """
+    Applies the retention policies from settings
+
+    Statistics are unaffected: operation_stats is maintained by an insert
+    trigger with no delete counterpart, so archived operations keep their counts.
+    """
+
+    def __init__(self, db: Database, archive_path: Optional[str] = None):
+        self.db = db
+        self.archive_path = Path(archive_path or settings.retention_archive_path)
+        self.archive_path.parent.mkdir(parents=True, exist_ok=True)
+        self.running = False
+        self.last_report: Optional[Dict] = None
+        self._last_seen_operation: Optional[int] = None
+
+        saved = db.get_preference('retention_last_report')
+        if saved:
+            self.last_report = json.loads(saved)
+
+    def _attach_archive(self, conn: sqlite3.Connection):
+        """Attach the archive database to this thread's connection once"""
+        attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+        if 'archive' not in attached:
+            conn.execute("ATTACH DATABASE ? AS archive", (str(self.archive_path),))
+            for statement in ARCHIVE_SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+
+    def _space(self, conn: sqlite3.Connection) -> Dict:
+        """Allocated and free bytes of the main database"""
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return {
+            'size_bytes': page_size * page_count,
+            'free_bytes': page_size * freelist,
+            'page_size': page_size,
+            'freelist_pages': freelist,
+        }
+
+    def run(self, convert_auto_vacuum: bool = False) -> Dict:
+        """
+        Apply every policy once and vacuum the freed space
+
+        Args:
+            convert_auto_vacuum: Also switch an older database to incremental
+                auto-vacuum; this runs a full VACUUM that blocks writers
+
+        Returns:
+            Report with rows archived per table and bytes reclaimed
+        """
+        start = time.perf_counter()
+        with self.db.get_connection() as conn:
+            before = self._space(conn)
+
+        archived = {
+            'file_operations': self._archive_older_than(
+                'file_operations', settings.retention_operations_days
+            ),
+            'email_reports': self._archive_older_than(
+                'email_reports', settings.retention_reports_days
+            ),
+            'folder_analysis': self._archive_all_but_latest(
+                'folder_analysis', settings.retention_analyses_keep
+            ),
+        }
+        hourly_pruned = self._prune_hourly_stats(settings.retention_hourly_stats_days)
+
+        converted = convert_auto_vacuum and self.ensure_incremental_vacuum()
+        if not converted:
+            self.incremental_vacuum()
+
+        with self.db.get_connection() as conn:
+            after = self._space(conn)
+
+        report = {
+            'finished_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+            'rows_archived': archived,
+            'hourly_stats_pruned': hourly_pruned,
+            'auto_vacuum_converted': converted,
+            'size_before_bytes': before['size_bytes'],
+            'size_after_bytes': after['size_bytes'],
+            'bytes_reclaimed': before['size_bytes'] - after['size_bytes'],
+            'total_bytes_reclaimed': (self.last_report or {}).get('total_bytes_reclaimed', 0)
+                                     + max(0, before['size_bytes'] - after['size_bytes']),
+        }
+        self.last_report = report
+        self.db.save_preference('retention_last_report', json.dumps(report))
+
+        total = sum(archived.values())
+        print(f"🗜️  Retention: archived {total} rows, "
+              f"reclaimed {report['bytes_reclaimed'] / 1024 / 1024:.1f} MB")
+        return report
+
+    def _archive_older_than(self, table: str, days: int) -> int:
+        """Archive rows whose timestamp is more than `days` days old (0 disables)"""
+        if days <= 0:
+            return 0
+        column = ARCHIVED_TABLES[table]
+        return self._archive_where(table, f"{column} < datetime('now', ?)", (f"-{days} days",))
+
+    def _archive_all_but_latest(self, table: str, keep: int) -> int:
+        """Archive all rows except the `keep` newest (0 disables)"""
+        if keep <= 0:
+            return 0
+        with self.db.get_connection() as conn:
+            row = conn.execute(
+                f"SELECT id FROM {table} ORDER BY id DESC LIMIT 1 OFFSET ?", (keep - 1,)
+            ).fetchone()
+        if row is None:
+            return 0
+        return self._archive_where(table, "id < ?", (row['id'],))
+
+    def _archive_where(self, table: str, condition: str, params: tuple) -> int:
+        """Move matching rows into compressed monthly partitions, chunk by chunk"""
+        column = ARCHIVED_TABLES[table]
+        moved = 0
+        while True:
+            with self.db.get_connection() as conn:
+                self._attach_archive(conn)
+                conn.execute("BEGIN IMMEDIATE")
+                rows = conn.execute(f"""
+                    SELECT * FROM {table} WHERE {condition}
+                    ORDER BY id LIMIT {ARCHIVE_CHUNK_ROWS}
+                """, params).fetchall()
+                if not rows:
+                    break
+
+                partitions: Dict[str, List[Dict]] = {}
+                for row in rows:
+                    month = (row[column] or '')[:7] or 'unknown'
+                    partitions.setdefault(month, []).append(dict(row))
+
+                # Archive first, then delete: if the two files ever disagree
+                # after a crash, rows are duplicated rather than lost
+                for month, records in partitions.items():
+                    raw = json.dumps(records).encode()
+                    conn.execute("""
+                        INSERT INTO archive.archive_partitions
+                        (source_table, partition, first_id, last_id, row_count, raw_bytes, data)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, (table, month, records[0]['id'], records[-1]['id'],
+                          len(records), len(raw), zlib.compress(raw, 6)))
+
+                conn.executemany(
+                    f"DELETE FROM {table} WHERE id = ?", [(row['id'],) for row in rows]
+                )
+                moved += len(rows)
+
+            if len(rows) < ARCHIVE_CHUNK_ROWS:
+                break
+        return moved
+
+    def _prune_hourly_stats(self, days: int) -> int:
+        """Drop hourly counters older than `days`; the daily buckets keep their totals"""
+        if days <= 0:
+            return 0
+        with self.db.get_connection() as conn:
+            cursor = conn.execute("""
+                DELETE FROM operation_stats
+                WHERE bucket = 'hour' AND bucket_key < strftime('%Y-%m-%d %H', 'now', ?)
+            """, (f"-{days} days",))
+            return cursor.rowcount
+
+    def ensure_incremental_vacuum(self) -> bool:
+        """
+        Switch an existing database to auto_vacuum=INCREMENTAL
+
+        New databases get the mode when created; older ones need one full
+        VACUUM to change it. Returns True if that VACUUM ran now.
+        """
+        with self.db.get_connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return False
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.commit()
+            conn.execute("VACUUM")
+        print("🗜️  Database converted to incremental auto-vacuum")
+        return True
+
+    def incremental_vacuum(self, max_pages: Optional[int] = None) -> int:
+        """Release up to max_pages free pages to the filesystem, returning bytes freed"""
+        max_pages = max_pages or settings.retention_vacuum_pages
+        with self.db.get_connection() as conn:
+            before = self._space(conn)
+            if before['freelist_pages'] == 0:
+                return 0
+            # The pragma frees one page per step and execute() only steps once;
+            # executescript() runs it to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+            after = self._space(conn)
+        return before['size_bytes'] - after['size_bytes']
+
+    def is_idle(self) -> bool:
+        """True when no file operation was logged since the previous check"""
+        with self.db.get_connection() as conn:
+            latest = conn.execute("SELECT MAX(id) FROM file_operations").fetchone()[0]
+        idle = latest == self._last_seen_operation
+        self._last_seen_operation = latest
+        return idle
+
+    def iter_archived(self, table: str, partition: Optional[str] = None) -> Iterator[Dict]:
+        """Yield archived rows of a table (optionally one YYYY-MM partition) in id order"""
+        with self.db.get_connection() as conn:
+            self._attach_archive(conn)
+            query = "SELECT id FROM archive.archive_partitions WHERE source_table = ?"
+            params: tuple = (table,)
+            if partition:
+                query += " AND partition = ?"
+                params += (partition,)
+            blob_ids = [row['id'] for row in conn.execute(query + " ORDER BY first_id", params)]
+
+        # One blob at a time keeps memory bounded by the chunk size
+        for blob_id in blob_ids:
+            with self.db.get_connection() as conn:
+                data = conn.execute(
+                    "SELECT data FROM archive.archive_partitions WHERE id = ?", (blob_id,)
+                ).fetchone()['data']
+            yield from json.loads(zlib.decompress(data))
+
+    def get_status(self) -> Dict:
+        """Report database and archive sizes, policies and the last run"""
+        with self.db.get_connection() as conn:
+            self._attach_archive(conn)
+            space = self._space(conn)
+            space['auto_vacuum'] = {0: 'none', 1: 'full', 2: 'incremental'}[
+                conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            ]
+            partitions = [dict(row) for row in conn.execute("""
+                SELECT source_table, partition, SUM(row_count) AS rows,
+                       SUM(raw_bytes) AS raw_bytes, SUM(length(data)) AS stored_bytes
+                FROM archive.archive_partitions
+                GROUP BY source_table, partition ORDER BY source_table, partition
+            """)]
+
+        return {
+            'database': space,
+            'archive': {
+                'path': str(self.archive_path),
+                'size_bytes': self.archive_path.stat().st_size if self.archive_path.exists() else 0,
+                'partitions': partitions,
+            },
+            'policies': {
+                'operations_days': settings.retention_operations_days,
+                'reports_days': settings.retention_reports_days,
+                'analyses_keep': settings.retention_analyses_keep,
+                'hourly_stats_days': settings.retention_hourly_stats_days,
+            },
+            'last_run': self.last_report,
+        }
+
+    async def retention_loop(self):
+        """Background task: apply policies periodically, vacuum a little whenever idle"""
+        self.running = True
+        print("🗜️  Retention service started")
+        next_run = time.monotonic() + FIRST_RUN_DELAY_SECONDS
+
+        while self.running:
+            try:
+                if time.monotonic() >= next_run:
+                    await asyncio.to_thread(self.run)
+                    next_run = time.monotonic() + settings.retention_interval_hours * 3600
+                elif await asyncio.to_thread(self.is_idle):
+                    await asyncio.to_thread(self.incremental_vacuum)
+            except Exception as e:
+                print(f"Error in retention loop: {e}")
+
+            await asyncio.sleep(IDLE_CHECK_SECONDS)
+
+    def stop(self):
+        """Stop the retention loop"""
+        self.running = False
@@ -0,0 +1,189 @@
+"""
+Local full-text search over organized files
+An FTS5 index over the file catalog's filename tokens and content previews,
+kept in sync by triggers and ranked with BM25.
+"""
+import re
+import sqlite3
+import time
+from typing import Dict, Optional
+from database import Database
+
+
+# BM25 column weights: a filename hit outranks a preview hit
+NAME_WEIGHT = 10.0
+PREVIEW_WEIGHT = 1.0
+
+# Tokens of context around matches in preview snippets
+SNIPPET_TOKENS = 12
+
+# Rows tokenized per statement batch when building the index
+BACKFILL_CHUNK = 5000
+
+# Word boundaries inside a filename chunk: letter/digit changes, fooBar, XMLFile
+CAMEL_BOUNDARY = re.compile(
+    r'(?<=[^\W\d_])(?=\d)|(?<=\d)(?=[^\W\d_])|(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])'
+)
+
+SEARCH_SCHEMA = [
+    # External-content table: the text lives in file_catalog, FTS5 keeps only the index.
+    # Prefix indexes make 2- and 3-character prefix queries cheap.
+    """
+    CREATE VIRTUAL TABLE file_search USING fts5(
+        name_tokens, preview,
+        content='file_catalog', content_rowid='rowid',
+        prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    "INSERT INTO file_search(file_search) VALUES ('rebuild')",
+    """
+    CREATE TRIGGER trg_file_catalog_search_insert AFTER INSERT ON file_catalog BEGIN
+        INSERT INTO file_search(rowid, name_tokens, preview)
+        VALUES (NEW.rowid, NEW.name_tokens, NEW.preview);
+    END
+    """,
+    """
+    CREATE TRIGGER trg_file_catalog_search_delete AFTER DELETE ON file_catalog BEGIN
+        INSERT INTO file_search(file_search, rowid, name_tokens, preview)
+        VALUES ('delete', OLD.rowid, OLD.name_tokens, OLD.preview);
+    END
+    """,
+    """
+    CREATE TRIGGER trg_file_catalog_search_update
+    AFTER UPDATE OF name_tokens, preview ON file_catalog BEGIN
+        INSERT INTO file_search(file_search, rowid, name_tokens, preview)
+        VALUES ('delete', OLD.rowid, OLD.name_tokens, OLD.preview);
+        INSERT INTO file_search(rowid, name_tokens, preview)
+        VALUES (NEW.rowid, NEW.name_tokens, NEW.preview);
+    END
+    """,
+]
+
+
+def tokenize_filename(filename: str) -> str:
+    """
+    Split a filename into searchable words
+
+    Keeps the separator-delimited chunks and adds their camelCase and
+    letter/digit parts: "Q3_budgetReport-final.pdf" is indexed as
+    q3 budgetreport final pdf q 3 budget report.
+    """
+    chunks = [chunk for chunk in re.split(r'[\W_]+', filename) if chunk]
+    parts = [part for chunk in chunks for part in CAMEL_BOUNDARY.sub(' ', chunk).split()]
+    return " ".join(dict.fromkeys(word.lower() for word in chunks + parts))
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Turn user input into an FTS5 MATCH expression
+
+    "exact phrase" searches a phrase, a trailing * a prefix, and all terms
+    must match. Everything else is quoted, so user input can't produce an
+    FTS5 syntax error.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"\*?|(\S+)', query):
+        words = re.findall(r'\w+', phrase or word)
+        if not words:
+            continue
+        prefix = '*' if (word or '').endswith('*') else ''
+        terms.append('"' + ' '.join(words) + '"' + prefix)
+    return ' AND '.join(terms) or None
+
+
+class SearchIndex:
+    """BM25-ranked search over the file catalog"""
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.available = self.ensure_index()
+
+    def ensure_index(self) -> bool:
+        """
+        Create the FTS5 table and sync triggers on first use
+
+        Returns:
+            False if this SQLite build has no FTS5 (search is then disabled)
+        """
+        with self.db.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'file_search'"
+            ).fetchone()
+            if exists:
+                return True
+
+            # Entries cataloged before search existed have no tokens yet;
+            # fill them in before the triggers start mirroring updates
+            last_rowid = 0
+            while True:
+                rows = conn.execute("""
+                    SELECT rowid, filename FROM file_catalog
+                    WHERE rowid > ? AND name_tokens IS NULL ORDER BY rowid LIMIT ?
+                """, (last_rowid, BACKFILL_CHUNK)).fetchall()
+                if not rows:
+                    break
+                conn.executemany(
+                    "UPDATE file_catalog SET name_tokens = ? WHERE rowid = ?",
+                    [(tokenize_filename(row['filename']), row['rowid']) for row in rows]
+                )
+                last_rowid = rows[-1]['rowid']
+
+            try:
+                for statement in SEARCH_SCHEMA:
+                    conn.execute(statement)
+            except sqlite3.OperationalError as e:
+                if 'fts5' not in str(e):
+                    raise
+                conn.rollback()
+                print("⚠️  SQLite was built without FTS5 - file search disabled")
+                return False
+
+        print("🔎 Search index built")
+        return True
+
+    def search(self, query: str, limit: int = 20, category: Optional[str] = None) -> Dict:
+        """
+        Search organized files by filename and content preview
+
+        Returns:
+            Ranked results, best first, with a highlighted preview snippet
+        """
+        if not self.available:
+            raise RuntimeError("Search index is not available")
+
+        match = build_match_query(query)
+        if match is None:
+            return {'query': query, 'results': [], 'took_ms': 0.0}
+
+        category_join = "JOIN file_catalog c ON c.rowid = f.rowid AND c.category = ?2" if category else ""
+        params = (match, category, limit) if category else (match, None, limit)
+
+        # Rank every match first, then build snippets for the top rows only
+        # (in a single query SQLite would compute a snippet for every match)
+        start = time.perf_counter()
+        with self.db.get_connection() as conn:
+            rows = conn.execute(f"""
+                WITH top AS MATERIALIZED (
+                    SELECT f.rowid AS id, bm25(file_search, {NAME_WEIGHT}, {PREVIEW_WEIGHT}) AS score
+                    FROM file_search f {category_join}
+                    WHERE file_search MATCH ?1
+                    ORDER BY score LIMIT ?3
+                )
+                SELECT c.path, c.filename, c.category, c.status, c.original_path,
+                       snippet(file_search, 1, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) AS snippet,
+                       top.score
+                FROM top
+                CROSS JOIN file_search ON file_search.rowid = top.id
+                CROSS JOIN file_catalog c ON c.rowid = top.id
+                WHERE file_search MATCH ?1
+                ORDER BY top.score
+            """, params).fetchall()
+        took = (time.perf_counter() - start) * 1000
+        self.db._record_latency('search', took / 1000)
+
+        return {
+            'query': query,
+            'results': [dict(row) for row in rows],
+            'took_ms': round(took, 2),
+        }
@@ -0,0 +1,224 @@
+"""
+Local diff of two scanned folder structures
+Directories are matched by path relative to the tree root, and unmatched
+ones by a content fingerprint, so moves and renames are told apart from
+creations and deletions. Runs in linear time in the number of directories
+and needs no API call. diff_directories is the matching itself, shared with
+the snapshot diff (tree_snapshot), which fingerprints by Merkle hash.
+"""
+import hashlib
+from typing import Dict, Iterator, List, Tuple
+
+
+# Entries listed per change category
+DIFF_LIST_LIMIT = 100
+
+# A move into a folder whose name contains this counts as archiving
+ARCHIVE_MARKER = 'archive'
+
+
+def relative_path(root: str, path: str) -> str:
+    """A directory's path relative to the tree root, '/'-separated ('' for the root)"""
+    return path[len(root.rstrip('/\\')):].lstrip('/\\').replace('\\', '/')
+
+
+def iter_directories(structure: Dict) -> Iterator[Tuple[str, Dict]]:
+    """(path relative to the root, node) for every directory, in pre-order"""
+    root = structure['path']
+    stack = [structure]
+    while stack:
+        node = stack.pop()
+        yield relative_path(root, node['path']), node
+        stack.extend(node.get('children', []))
+
+
+def fingerprint_tree(structure: Dict) -> Dict[int, str]:
+    """
+    Content fingerprint of every subtree, keyed by id(node)
+
+    Covers the directory's own file count, size and extension counts and its
+    children's names and fingerprints, but not its own name or location, so
+    a moved or renamed folder keeps its fingerprint.
+    """
+    order = [node for _, node in iter_directories(structure)]
+    fingerprints: Dict[int, str] = {}
+    for node in reversed(order):
+        children = node.get('children', [])
+        own_files, own_size = _own_totals(node)
+        digest = hashlib.blake2b(digest_size=12)
+        digest.update(f"{own_files}\0{own_size}\0{sorted(node.get('extensions', {}).items())}".encode())
+        for child in sorted(children, key=lambda child: child['name']):
+            digest.update(f"\n{child['name']}\0{fingerprints[id(child)]}".encode())
+        fingerprints[id(node)] = digest.hexdigest()
+    return fingerprints
+
+
+def _own_totals(node: Dict) -> Tuple[int, int]:
+    """File count and size of a directory's own files, without its subfolders"""
+    children = node.get('children', [])
+    return (node.get('file_count', 0) - sum(child.get('file_count', 0) for child in children),
+            node.get('total_size', 0) - sum(child.get('total_size', 0) for child in children))
+
+
+def _parent(relative: str) -> str:
+    return relative.rpartition('/')[0]
+
+
+def _is_archive(relative: str) -> bool:
+    return ARCHIVE_MARKER in relative.lower()
+
+
+def structure_entries(structure: Dict) -> Dict[str, Dict]:
+    """A structure dict's directories as diff_directories entries"""
+    prints = fingerprint_tree(structure)
+    entries = {}
+    for relative, node in iter_directories(structure):
+        own_files, own_size = _own_totals(node)
+        entries[relative] = {'path': node['path'], 'files': node.get('file_count', 0),
+                             'print': prints[id(node)], 'content': (own_files, own_size),
+                             'own_files': own_files, 'own_size': own_size}
+    return entries
+
+
+def diff_directories(old_nodes: Dict[str, Dict], new_nodes: Dict[str, Dict]) -> Dict:
+    """
+    Match the directories of two scans of one tree
+
+    Args:
+        old_nodes, new_nodes: Entries keyed by path relative to the root,
+            each with path (as reported), files (in its subtree), print (a
+            fingerprint of its subtree that ignores its name and location),
+            content (changes whenever its own files do) and own_files and
+            own_size (its own files' count and bytes)
+
+    Returns:
+        Dict of created and deleted relative paths (outside moved subtrees),
+        and moved (with renamed/archived flags) and changed folders, the
+        largest first; nothing is limited yet
+    """
+    added = {path for path in new_nodes if path not in old_nodes}
+    removed = {path for path in old_nodes if path not in new_nodes}
+
+    def inside(path: str, roots: set) -> bool:
+        while path:
+            if path in roots:
+                return True
+            path = _parent(path)
+        return False
+
+    # The top of each removed subtree may reappear anywhere among the added
+    # folders, including inside a new one (Taxes -> Archive/Taxes)
+    top_removed = [path for path in removed if _parent(path) not in removed]
+    added_by_print: Dict[str, List[str]] = {}
+    for path in sorted(added):
+        if new_nodes[path]['files']:
+            added_by_print.setdefault(new_nodes[path]['print'], []).append(path)
+
+    moved = []
+    moved_sources = set()
+    moved_destinations = set()
+    for path in sorted(top_removed, key=lambda path: -old_nodes[path]['files']):
+        candidates = [candidate for candidate in added_by_print.get(old_nodes[path]['print'], [])
+                      if not inside(candidate, moved_destinations)]
+        if not candidates:
+            continue
+        # Prefer a destination in the same parent (a rename)
+        same_parent = [candidate for candidate in candidates if _parent(candidate) == _parent(path)]
+        destination = (same_parent or candidates)[0]
+        moved_sources.add(path)
+        moved_destinations.add(destination)
+        moved.append({
+            'from': old_nodes[path]['path'],
+            'to': new_nodes[destination]['path'],
+            'files': old_nodes[path]['files'],
+            'renamed': _parent(destination) == _parent(path),
+            'archived': _is_archive(destination) and not _is_archive(path),
+        })
+
+    created = [path for path in added if not inside(path, moved_destinations)]
+    deleted = [path for path in removed if not inside(path, moved_sources)]
+
+    changed = []
+    for path, node in new_nodes.items():
+        previous = old_nodes.get(path)
+        if previous is not None and previous['content'] != node['content']:
+            changed.append({'path': node['path'],
+                            'files_delta': node['own_files'] - previous['own_files'],
+                            'size_delta': node['own_size'] - previous['own_size']})
+
+    moved.sort(key=lambda move: -move['files'])
+    changed.sort(key=lambda change: -abs(change['files_delta']))
+    return {'created': created, 'deleted': deleted, 'moved': moved, 'changed': changed}
+
+
+def top_paths(paths: List[str]) -> List[str]:
+    """The top of each subtree among relative paths (those whose parent isn't listed)"""
+    members = set(paths)
+    return [path for path in paths if _parent(path) not in members]
+
+
+def top_listing(paths: List[str], nodes: Dict[str, Dict], list_limit: int = DIFF_LIST_LIMIT) -> List[Dict]:
+    """The largest subtrees among paths, as {path, files}"""
+    tops = sorted(top_paths(paths), key=lambda path: -nodes[path]['files'])
+    return [{'path': nodes[path]['path'], 'files': nodes[path]['files']} for path in tops[:list_limit]]
+
+
+def diff_structures(old: Dict, new: Dict, list_limit: int = DIFF_LIST_LIMIT) -> Dict:
+    """
+    Diff two structure dicts of the same tree
+
+    Returns:
+        Counts (files_moved, folders_created, folders_deleted, folders_moved,
+        folders_renamed, folders_archived, folders_changed) plus lists of
+        created, deleted, moved (with renamed/archived flags) and changed
+        folders, the largest first
+    """
+    old_nodes = structure_entries(old)
+    new_nodes = structure_entries(new)
+    matched = diff_directories(old_nodes, new_nodes)
+    created, deleted = matched['created'], matched['deleted']
+    moved, changed = matched['moved'], matched['changed']
+
+    return {
+        'files_moved': sum(move['files'] for move in moved),
+        'folders_created': len(created),
+        'folders_deleted': len(deleted),
+        'folders_moved': sum(1 for move in moved if not move['renamed']),
+        'folders_renamed': sum(1 for move in moved if move['renamed']),
+        'folders_archived': sum(1 for move in moved if move['archived']),
+        'folders_changed': len(changed),
+        'files_delta': new.get('file_count', 0) - old.get('file_count', 0),
+        'size_delta': new.get('total_size', 0) - old.get('total_size', 0),
+        'created': top_listing(created, new_nodes, list_limit),
+        'deleted': top_listing(deleted, old_nodes, list_limit),
+        'moved': moved[:list_limit],
+        'changed': changed[:list_limit],
+    }
+
+
+def describe_changes(diff: Dict, limit: int = 10) -> List[str]:
+    """Readable one-line descriptions of the largest changes"""
+    lines = []
+    for move in diff['moved'][:limit]:
+        verb = "Archived" if move['archived'] else "Renamed" if move['renamed'] else "Moved"
+        lines.append(f"{verb} {move['from']} → {move['to']} ({move['files']} files)")
+    for folder in diff['created'][:max(0, limit - len(lines))]:
+        lines.append(f"Created {folder['path']} ({folder['files']} files)")
+    for folder in diff['deleted'][:max(0, limit - len(lines))]:
+        lines.append(f"Removed {folder['path']} ({folder['files']} files)")
+    return lines
+
+
+def summarize_changes(diff: Dict) -> str:
+    """Deterministic one-sentence summary, used when no narrative is requested"""
+    parts = [f"{diff[key]} {label}" for key, label in (
+        ('folders_created', 'folders created'),
+        ('folders_moved', 'moved'),
+        ('folders_renamed', 'renamed'),
+        ('folders_archived', 'archived'),
+        ('folders_deleted', 'removed'),
+        ('folders_changed', 'with changed contents'),
+    ) if diff[key]]
+    if not parts:
+        return "No structural changes."
+    return f"{', '.join(parts)}; {diff['files_moved']} files moved with their folders."
@@ -0,0 +1,290 @@
+"""
+Parallel directory tree scanner
+Builds FolderAnalyzer's structure dict with os.scandir, using each DirEntry's
+cached file type and a single stat per file, and spreads directories over a
+thread pool (scandir and stat release the GIL while they wait on the disk).
+Given the previous scan's directory records, directories whose mtime is
+unchanged are not listed again. Each node also counts its own files by
+extension and by modification year, for histograms.
+"""
+import os
+import hashlib
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from config import settings
+
+
+# Seconds between progress reports during a scan
+PROGRESS_INTERVAL = 0.5
+
+
+def new_node(path: str, name: str) -> Dict:
+    """Directory node in the structure dict format"""
+    return {
+        'path': path,
+        'name': name,
+        'type': 'directory',
+        'children': [],
+        'file_count': 0,
+        'total_size': 0,
+        'extensions': {},
+        'years': {}
+    }
+
+
+class TreeScanner:
+    """
+    Scans a tree into nested directory nodes
+
+    Each directory is one task: list it, count its files, and queue its
+    subdirectories. The queue is bounded; when it is full the worker scans
+    the subtree itself instead of blocking, so memory stays flat on very
+    wide trees. Counts are rolled up once every directory has been listed.
+    """
+
+    def __init__(self, workers: Optional[int] = None, queue_size: Optional[int] = None):
+        self.workers = max(1, workers or settings.scan_workers)
+        self.queue_size = queue_size or settings.scan_queue_size
+        # Stats of the last scan made by each calling thread (scans may run concurrently)
+        self._local = threading.local()
+
+    @property
+    def last_stats(self) -> Optional[Dict]:
+        return getattr(self._local, 'stats', None)
+
+    @last_stats.setter
+    def last_stats(self, stats: Dict):
+        self._local.stats = stats
+
+    def scan(self, root_path: Path, max_depth: int = 4,
+             previous: Optional[Dict[str, Dict]] = None,
+             directories: Optional[Dict[str, Dict]] = None,
+             progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        Scan root_path down to max_depth directory levels
+
+        Args:
+            previous: Directory records of an earlier scan with the same
+                max_depth, keyed by path (see `directories`)
+            directories: If given, filled with one record per directory:
+                mtime_ns, own file_count/total_size, files_hash over its
+                files' names, sizes and mtimes, its files per extension and per
+                modification year, child directory names, and whether it was
+                reused from `previous`
+            progress: Called from a worker thread every PROGRESS_INTERVAL
+                seconds with {phase: 'scan', directories, files, files_per_sec}
+
+        Returns:
+            Structure dict (path, name, type, children, file_count, total_size),
+            identical to FolderAnalyzer's original recursive scan, plus each
+            directory's own file counts per extension and per year
+        """
+        start = time.perf_counter()
+        root = new_node(str(root_path), root_path.name)
+        counts = {'files': 0, 'directories': 0, 'errors': 0, 'reused': 0,
+                  'lock': threading.Lock(), 'previous': previous or {},
+                  'records': directories if directories is not None else {},
+                  'progress': progress, 'start': start, 'reported': start,
+                  'failure': None}
+
+        tasks: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        tasks.put((root, max_depth))
+
+        threads = [
+            threading.Thread(target=self._worker, args=(tasks, counts),
+                             name=f"scan-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        tasks.join()
+        for _ in threads:
+            tasks.put(None)
+        for thread in threads:
+            thread.join()
+
+        # A worker failed (e.g. in the progress callback): fail the scan here
+        if counts['failure'] is not None:
+            raise counts['failure']
+
+        self._roll_up(root)
+
+        elapsed = time.perf_counter() - start
+        self.last_stats = {
+            'files': counts['files'],
+            'directories': counts['directories'],
+            'errors': counts['errors'],
+            'directories_reused': counts['reused'],
+            'seconds': round(elapsed, 3),
+            'files_per_sec': round(counts['files'] / elapsed) if elapsed else 0,
+            'workers': self.workers,
+        }
+        return root
+
+    def _worker(self, tasks: "queue.Queue", counts: Dict):
+        """
+        Take directories off the queue until told to stop
+
+        Every task is marked done whatever happens, so scan() never waits
+        forever; after the first failure the remaining tasks are drained
+        without scanning and scan() re-raises it.
+        """
+        while True:
+            task = tasks.get()
+            if task is None:
+                tasks.task_done()
+                return
+            try:
+                if counts['failure'] is None:
+                    self._scan_subtree(tasks, counts, *task)
+            except Exception as e:
+                with counts['lock']:
+                    if counts['failure'] is None:
+                        counts['failure'] = e
+            finally:
+                tasks.task_done()
+
+    def _scan_subtree(self, tasks: "queue.Queue", counts: Dict, node: Dict, depth: int):
+        """Scan a directory, handing subdirectories to other workers while the queue has room"""
+        stack = [(node, depth)]
+        while stack:
+            current, remaining = stack.pop()
+            for child in self._scan_directory(current, remaining, counts):
+                try:
+                    tasks.put_nowait((child, remaining - 1))
+                except queue.Full:
+                    stack.append((child, remaining - 1))
+
+    def _scan_directory(self, node: Dict, depth: int, counts: Dict) -> List[Dict]:
+        """List one directory: count its files and return subdirectory nodes to descend into"""
+        path = node['path']
+        try:
+            # Taken before listing: a change during the listing shows up next time
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+
+        previous = counts['previous'].get(path)
+        if previous and mtime_ns is not None and previous['mtime_ns'] == mtime_ns:
+            return self._reuse_directory(node, depth, counts, previous)
+
+        subdirectories = []
+        file_entries = []
+        extensions = node['extensions']
+        years = node['years']
+        files = 0
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    # Skip hidden files and system folders
+                    if entry.name.startswith('.'):
+                        continue
+
+                    try:
+                        if entry.is_file():
+                            files += 1
+                            node['file_count'] += 1
+                            extension = os.path.splitext(entry.name)[1].lower()
+                            extensions[extension] = extensions.get(extension, 0) + 1
+                            try:
+                                stat = entry.stat()
+                                node['total_size'] += stat.st_size
+                                file_entries.append(f"{entry.name}\0{stat.st_size}\0{stat.st_mtime_ns}")
+                                year = str(time.localtime(stat.st_mtime).tm_year)
+                                years[year] = years.get(year, 0) + 1
+                            except OSError:
+                                file_entries.append(entry.name)
+
+                        elif entry.is_dir() and depth > 0:
+                            child = new_node(entry.path, entry.name)
+                            node['children'].append(child)
+                            subdirectories.append(child)
+                    except OSError:
+                        continue
+
+        except PermissionError:
+            node['error'] = 'Permission denied'
+        except Exception as e:
+            node['error'] = str(e)
+
+        file_entries.sort()
+        counts['records'][path] = {
+            # Errors are never reused, so unreadable directories are retried
+            'mtime_ns': None if 'error' in node else mtime_ns,
+            'file_count': node['file_count'],
+            'total_size': node['total_size'],
+            'files_hash': hashlib.blake2b("\n".join(file_entries).encode(), digest_size=16).hexdigest(),
+            'extensions': extensions,
+            'years': years,
+            'children': [child['name'] for child in subdirectories],
+            'reused': False,
+        }
+
+        with counts['lock']:
+            counts['files'] += files
+            counts['directories'] += 1
+            if 'error' in node:
+                counts['errors'] += 1
+        self._report(counts)
+
+        return subdirectories
+
+    def _reuse_directory(self, node: Dict, depth: int, counts: Dict, previous: Dict) -> List[Dict]:
+        """Take an unchanged directory's files and subdirectories from the previous scan"""
+        node['file_count'] = previous['file_count']
+        node['total_size'] = previous['total_size']
+        node['extensions'] = dict(previous['extensions'])
+        node['years'] = dict(previous['years'])
+
+        subdirectories = []
+        if depth > 0:
+            for name in previous['children']:
+                child = new_node(os.path.join(node['path'], name), name)
+                node['children'].append(child)
+                subdirectories.append(child)
+
+        counts['records'][node['path']] = dict(previous, reused=True)
+
+        with counts['lock']:
+            counts['files'] += previous['file_count']
+            counts['directories'] += 1
+            counts['reused'] += 1
+        self._report(counts)
+
+        return subdirectories
+
+    def _report(self, counts: Dict):
+        """Call the progress callback if PROGRESS_INTERVAL has passed since the last report"""
+        if counts['progress'] is None:
+            return
+        now = time.perf_counter()
+        with counts['lock']:
+            if now - counts['reported'] < PROGRESS_INTERVAL:
+                return
+            counts['reported'] = now
+            elapsed = now - counts['start']
+            event = {
+                'phase': 'scan',
+                'directories': counts['directories'],
+                'files': counts['files'],
+                'files_per_sec': round(counts['files'] / elapsed) if elapsed else 0,
+            }
+        counts['progress'](event)
+
+    def _roll_up(self, root: Dict):
+        """Add every directory's counts into its ancestors (post-order, no recursion)"""
+        order: List[Tuple[Dict, Optional[Dict]]] = []
+        stack: List[Tuple[Dict, Optional[Dict]]] = [(root, None)]
+        while stack:
+            node, parent = stack.pop()
+            order.append((node, parent))
+            stack.extend((child, node) for child in node['children'])
+
+        for node, parent in reversed(order):
+            if parent is not None:
+                parent['file_count'] += node['file_count']
+                parent['total_size'] += node['total_size']
@@ -0,0 +1,152 @@
+"""
+Incremental Merkle snapshots of analyzed folder trees
+Each analysis stores one record per directory (mtime, counts, sizes and a
+hash over its files and its children's hashes). The next analysis lists only
+directories whose mtime changed, recomputes hashes bottom-up, and reports a
+structural diff against the previous snapshot.
+
+A directory's mtime changes when entries are added, removed or renamed in
+it, not when a file is rewritten in place, so in-place edits to files in an
+otherwise untouched directory are picked up on the next full rescan only:
+every snapshot_full_rescan_scans scans, after snapshot_full_rescan_hours,
+or when an analysis is forced.
+"""
+import hashlib
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from config import settings
+from database import Database
+from tree_diff import DIFF_LIST_LIMIT, diff_directories, relative_path, top_listing, top_paths
+from tree_scanner import TreeScanner
+
+
+class TreeSnapshotStore:
+    """Scans trees incrementally against their stored snapshots"""
+
+    def __init__(self, db: Database, scanner: Optional[TreeScanner] = None):
+        self.db = db
+        self.scanner = scanner or TreeScanner()
+
+    def scan(self, root_path: Path, max_depth: int = 4,
+             progress: Optional[Callable[[Dict], None]] = None,
+             full: bool = False) -> Tuple[Dict, Dict, Dict]:
+        """
+        Scan a tree, reusing unchanged directories from its last snapshot
+        (progress is passed on to TreeScanner.scan)
+
+        Args:
+            full: List every directory again, even if a full rescan isn't due
+
+        Returns:
+            (structure dict, diff against the previous snapshot, scan stats)
+        """
+        root = str(root_path)
+        meta, previous = self.db.get_tree_snapshot(root)
+        replace = meta is not None and meta['max_depth'] != max_depth
+        if replace:
+            previous = {}
+        full = full or self._full_rescan_due(meta)
+
+        start = time.perf_counter()
+        records: Dict[str, Dict] = {}
+        # A full rescan still diffs against (and only rewrites what differs from) the snapshot
+        structure = self.scanner.scan(root_path, max_depth, None if full else previous, records, progress)
+        stats = dict(self.scanner.last_stats)
+        stats['full_scan'] = full
+
+        root_hash = self._hash_tree(structure, records)
+        stats['hash_seconds'] = round(time.perf_counter() - start - stats['seconds'], 3)
+
+        changed = [record for path, record in records.items()
+                   if previous.get(path, {}).get('hash') != record['hash']
+                   or previous[path]['mtime_ns'] != record['mtime_ns']]
+        removed = [path for path in previous if path not in records]
+
+        self.db.save_tree_snapshot(root, max_depth, {
+            'hash': root_hash,
+            'directories': len(records),
+            'file_count': structure['file_count'],
+            'total_size': structure['total_size'],
+        }, changed, removed, replace, full)
+
+        stats['directories_written'] = len(changed)
+        diff = self._diff(root, meta if not replace else None, previous, records)
+        return structure, diff, stats
+
+    def _full_rescan_due(self, meta: Optional[Dict]) -> bool:
+        """Whether the snapshot is old enough that unchanged mtimes can't be trusted"""
+        if meta is None:
+            return True
+        scans = settings.snapshot_full_rescan_scans
+        if scans > 0 and meta['incremental_scans'] + 1 >= scans:
+            return True
+        hours = settings.snapshot_full_rescan_hours
+        return hours > 0 and (meta['full_scan_hours'] is None or meta['full_scan_hours'] >= hours)
+
+    def _hash_tree(self, structure: Dict, records: Dict[str, Dict]) -> str:
+        """Compute Merkle hashes and subtree totals bottom-up, returning the root hash"""
+        order = []
+        stack = [structure]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(node['children'])
+
+        for node in reversed(order):
+            record = records[node['path']]
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(record['files_hash'].encode())
+            for child in sorted(node['children'], key=lambda child: child['name']):
+                digest.update(f"\n{child['name']}\0{records[child['path']]['hash']}".encode())
+
+            record['path'] = node['path']
+            record['hash'] = digest.hexdigest()
+            record['subtree_files'] = node['file_count']
+            record['subtree_size'] = node['total_size']
+
+        return records[structure['path']]['hash']
+
+    def _diff(self, root: str, meta: Optional[Dict], previous: Dict[str, Dict],
+              current: Dict[str, Dict]) -> Dict:
+        """Structural diff between two snapshots of the same tree (see tree_diff)"""
+        root_record = current[root]
+        if meta is None:
+            return {
+                'first_scan': True,
+                'previous_scan': None,
+                'unchanged': False,
+                'summary': {'directories_added': len(current)},
+            }
+
+        old_nodes = self._diff_entries(root, previous)
+        new_nodes = self._diff_entries(root, current)
+        matched = diff_directories(old_nodes, new_nodes)
+        added = top_paths(matched['created'])
+        removed = top_paths(matched['deleted'])
+
+        return {
+            'first_scan': False,
+            'previous_scan': meta['scanned_at'],
+            'unchanged': meta['hash'] == root_record['hash'],
+            'summary': {
+                'directories_added': len(added),
+                'directories_removed': len(removed),
+                'directories_moved': len(matched['moved']),
+                'directories_changed': len(matched['changed']),
+                'files_delta': root_record['subtree_files'] - (meta['file_count'] or 0),
+                'size_delta': root_record['subtree_size'] - (meta['total_size'] or 0),
+            },
+            'added': top_listing(added, new_nodes),
+            'removed': top_listing(removed, old_nodes),
+            'moved': matched['moved'][:DIFF_LIST_LIMIT],
+            'changed': matched['changed'][:DIFF_LIST_LIMIT],
+        }
+
+    def _diff_entries(self, root: str, records: Dict[str, Dict]) -> Dict[str, Dict]:
+        """Snapshot records as tree_diff entries: Merkle hashes fingerprint subtrees"""
+        return {relative_path(root, path): {
+                    'path': path, 'files': record['subtree_files'], 'print': record['hash'],
+                    'content': record['files_hash'], 'own_files': record['file_count'],
+                    'own_size': record['total_size']}
+                for path, record in records.items()}
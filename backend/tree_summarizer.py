@@ -0,0 +1,266 @@
+"""
+Token-budgeted folder tree summaries for analysis prompts
+Instead of printing the first levels of the tree in listing order, the
+summarizer spends a token budget on the subtrees that hold the most files
+and bytes, weighted by how varied their subfolder names are. Runs of
+similarly named siblings (week01..week15) are collapsed into one line, and
+every line carries an extension histogram rather than a file listing.
+"""
+import heapq
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+from config import settings
+
+
+# Rough size of a token in English/path text (no tokenizer dependency)
+CHARS_PER_TOKEN = 4
+
+# Extensions listed per histogram before "+N types"
+HISTOGRAM_EXTENSIONS = 4
+
+# Siblings sharing a name pattern that are collapsed into one line
+COLLAPSE_MIN_SIBLINGS = 3
+
+DIGITS = re.compile(r'\d+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a prompt fragment"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def name_pattern(name: str) -> str:
+    """Folder name with digit runs masked, so week01 and week15 match"""
+    return DIGITS.sub('#', name.lower())
+
+
+def natural_key(name: str) -> List:
+    """Sort key ordering week2 before week10"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name.lower())]
+
+
+def naming_entropy(names: List[str]) -> float:
+    """Shannon entropy of name patterns, normalized to 0 (uniform) .. 1 (all different)"""
+    if len(names) < 2:
+        return 0.0
+    counts: Dict[str, int] = {}
+    for name in names:
+        pattern = name_pattern(name)
+        counts[pattern] = counts.get(pattern, 0) + 1
+    total = len(names)
+    entropy = -sum(count / total * math.log2(count / total) for count in counts.values())
+    return entropy / math.log2(total)
+
+
+def format_size(size: int) -> str:
+    """Human-readable size"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def format_histogram(extensions: Dict[str, int]) -> str:
+    """Most common extensions, e.g. "[pdf 40, docx 12, +3 types]" """
+    if not extensions:
+        return ""
+    ranked = sorted(extensions.items(), key=lambda item: (-item[1], item[0]))
+    parts = [f"{extension.lstrip('.') or 'no ext'} {count}"
+             for extension, count in ranked[:HISTOGRAM_EXTENSIONS]]
+    if len(ranked) > HISTOGRAM_EXTENSIONS:
+        parts.append(f"+{len(ranked) - HISTOGRAM_EXTENSIONS} types")
+    return f" [{', '.join(parts)}]"
+
+
+class TreeSummarizer:
+    """
+    Summarizes a scanned structure dict within a token budget
+
+    Directories are expanded best-first: the root is shown, its children
+    become candidates scored by their share of files and bytes times
+    (1 + naming entropy of their own subfolders), and the best candidate that
+    still fits is shown next, adding its children as candidates. Children
+    left out of a shown directory are reported as one "… N more folders" line.
+    """
+
+    def __init__(self, budget_tokens: Optional[int] = None):
+        self.budget_tokens = budget_tokens or settings.analysis_summary_tokens
+
+    def summarize(self, structure: Dict, budget_tokens: Optional[int] = None) -> Tuple[str, Dict]:
+        """
+        Returns:
+            (summary text, stats: tokens, budget, directories, directories_shown,
+             groups_collapsed)
+        """
+        budget = budget_tokens or self.budget_tokens
+        totals = self._subtree_totals(structure)
+        total_files = max(structure.get('file_count', 0), 1)
+        total_size = max(structure.get('total_size', 0), 1)
+
+        def score(unit: Dict) -> float:
+            share = (unit['files'] / total_files + unit['size'] / total_size) / 2
+            return share * (1 + unit['entropy'])
+
+        root = self._single_unit(structure, totals)
+        shown: Dict[int, List[Dict]] = {}
+        units_of: Dict[int, List[Dict]] = {}
+        used = estimate_tokens(self._render_line(root, 0))
+        groups = 0
+        directories_shown = 1
+
+        candidates: List[Tuple[float, int, Dict, int]] = []
+        sequence = 0
+
+        def expand(unit: Dict, depth: int) -> int:
+            """Queue a shown directory's children; returns the tokens reserved for its "more" line"""
+            nonlocal sequence
+            node = unit['node']
+            if node is None or not node.get('children'):
+                return 0
+            units = self._child_units(node, totals)
+            units_of[id(node)] = units
+            shown[id(node)] = []
+            for child in units:
+                sequence += 1
+                heapq.heappush(candidates, (-score(child), sequence, child, depth + 1))
+            return estimate_tokens(self._render_more(units, depth + 1))
+
+        used += expand(root, 0)
+        while candidates:
+            _, _, unit, depth = heapq.heappop(candidates)
+            if unit.get('skip'):
+                continue
+            cost = estimate_tokens(self._render_line(unit, depth))
+            if used + cost > budget:
+                continue
+
+            shown[id(unit['parent'])].append(unit)
+            used += cost
+            directories_shown += unit['members']
+            if unit['node'] is None:
+                groups += 1
+            else:
+                reserve = expand(unit, depth)
+                if used + reserve > budget:
+                    # No room to even say what is below it: show it as a leaf
+                    for child in units_of.pop(id(unit['node'])):
+                        child['skip'] = True
+                    shown.pop(id(unit['node']))
+                else:
+                    used += reserve
+
+        lines: List[str] = []
+        self._render(root, 0, shown, units_of, lines)
+        text = "\n".join(lines)
+
+        return text, {
+            'tokens': estimate_tokens(text),
+            'budget': budget,
+            'directories': totals[id(structure)][1],
+            'directories_shown': directories_shown,
+            'groups_collapsed': groups,
+        }
+
+    def _render(self, unit: Dict, depth: int, shown: Dict[int, List[Dict]],
+                units_of: Dict[int, List[Dict]], lines: List[str]):
+        """Render shown units depth-first, largest children first"""
+        lines.append(self._render_line(unit, depth))
+        node = unit['node']
+        if node is None or id(node) not in shown:
+            return
+
+        children = sorted(shown[id(node)], key=lambda child: (-child['files'], child['label']))
+        for child in children:
+            self._render(child, depth + 1, shown, units_of, lines)
+
+        shown_ids = {id(child) for child in children}
+        hidden = [child for child in units_of[id(node)] if id(child) not in shown_ids]
+        if hidden:
+            lines.append(self._render_more(hidden, depth + 1))
+
+    def _render_line(self, unit: Dict, depth: int) -> str:
+        prefix = "  " * depth
+        if unit['node'] is None:
+            counts = f"{unit['members']} dirs, {unit['files']} files"
+        else:
+            counts = f"{unit['files']} files"
+        return (f"{prefix}📁 {unit['label']}/ ({counts}, {format_size(unit['size'])})"
+                f"{format_histogram(unit['extensions'])}")
+
+    def _render_more(self, units: List[Dict], depth: int) -> str:
+        directories = sum(unit['directories'] for unit in units)
+        files = sum(unit['files'] for unit in units)
+        size = sum(unit['size'] for unit in units)
+        return (f"{'  ' * depth}… {directories} more folders "
+                f"({files} files, {format_size(size)})")
+
+    def _single_unit(self, node: Dict, totals: Dict[int, Tuple[Dict[str, int], int]],
+                     parent: Optional[Dict] = None) -> Dict:
+        extensions, directories = totals[id(node)]
+        return {
+            'node': node,
+            'parent': parent,
+            'label': node.get('name') or 'root',
+            'members': 1,
+            'directories': directories,
+            'files': node.get('file_count', 0),
+            'size': node.get('total_size', 0),
+            'extensions': extensions,
+            'entropy': naming_entropy([child['name'] for child in node.get('children', [])]),
+        }
+
+    def _child_units(self, node: Dict, totals: Dict[int, Tuple[Dict[str, int], int]]) -> List[Dict]:
+        """A directory's children, with runs of same-pattern siblings merged into groups"""
+        by_pattern: Dict[str, List[Dict]] = {}
+        for child in node.get('children', []):
+            by_pattern.setdefault(name_pattern(child['name']), []).append(child)
+
+        units = []
+        for members in by_pattern.values():
+            if len(members) < COLLAPSE_MIN_SIBLINGS or '#' not in name_pattern(members[0]['name']):
+                units.extend(self._single_unit(child, totals, node) for child in members)
+                continue
+
+            # Members share a pattern, so their keys compare part by part
+            names = sorted((member['name'] for member in members), key=natural_key)
+            extensions: Dict[str, int] = {}
+            for member in members:
+                for extension, count in totals[id(member)][0].items():
+                    extensions[extension] = extensions.get(extension, 0) + count
+            units.append({
+                'node': None,
+                'parent': node,
+                'label': f"{names[0]}..{names[-1]}",
+                'members': len(members),
+                'directories': sum(totals[id(member)][1] for member in members),
+                'files': sum(member.get('file_count', 0) for member in members),
+                'size': sum(member.get('total_size', 0) for member in members),
+                'extensions': extensions,
+                'entropy': 0.0,
+            })
+        return units
+
+    def _subtree_totals(self, structure: Dict) -> Dict[int, Tuple[Dict[str, int], int]]:
+        """Extension counts and directory count of every subtree, keyed by id(node)"""
+        order = list(self._walk(structure))
+        totals: Dict[int, Tuple[Dict[str, int], int]] = {}
+        for node in reversed(order):
+            histogram = dict(node.get('extensions', {}))
+            directories = 1
+            for child in node.get('children', []):
+                child_histogram, child_directories = totals[id(child)]
+                directories += child_directories
+                for extension, count in child_histogram.items():
+                    histogram[extension] = histogram.get(extension, 0) + count
+            totals[id(node)] = (histogram, directories)
+        return totals
+
+    def _walk(self, structure: Dict):
+        """Directories in pre-order, without recursion"""
+        stack = [structure]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.get('children', [])))
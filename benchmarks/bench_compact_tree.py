@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark CompactTree against the nested structure dict
+
+Builds a synthetic structure dict with the given number of directories (as
+TreeScanner would return it), converts it, and reports memory held by each
+form, binary file size, save/load time, aggregation time, and the time to
+rebuild a two-level subtree dict.
+
+Usage:
+    python benchmarks/bench_compact_tree.py [directories]
+"""
+import gc
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+from compact_tree import CompactTree, np
+
+
+DIRECTORIES = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+EXTENSIONS = [".pdf", ".docx", ".jpg", ".png", ".txt", ".py", ".zip", ".mp4", ""]
+
+
+def build_structure(directories: int) -> dict:
+    """Random tree with ~20 files and 1-3 extensions/years per directory"""
+    random.seed(7)
+    root = {'path': '/home/user', 'name': 'user', 'type': 'directory', 'children': [],
+            'file_count': 0, 'total_size': 0, 'extensions': {}, 'years': {}}
+    nodes = [root]
+    for i in range(1, directories):
+        parent = nodes[int(len(nodes) * random.random() ** 2)]
+        files = random.randint(0, 40)
+        node = {
+            'path': f"{parent['path']}/folder_{i}",
+            'name': f"folder_{i}",
+            'type': 'directory',
+            'children': [],
+            'file_count': files,
+            'total_size': files * random.randint(1_000, 2_000_000),
+            'extensions': {random.choice(EXTENSIONS): files} if files else {},
+            'years': {str(random.randint(2015, 2025)): files} if files else {},
+        }
+        parent['children'].append(node)
+        nodes.append(node)
+
+    # Roll counts up, as the scanner does
+    for node in reversed(nodes):
+        for child in node['children']:
+            node['file_count'] += child['file_count']
+            node['total_size'] += child['total_size']
+    return root
+
+
+def timed(label: str, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    print(f"   {label:34} {time.perf_counter() - start:8.3f} s")
+    return result
+
+
+def main():
+    print(f"📝 Building a structure dict of {DIRECTORIES} folders "
+          f"(NumPy {'available' if np is not None else 'not installed'})")
+
+    tracemalloc.start()
+    structure = build_structure(DIRECTORIES)
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    timed("convert to CompactTree", CompactTree.from_structure, structure)
+
+    # Measure the converted tree alone (tracing slows the conversion down)
+    gc.collect()
+    tracemalloc.start()
+    tree = CompactTree.from_structure(structure)
+    gc.collect()
+    tree_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del structure
+
+    print(f"   {'structure dict':34} {dict_bytes / 2**20:8.1f} MB")
+    print(f"   {'CompactTree':34} {tree_bytes / 2**20:8.1f} MB "
+          f"({tree_bytes / DIRECTORIES:.0f} bytes/folder)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "tree.bin"
+        timed("save", tree.save, path)
+        print(f"   {'file size':34} {path.stat().st_size / 2**20:8.1f} MB")
+        tree = timed("load", CompactTree.load, path)
+
+    timed("subtree totals (all folders)", tree.subtree_totals)
+    timed("extension histogram (root)", tree.extension_histogram, 0)
+    timed("age histogram (root)", tree.age_histogram, 0)
+    largest = max(tree.children(0), key=lambda child: tree.end[child] - child)
+    subtree = timed("to_dict of largest child, depth 2", tree.to_dict, largest, 2)
+    print(f"   {'':34} {len(subtree['children'])} children, "
+          f"{tree.end[largest] - largest} folders below")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot database queries before and after the index migration
+
+Builds a database with the original (unindexed) schema, times the original
+queries and prints their query plans, then applies the migrations and repeats
+with the current queries.
+
+Usage:
+    python benchmarks/bench_db_queries.py [rows]
+"""
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+from database import Database, MIGRATIONS
+
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+REPEAT = 20
+
+LEGACY_QUERIES = {
+    'recent_operations': "SELECT * FROM file_operations ORDER BY timestamp DESC LIMIT 50",
+    'operations_by_type': "SELECT operation_type, COUNT(*) FROM file_operations GROUP BY operation_type",
+    'files_today': "SELECT COUNT(*) FROM file_operations WHERE date(timestamp) = date('now')",
+    'active_reminders': """
+        SELECT * FROM reminders
+        WHERE status = 'active' AND reminder_time <= datetime('now')
+        ORDER BY reminder_time
+    """,
+}
+
+CURRENT_QUERIES = dict(LEGACY_QUERIES)
+CURRENT_QUERIES['files_today'] = """
+    SELECT COUNT(*) FROM file_operations
+    WHERE timestamp >= date('now') AND timestamp < date('now', '+1 day')
+"""
+
+
+def populate(conn: sqlite3.Connection):
+    """Fill the legacy schema with a year of synthetic history"""
+    now = datetime.utcnow()
+    types = ['detected', 'moved', 'moved', 'duplicate']
+    rows = []
+    for i in range(ROWS):
+        timestamp = now - timedelta(seconds=random.randint(0, 365 * 24 * 3600))
+        rows.append((f"file_{i}.pdf", f"/Downloads/file_{i}.pdf", None,
+                     random.choice(types), timestamp.strftime("%Y-%m-%d %H:%M:%S")))
+    conn.executemany("""
+        INSERT INTO file_operations (filename, original_path, new_path, operation_type, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+
+    reminders = []
+    for i in range(ROWS // 20):
+        when = now + timedelta(minutes=random.randint(-10_000, 10_000))
+        status = 'active' if i % 10 == 0 else 'completed'
+        reminders.append((f"/Downloads/file_{i}.pdf", when.strftime("%Y-%m-%d %H:%M:%S"), status))
+    conn.executemany("""
+        INSERT INTO reminders (file_path, reminder_time, status) VALUES (?, ?, ?)
+    """, reminders)
+    conn.commit()
+
+
+def run(conn: sqlite3.Connection, queries: dict, label: str):
+    """Print the plan and median latency of each query"""
+    print(f"\n{'=' * 60}\n{label}\n{'=' * 60}")
+    for name, sql in queries.items():
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+        timings = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            conn.execute(sql).fetchall()
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"\n{name}: {timings[len(timings) // 2] * 1000:.2f} ms (median of {REPEAT})")
+        for step in plan:
+            print(f"   {step}")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+
+        # Original schema only: migration 1 without the index migrations
+        conn = sqlite3.connect(db_path)
+        for statement in MIGRATIONS[0][2]:
+            conn.execute(statement)
+        print(f"📝 Inserting {ROWS} operations...")
+        populate(conn)
+        run(conn, LEGACY_QUERIES, "BEFORE: original schema and queries")
+        conn.close()
+
+        # Apply the remaining migrations through the Database class
+        Database(str(db_path)).close()
+        conn = sqlite3.connect(db_path)
+        run(conn, CURRENT_QUERIES, "AFTER: migrated schema and current queries")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark parallel execution of a migration plan
+
+Generates source folders of small files and a plan that creates target
+folders, moves every file into one of them and archives the emptied source
+folders, then executes it with one worker (the original sequential order)
+and with the configured worker pool. Reports operations/sec and bytes/sec,
+and checks that both runs leave the same tree. The parallel run is then
+undone from its journal, which must restore the original tree. With
+--target on another device the moves are copies, where parallel workers
+help most.
+
+Usage:
+    python benchmarks/bench_reorganize.py [operations] [--root /mnt/ssd/tmp] [--target /dev/shm]
+"""
+import io
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+from config import settings
+from database import Database
+from notification_manager import NotificationManager
+import reorganizer
+from reorganizer import FileReorganizer
+
+FILES_PER_FOLDER = 50
+TARGET_FOLDERS = 40
+
+
+def build_plan(root: Path, target: Path, operations: int) -> List[Dict]:
+    """Create the source files and a create/move/archive plan over them"""
+    files = max(1, operations - TARGET_FOLDERS - operations // FILES_PER_FOLDER)
+    plan = [{'action': 'create', 'destination': str(target / "Sorted" / f"topic_{i}"), 'reason': 'bench'}
+            for i in range(TARGET_FOLDERS)]
+    folders = []
+    for i in range(files):
+        folder = root / "Inbox" / f"batch_{i // FILES_PER_FOLDER}"
+        if i % FILES_PER_FOLDER == 0:
+            folder.mkdir(parents=True)
+            folders.append(folder)
+        source = folder / f"file_{i}.txt"
+        source.write_bytes(b"x" * (1024 + i % 4096))
+        plan.append({'action': 'move', 'source': str(source),
+                     'destination': str(target / "Sorted" / f"topic_{i % TARGET_FOLDERS}" / source.name),
+                     'reason': 'bench'})
+    plan += [{'action': 'archive', 'source': str(folder), 'reason': 'bench'} for folder in folders]
+    return plan
+
+
+def tree_listing(root: Path) -> List[str]:
+    return sorted(str(path.relative_to(root)) for path in root.rglob("*"))
+
+
+def run(label: str, base: Path, target_base: Path, operations: int,
+        workers: int, device_concurrency: int) -> Tuple[List[str], List[str], FileReorganizer, str]:
+    """Execute a generated plan; returns the trees before and after, the reorganizer and journal run"""
+    root = base / f"run_{workers}"
+    target = target_base / f"run_{workers}"
+    archive = base / f"run_{workers}_archived"
+    plan = build_plan(root, target, operations)
+    before = tree_listing(root)
+
+    settings.reorganize_workers = workers
+    settings.reorganize_device_concurrency = device_concurrency
+    reorganizer.ARCHIVE_ROOT = archive
+    organizer = FileReorganizer(Database(str(base / f"run_{workers}.db")), NotificationManager())
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary = organizer.execute_reorganization(plan)
+    elapsed = time.perf_counter() - start
+
+    print(f"   {label:24} {elapsed:7.2f} s ({summary['seconds']:.2f} s executing)  {summary['operations_per_sec']:9.0f} ops/sec  "
+          f"{summary['bytes_per_sec'] / (1024 * 1024):7.1f} MB/sec  "
+          f"({summary['files_moved']} moved, {summary['folders_created']} created, "
+          f"{summary['folders_archived']} archived, {len(summary['errors'])} errors)")
+    return before, tree_listing(root) + tree_listing(target), organizer, summary['run_id']
+
+
+def undo(organizer: FileReorganizer, run_id: str, root: Path, before: List[str]):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary = organizer.undo_run(run_id)
+    elapsed = time.perf_counter() - start
+
+    print(f"   {'undo':24} {elapsed:7.2f} s ({summary['seconds']:.2f} s executing)  {summary['operations_per_sec']:9.0f} ops/sec  "
+          f"({summary['files_moved']} moved back, {summary['folders_removed']} folders removed, "
+          f"{len(summary['errors'])} errors)")
+    if tree_listing(root) != before:
+        print("   ⚠️  undo did not restore the original tree")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("operations", nargs="?", type=int, default=20_000)
+    parser.add_argument("--root", help="Directory to run in (default: the system temp directory)")
+    parser.add_argument("--target", help="Directory to move files into (default: inside --root)")
+    args = parser.parse_args()
+
+    workers, per_device = settings.reorganize_workers, settings.reorganize_device_concurrency
+
+    # Measure the executor, not the catalog and duplicate index updates
+    settings.enable_duplicate_detection = False
+    settings.enable_file_catalog = False
+
+    with tempfile.TemporaryDirectory(dir=args.root) as tmp, \
+            tempfile.TemporaryDirectory(dir=args.target or tmp) as target:
+        base = Path(tmp)
+        settings.reorg_journal_dir = str(base / "journal")
+        print(f"📝 Executing a plan of {args.operations} operations in {base} (into {target}):")
+        _, expected, _, _ = run("sequential", base, Path(target), args.operations, 1, 1)
+        before, listing, organizer, run_id = run(f"{workers} workers, {per_device}/device", base,
+                                                 Path(target), args.operations, workers, per_device)
+        if listing != expected:
+            print("   ⚠️  resulting trees differ")
+        undo(organizer, run_id, base / f"run_{workers}", before)
+
+
+if __name__ == "__main__":
+    main()
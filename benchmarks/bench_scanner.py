@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark the tree scanner against the original FolderAnalyzer scan
+
+Generates a synthetic home-directory-like tree (or scans a given directory),
+runs the original recursive Path.iterdir() implementation and TreeScanner
+with several worker counts, checks that they produce the same structure and
+reports files/sec.
+
+Usage:
+    python benchmarks/bench_scanner.py [--files 300000] [--path ~/Documents]
+"""
+import sys
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+from tree_scanner import TreeScanner
+
+
+def legacy_scan(root_path: Path, max_depth: int = 4) -> Dict:
+    """FolderAnalyzer.scan_directory_structure before the scanner, kept verbatim"""
+    structure = {
+        'path': str(root_path),
+        'name': root_path.name,
+        'type': 'directory',
+        'children': [],
+        'file_count': 0,
+        'total_size': 0
+    }
+
+    try:
+        items = list(root_path.iterdir())
+
+        for item in items:
+            # Skip hidden files and system folders
+            if item.name.startswith('.'):
+                continue
+
+            if item.is_file():
+                structure['file_count'] += 1
+                try:
+                    structure['total_size'] += item.stat().st_size
+                except:
+                    pass
+
+            elif item.is_dir() and max_depth > 0:
+                child_structure = legacy_scan(item, max_depth - 1)
+                structure['children'].append(child_structure)
+                structure['file_count'] += child_structure['file_count']
+                structure['total_size'] += child_structure['total_size']
+
+    except PermissionError:
+        structure['error'] = 'Permission denied'
+    except Exception as e:
+        structure['error'] = str(e)
+
+    return structure
+
+
+def generate_tree(root: Path, files: int):
+    """Create folders of ~30 small files, four levels deep (all within max_depth)"""
+    random.seed(42)
+    parents = [root]
+    created = 0
+    while created < files:
+        parent = random.choice(parents)
+        folder = parent / f"dir_{created}"
+        folder.mkdir()
+        if len(folder.relative_to(root).parts) < 4:
+            parents.append(folder)
+        for _ in range(min(30, files - created)):
+            (folder / f"file_{created}.txt").write_bytes(b"x" * random.randint(0, 2048))
+            created += 1
+        if random.random() < 0.05:
+            (folder / f".hidden_{created}").write_bytes(b"")
+
+
+def without_histograms(structure: Dict) -> Dict:
+    """Drop the scanner's per-extension and per-year counts, which the original scan lacks"""
+    node = {key: value for key, value in structure.items() if key not in ('extensions', 'years')}
+    node['children'] = [without_histograms(child) for child in structure['children']]
+    return node
+
+
+def time_scan(label: str, scan, root: Path, repeat: int) -> Dict:
+    """Run a scan `repeat` times and print the best files/sec"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        structure = scan(root)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    files = structure['file_count']
+    print(f"   {label:28} {best:7.2f} s  {files / best:10.0f} files/sec")
+    return structure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=300_000)
+    parser.add_argument("--path", help="Scan an existing directory instead of a generated tree")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.path:
+            root = Path(args.path).expanduser()
+        else:
+            root = Path(tmp) / "home"
+            root.mkdir()
+            print(f"📝 Generating {args.files} files...")
+            generate_tree(root, args.files)
+
+        print(f"\nScanning {root} (max_depth=4, best of {args.repeat}):")
+        expected = time_scan("original (iterdir + stat)", legacy_scan, root, args.repeat)
+
+        for workers in (1, 4, 8, 16):
+            scanner = TreeScanner(workers=workers)
+            structure = time_scan(f"TreeScanner, {workers} workers", scanner.scan, root, args.repeat)
+            if without_histograms(structure) != expected:
+                print("   ⚠️  structure differs from the original scan")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark /api/search queries over a large synthetic catalog
+
+Fills the file catalog with generated filenames and previews, builds the
+FTS5 index and reports median latency of term, prefix, phrase and filtered
+queries. Preview words follow a Zipf distribution over a 20k-word vocabulary,
+so queries range from rare to very common terms; latency grows with the
+number of matches, since every match is scored.
+
+Usage:
+    python benchmarks/bench_search.py [files]
+"""
+import sys
+import time
+import random
+import itertools
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+from database import Database
+from search_index import SearchIndex, build_match_query, tokenize_filename
+
+
+FILES = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+REPEAT = 20
+
+WORDS = ("budget report invoice receipt homework lecture notes project proposal "
+         "contract resume syllabus midterm final draft summary meeting agenda "
+         "quarterly annual tax statement lab assignment slides thesis chapter "
+         "dataset analysis design review roadmap onboarding policy").split()
+# Synthetic vocabulary, most frequent first
+VOCABULARY = WORDS + [f"term{n}" for n in range(20_000)]
+ZIPF_CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+
+CATEGORIES = ["work", "homework", "receipt", "personal", "document", "media"]
+EXTENSIONS = [".pdf", ".docx", ".xlsx", ".pptx", ".txt", ".png"]
+
+QUERIES = {
+    'rare term': ('term15000', None),
+    'mid term': ('term500', None),
+    'two terms': ('term200 term300', None),
+    'prefix': ('term150*', None),
+    'phrase': ('"meeting agenda"', None),
+    'name term': ('cs170', None),
+    'term + category': ('term100', 'work'),
+    'common term': ('budget', None),
+}
+
+
+def populate(db: Database):
+    """Insert synthetic catalog rows directly, in large transactions"""
+    rows = []
+    for i in range(FILES):
+        words = random.sample(WORDS, 3)
+        course = f"cs{random.randint(100, 199)}" if random.random() < 0.1 else words[0]
+        filename = f"{course}_{words[1].title()}{words[2].title()}_{i}{random.choice(EXTENSIONS)}"
+        preview = " ".join(random.choices(VOCABULARY, cum_weights=ZIPF_CUM_WEIGHTS, k=40))
+        directory = f"/home/user/Documents/{random.choice(CATEGORIES)}/{words[0]}"
+        rows.append((f"{directory}/{filename}", directory, filename, random.choice(CATEGORIES),
+                     tokenize_filename(filename), preview))
+
+        if len(rows) == 50_000 or i == FILES - 1:
+            with db.get_connection() as conn:
+                conn.executemany("""
+                    INSERT INTO file_catalog (path, directory, filename, category, name_tokens, preview)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, rows)
+            rows = []
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(str(Path(tmp) / "search.db"))
+
+        print(f"📝 Cataloging {FILES} files...")
+        start = time.perf_counter()
+        populate(db)
+        print(f"   {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        index = SearchIndex(db)
+        print(f"   index built in {time.perf_counter() - start:.1f} s")
+
+        print(f"\nMedian of {REPEAT} runs, top 20 results:")
+        match_count = "SELECT COUNT(*) FROM file_search WHERE file_search MATCH ?"
+        for name, (query, category) in QUERIES.items():
+            timings = []
+            for _ in range(REPEAT):
+                start = time.perf_counter()
+                index.search(query, limit=20, category=category)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            with db.get_connection() as conn:
+                matches = conn.execute(match_count, (build_match_query(query),)).fetchone()[0]
+            print(f"   {name:16} {query:18} {timings[len(timings) // 2] * 1000:8.2f} ms "
+                  f"({matches} matches)")
+
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
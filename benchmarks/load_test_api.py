@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Load test for /api/status and /api/operations/recent
+
+Serves the two endpoints from a populated temporary database twice: once with
+the original handlers, which call Database directly inside `async def`, and
+once with handlers that await AsyncDatabase. Concurrent clients hit both
+endpoints while a background writer simulates the file monitor.
+
+Usage:
+    python benchmarks/load_test_api.py [--concurrency 32] [--duration 10] [--rows 200000]
+    python benchmarks/load_test_api.py --url http://127.0.0.1:8000   # test a running server
+"""
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from pathlib import Path
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+from database import Database
+from async_database import AsyncDatabase
+from operation_log_writer import OperationLogWriter
+
+
+ENDPOINTS = ["/api/status", "/api/operations/recent"]
+
+
+def build_app(db: Database, use_async: bool) -> FastAPI:
+    """Build an app serving the two polled endpoints"""
+    app = FastAPI()
+    adb = AsyncDatabase(db)
+
+    @app.get("/api/status")
+    async def status():
+        stats = await adb.get_statistics() if use_async else db.get_statistics()
+        return {"statistics": stats}
+
+    @app.get("/api/operations/recent")
+    async def recent(limit: int = 50):
+        if use_async:
+            return {"operations": await adb.get_recent_operations(limit)}
+        return {"operations": db.get_recent_operations(limit)}
+
+    return app
+
+
+def populate(db: Database, rows: int):
+    """Insert synthetic history through the write-behind logger"""
+    writer = OperationLogWriter(db, batch_size=5000)
+    for i in range(rows):
+        writer.log_operation(f"file_{i}.pdf", f"/Downloads/file_{i}.pdf",
+                             f"/Documents/file_{i}.pdf", "moved", file_type="document")
+    writer.close()
+
+
+def simulate_monitor(db: Database, stop: threading.Event):
+    """Write small batches continuously, like the monitor during a busy download session"""
+    writer = OperationLogWriter(db)
+    i = 0
+    while not stop.is_set():
+        writer.log_operation(f"new_{i}.pdf", f"/Downloads/new_{i}.pdf", None, "detected")
+        i += 1
+        time.sleep(0.002)
+    writer.close()
+
+
+async def run_load(base_url: str, concurrency: int, duration: float) -> dict:
+    """Hammer both endpoints and collect throughput and latency"""
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        async def worker(index: int):
+            nonlocal errors
+            n = index
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(ENDPOINTS[n % len(ENDPOINTS)])
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+                n += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'rps': count / elapsed if elapsed else 0,
+        'p50_ms': latencies[count // 2] * 1000 if count else 0,
+        'p95_ms': latencies[int(count * 0.95)] * 1000 if count else 0,
+    }
+
+
+def run_load_in_process(base_url: str, concurrency: int, duration: float) -> dict:
+    """Run the load generator in its own process so it doesn't share the server's GIL"""
+    with multiprocessing.Pool(1) as pool:
+        return pool.apply(_run_load_sync, (base_url, concurrency, duration))
+
+
+def _run_load_sync(base_url: str, concurrency: int, duration: float) -> dict:
+    return asyncio.run(run_load(base_url, concurrency, duration))
+
+
+def serve(app: FastAPI, port: int) -> uvicorn.Server:
+    """Start uvicorn in a background thread"""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def report(label: str, result: dict):
+    print(f"\n{label}")
+    print(f"   {result['requests']} requests, {result['errors']} errors")
+    print(f"   {result['rps']:.0f} req/s, p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="Load test an already running server instead")
+    args = parser.parse_args()
+
+    if args.url:
+        report(f"Server at {args.url}", asyncio.run(run_load(args.url, args.concurrency, args.duration)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(str(Path(tmp) / "load.db"))
+        print(f"📝 Inserting {args.rows} operations...")
+        populate(db, args.rows)
+
+        for use_async, label in [(False, "BEFORE: synchronous Database calls in async handlers"),
+                                 (True, "AFTER: AsyncDatabase on DB executor threads")]:
+            port = args.port + int(use_async)
+            server = serve(build_app(db, use_async), port)
+
+            stop = threading.Event()
+            monitor = threading.Thread(target=simulate_monitor, args=(db, stop))
+            monitor.start()
+            try:
+                result = run_load_in_process(f"http://127.0.0.1:{port}", args.concurrency, args.duration)
+            finally:
+                stop.set()
+                monitor.join()
+                server.should_exit = True
+
+            report(label, result)
+
+        db.close()
+
+
+if __name__ == "__main__":
+    main()